@@ -5,7 +5,16 @@ Adaptée pour Streamlit Cloud avec authentification
 import streamlit as st
 import pandas as pd
 from src.auth import check_authentication, require_auth
+from src.coherence import enable_cache_coherence
 from src.database import init_database, get_user_id, init_default_categories
+from src.disk_cache import enable_disk_cache
+from src.fragments import rerun_fragment
+from src.profiling import profile_page
+from src.recurrences import materialize_due
+from src.alerts import evaluate_due, list_alertes, dismiss_alertes
+
+# Profilage à la demande (administrateurs) : ce rerun est exécuté sous cProfile
+profile_page(__file__)
 
 
 # Configuration de la page
@@ -19,6 +28,12 @@ st.set_page_config(
 # Initialiser la base de données
 init_database()
 
+# Plusieurs processus sur la même base (BUDGET_CACHE_COHERENCE=1) : versions du cache partagées
+enable_cache_coherence()
+
+# Cache disque (BUDGET_DISK_CACHE=1) : état chaud du démarrage précédent rechargé une fois
+enable_disk_cache()
+
 # Vérifier l'authentification
 auth_status, username = check_authentication()
 
@@ -29,6 +44,11 @@ if not auth_status:
 user_id = get_user_id(username)
 init_default_categories(user_id)
 
+# Transactions récurrentes échues puis alertes de budget de l'utilisateur, une fois par
+# session et par jour (tous les utilisateurs : cron)
+materialize_due(user_id, pd.Timestamp.today().date())
+evaluate_due(user_id, pd.Timestamp.today().date())
+
 # Initialiser le mois sélectionné dans session_state
 if 'mois' not in st.session_state:
     st.session_state.mois = pd.Timestamp.today().strftime('%Y-%m')
@@ -44,26 +64,57 @@ with st.sidebar:
     
     st.divider()
     
-    # Sélecteur de mois
-    st.subheader("📅 Sélection du mois")
-    plage_mois = pd.date_range(
-        start=pd.Timestamp.today() - pd.DateOffset(years=2),
-        end=pd.Timestamp.today() + pd.DateOffset(years=1),
-        freq='MS'
-    )
-    options = [m.strftime('%Y-%m') for m in plage_mois]
-    
-    current_index = options.index(st.session_state.mois) if st.session_state.mois in options else len(options) - 1
-    
-    mois_selectionne = st.selectbox(
-        "Mois",
-        options=options,
-        index=current_index,
-        format_func=lambda x: pd.Timestamp(x).strftime('%B %Y')
-    )
-    
-    st.session_state.mois = mois_selectionne
-    
+    # Sélecteur de mois : fragment, un changement de mois ne réexécute que ce bloc
+    # (les pages lisent st.session_state.mois à leur propre exécution)
+    @st.fragment
+    def selecteur_mois():
+        st.subheader("📅 Sélection du mois")
+        plage_mois = pd.date_range(
+            start=pd.Timestamp.today() - pd.DateOffset(years=2),
+            end=pd.Timestamp.today() + pd.DateOffset(years=1),
+            freq='MS'
+        )
+        options = [m.strftime('%Y-%m') for m in plage_mois]
+
+        current_index = options.index(st.session_state.mois) if st.session_state.mois in options else len(options) - 1
+
+        mois_selectionne = st.selectbox(
+            "Mois",
+            options=options,
+            index=current_index,
+            format_func=lambda x: pd.Timestamp(x).strftime('%B %Y')
+        )
+
+        st.session_state.mois = mois_selectionne
+
+    selecteur_mois()
+
+    st.divider()
+
+    # Alertes de budget déjà déclenchées : simple lecture, rien n'est recalculé ici
+    @st.fragment
+    def alertes_budget():
+        # La plus récente par catégorie et mois (un dépassement remplace l'alerte à 80 %)
+        alertes = list_alertes(user_id).drop_duplicates(['mois', 'categorie_id'])
+        if alertes.empty:
+            return
+        st.subheader(f"🔔 Alertes ({len(alertes)})")
+        for a in alertes.head(5).itertuples(index=False):
+            pct = a.depense / a.budget * 100
+            if a.regle == 'projection':
+                st.warning(f"**{a.categorie}** ({a.mois}) : dépassement projeté, {pct:.0f} % du budget déjà dépensé")
+            elif pct >= 100:
+                st.error(f"**{a.categorie}** ({a.mois}) : budget dépassé, {a.depense:,.2f} € / {a.budget:,.2f} €")
+            else:
+                st.warning(f"**{a.categorie}** ({a.mois}) : {pct:.0f} % du budget atteint")
+        if len(alertes) > 5:
+            st.caption(f"… et {len(alertes) - 5} autre(s)")
+        if st.button("✔️ Tout marquer comme lu", key="alertes_lues"):
+            dismiss_alertes(user_id)
+            rerun_fragment()
+
+    alertes_budget()
+
     st.divider()
 
     # Navigation rapide
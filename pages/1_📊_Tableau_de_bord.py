@@ -3,9 +3,14 @@ Page principale : Tableau de bord
 """
 import streamlit as st
 import pandas as pd
-from src.data_operations import list_revenus, list_depenses, list_budgets
-from src.analytics import monthly_summary, plot_category_comparison, plot_category_distribution
-from src.database import get_user_id
+from src.data_operations import category_rollup
+from src.analytics import (
+    load_month, monthly_summary, category_level, plot_category_comparison, plot_category_distribution
+)
+from src.database import get_user_id, friendly_timeouts
+from src.profiling import profile_page
+
+profile_page(__file__)
 
 # Vérification de l'authentification
 username = st.session_state.get('username')
@@ -18,8 +23,10 @@ mois = st.session_state.get('mois', pd.Timestamp.today().strftime('%Y-%m'))
     
 st.title("📊 Tableau de bord")
 
-# Résumé mensuel
-s = monthly_summary(user_id, mois)
+# Données du mois lues une seule fois (lectures parallèles), partagées par le résumé et les graphiques
+with friendly_timeouts():
+    donnees_mois = load_month(user_id, mois)
+    s = monthly_summary(user_id, mois, donnees_mois)
 
 # Métriques principales
 col1, col2, col3, col4 = st.columns(4)
@@ -61,36 +68,53 @@ st.divider()
 # Graphiques
 col_left, col_right = st.columns(2)
 
-with col_left:
+with col_left, friendly_timeouts():
     st.subheader("Budget vs Dépenses")
-    plot_category_comparison(user_id, mois)
+    plot_category_comparison(user_id, mois, donnees_mois)
 
-with col_right:
+with col_right, friendly_timeouts():
     st.subheader("Répartition des dépenses")
-    plot_category_distribution(user_id, mois)
+    plot_category_distribution(user_id, mois, donnees_mois)
 
 st.divider()
 
-# Tableau détaillé
-st.subheader("Détail par catégorie")
-df = s['per_category']
+# Tableau détaillé : cumuls de tous les niveaux lus en une requête, l'exploration
+# d'une catégorie parente ne réexécute que ce fragment
+@st.fragment
+def detail_categories():
+    st.subheader("Détail par catégorie")
+    with friendly_timeouts():
+        rollup = category_rollup(user_id, mois)
+
+    parents = rollup[rollup['id'].isin(rollup['parent_id'])]
+    parent_id = None
+    if not parents.empty:
+        choix = st.selectbox(
+            "Niveau",
+            [None] + parents['id'].tolist(),
+            format_func=lambda i: "Toutes les catégories" if i is None else parents.set_index('id').at[i, 'nom'],
+            key="drill_categorie"
+        )
+        parent_id = None if choix is None else int(choix)
+    df = category_level(rollup, parent_id)
+
+    if df.empty:
+        st.info("Aucune donnée de budget ou de dépense pour ce mois.")
+        return
 
-if df.empty:
-    st.info("Aucune donnée de budget ou de dépense pour ce mois.")
-else:
     # Formater le DataFrame pour l'affichage
     df_display = df.copy()
     df_display['Budget'] = df_display['Budget'].apply(lambda x: f"{x:,.2f} €".replace(",", " "))
     df_display['Dépensé'] = df_display['Dépensé'].apply(lambda x: f"{x:,.2f} €".replace(",", " "))
     df_display['Reste (catégorie)'] = df_display['Reste (catégorie)'].apply(lambda x: f"{x:,.2f} €".replace(",", " "))
     df_display['Pourcentage utilisé'] = df_display['Pourcentage utilisé'].apply(lambda x: f"{x:.1f}%")
-    
+
     st.dataframe(
         df_display,
         use_container_width=True,
         hide_index=True
     )
-    
+
     # Barre de progression pour chaque catégorie
     st.subheader("État des budgets par catégorie")
     for _, row in df.iterrows():
@@ -98,7 +122,7 @@ else:
         depense = row['Dépensé']
         pourcentage = row['Pourcentage utilisé']
         reste = row['Reste (catégorie)']
-        
+
         # Déterminer la couleur de la barre
         if pourcentage > 100:
             color = "red"
@@ -106,10 +130,12 @@ else:
             color = "orange"
         else:
             color = "green"
-        
+
         st.write(f"**{row['Catégorie']}**")
         st.progress(
             min(pourcentage / 100, 1.0),
             text=f"Dépensé: {depense:,.2f} € / Budget: {budget:,.2f} € ({pourcentage:.1f}%) - Reste: {reste:,.2f} €"
         )
 
+
+detail_categories()
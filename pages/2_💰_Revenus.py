@@ -3,8 +3,12 @@ Page de gestion des revenus
 """
 import streamlit as st
 import pandas as pd
-from src.data_operations import list_revenus, add_revenu, delete_revenu
+from src.data_operations import list_revenus, add_revenu, diff_rows, apply_revenus_changes, archived_ids, EditConflict
 from src.database import get_user_id
+from src.fragments import rerun_fragment
+from src.profiling import profile_page
+
+profile_page(__file__)
 
 # Vérification de l'authentification
 username = st.session_state.get('username')
@@ -15,72 +19,128 @@ if not username:
 user_id = get_user_id(username)
 mois = st.session_state.get('mois', pd.Timestamp.today().strftime('%Y-%m'))
 
+
+def recharger_grille():
+    """Relit le mois au prochain affichage et réinitialise les modifications en cours"""
+    jeton = st.session_state.get('grille_revenus', {}).get('jeton', 0)
+    st.session_state['grille_revenus'] = {'mois': None, 'jeton': jeton}
+
+
+def grille_courante() -> dict:
+    """Frame de référence du diff et des contrôles de concurrence (voir la page Dépenses)"""
+    grille = st.session_state.get('grille_revenus')
+    if grille is None or grille['mois'] != mois:
+        grille = st.session_state['grille_revenus'] = {
+            'mois': mois,
+            'base': list_revenus(user_id, mois),
+            'archivees': archived_ids(user_id, 'revenus', mois),
+            'jeton': (grille or {}).get('jeton', 0) + 1,
+        }
+    return grille
+
 st.title("💰 Revenus")
 st.caption(f"Mois sélectionné : {mois}")
 
-# Liste des revenus
-st.subheader("Revenus du mois")
-df_revenus = list_revenus(user_id, mois)
-
-if df_revenus.empty:
-    st.info("Aucun revenu saisi pour ce mois.")
-    total_rev = 0
-else:
-    total_rev = df_revenus['montant'].sum()
-    st.metric("Total revenus", f"{total_rev:,.2f} €".replace(",", " "))
-    
-    # Afficher le tableau
-    df_display = df_revenus.copy()
-    df_display = df_display.rename(columns={
-        'origine': 'Origine',
-        'montant': 'Montant (€)'
-    })
-    df_display['Montant (€)'] = df_display['Montant (€)'].apply(lambda x: f"{x:,.2f} €".replace(",", " "))
-    df_display = df_display.drop(columns=['id'])
-    
-    st.dataframe(df_display, use_container_width=True, hide_index=True)
 
-st.divider()
+# Fragments : la grille et le formulaire d'ajout se réexécutent seuls ; une écriture
+# qui change l'autre fragment demande un rerun de toute la page
+@st.fragment
+def grille_revenus():
+    st.subheader("Revenus du mois")
+    grille = grille_courante()
+    df_revenus = grille['base']
+
+    if 'grille_revenus_conflit' in st.session_state:
+        st.error(st.session_state.pop('grille_revenus_conflit'))
+
+    if df_revenus.empty:
+        st.info("Aucun revenu saisi pour ce mois.")
+    else:
+        total_rev = df_revenus['montant'].sum()
+        st.metric("Total revenus", f"{total_rev:,.2f} €".replace(",", " "))
+
+    # Lignes archivées : affichées à part, ni modifiables ni supprimables
+    colonnes = ['origine', 'montant']
+    archivees = df_revenus['id'].isin(grille['archivees'])
+    if archivees.any():
+        st.caption(f"🗄️ {archivees.sum()} revenu(s) archivé(s), en lecture seule :")
+        st.dataframe(
+            df_revenus.loc[archivees, colonnes],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'origine': "Origine",
+                'montant': st.column_config.NumberColumn("Montant (€)", format="%.2f €"),
+            },
+        )
+
+    # Grille éditable : modifications, ajouts et suppressions enregistrés en un lot
+    editable = df_revenus[~archivees].reindex(columns=['id', *colonnes])
 
-# Formulaire d'ajout
-st.subheader("Ajouter un revenu")
-with st.form("form_ajout_revenu", clear_on_submit=True):
-    col1, col2 = st.columns([2, 1])
-    origine = col1.text_input("Origine", placeholder="Ex: Salaire, APL, Prime, etc.")
-    montant = col2.number_input("Montant (€)", min_value=0.0, step=10.0, format="%.2f")
-    
-    submitted = st.form_submit_button("➕ Ajouter le revenu", use_container_width=True)
-    
-    if submitted:
-        if not origine:
-            st.error("Veuillez saisir une origine.")
-        elif montant <= 0:
-            st.error("Le montant doit être supérieur à 0.")
+    with st.form(f"form_grille_revenus_{grille['jeton']}"):
+        st.caption("Modifiez les cellules, ajoutez des lignes en bas du tableau ou supprimez-en, puis enregistrez.")
+        edited = st.data_editor(
+            editable,
+            key=f"editeur_revenus_{grille['jeton']}",
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'id': None,
+                'origine': st.column_config.TextColumn("Origine", required=True),
+                'montant': st.column_config.NumberColumn("Montant (€)", min_value=0.01, step=10.0, format="%.2f €", required=True),
+            },
+        )
+        enregistrer = st.form_submit_button("💾 Enregistrer les modifications", use_container_width=True)
+
+    if st.button("🔄 Recharger le mois"):
+        recharger_grille()
+        rerun_fragment()
+
+    if enregistrer:
+        ajouts, modifications, suppressions = diff_rows(editable, edited, colonnes)
+        lignes = ajouts + [apres for _, apres in modifications]
+        if any(pd.isna(ligne['montant']) or pd.isna(ligne['origine']) or not ligne['origine'] for ligne in lignes):
+            st.error("Chaque ligne doit avoir une origine et un montant.")
         else:
-            add_revenu(user_id, mois, origine, float(montant))
-            st.success("✅ Revenu ajouté avec succès !")
-            st.rerun()
-
-# Suppression
-if not df_revenus.empty:
-    st.divider()
-    st.subheader("Supprimer un revenu")
-    revenu_options = {
-        f"{row['origine']} - {row['montant']:,.2f} €": row['id']
-        for _, row in df_revenus.iterrows()
-    }
-    
-    selected = st.selectbox(
-        "Sélectionner un revenu à supprimer",
-        options=["-"] + list(revenu_options.keys())
-    )
-    
-    if selected != "-":
-        revenu_id = revenu_options[selected]
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            if st.button("🗑️ Supprimer", type="primary"):
-                delete_revenu(user_id, revenu_id)
-                st.success("✅ Revenu supprimé.")
+            try:
+                nb = apply_revenus_changes(user_id, mois, ajouts, modifications, suppressions)
+            except EditConflict as e:
+                # Rien n'a été écrit : la grille est relue avec les valeurs de l'autre session
+                st.session_state['grille_revenus_conflit'] = f"⚠️ {e} Le mois a été rechargé, ressaisissez vos modifications."
+                recharger_grille()
+                rerun_fragment()
+            else:
+                recharger_grille()
+                st.success(f"✅ {nb} ligne(s) enregistrée(s).")
+                rerun_fragment()
+
+
+@st.fragment
+def ajout_revenu():
+    st.subheader("Ajouter un revenu")
+    with st.form("form_ajout_revenu", clear_on_submit=True):
+        col1, col2 = st.columns([2, 1])
+        origine = col1.text_input("Origine", placeholder="Ex: Salaire, APL, Prime, etc.")
+        montant = col2.number_input("Montant (€)", min_value=0.0, step=10.0, format="%.2f")
+
+        submitted = st.form_submit_button("➕ Ajouter le revenu", use_container_width=True)
+
+        if submitted:
+            if not origine:
+                st.error("Veuillez saisir une origine.")
+            elif montant <= 0:
+                st.error("Le montant doit être supérieur à 0.")
+            else:
+                add_revenu(user_id, mois, origine, float(montant))
+                recharger_grille()
+                st.success("✅ Revenu ajouté avec succès !")
+                # La grille est dans un autre fragment
                 st.rerun()
 
+
+grille_revenus()
+
+st.divider()
+
+ajout_revenu()
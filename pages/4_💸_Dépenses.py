@@ -4,8 +4,15 @@ Page de gestion des dépenses
 import streamlit as st
 import pandas as pd
 from datetime import date
-from src.data_operations import list_depenses, add_depense, delete_depense, list_categories
+from src.categorization import categorize, list_rules
+from src.data_operations import (
+    list_depenses, add_depense, list_categories, diff_rows, apply_depenses_changes, archived_ids, EditConflict
+)
 from src.database import get_user_id
+from src.fragments import rerun_fragment
+from src.profiling import profile_page
+
+profile_page(__file__)
 
 # Vérification de l'authentification
 username = st.session_state.get('username')
@@ -16,95 +23,199 @@ if not username:
 user_id = get_user_id(username)
 mois = st.session_state.get('mois', pd.Timestamp.today().strftime('%Y-%m'))
 
+
+def recharger_grille():
+    """Relit le mois au prochain affichage et réinitialise les modifications en cours"""
+    jeton = st.session_state.get('grille_depenses', {}).get('jeton', 0)
+    st.session_state['grille_depenses'] = {'mois': None, 'jeton': jeton}
+
+
+def grille_courante() -> dict:
+    """Frame de la grille pour le mois affiché.
+
+    La grille est éditée sur la frame lue à son affichage : c'est la référence du diff et
+    des contrôles de concurrence, conservée jusqu'à l'enregistrement ou au rechargement.
+    Les lignes archivées du mois (Parquet, lecture seule) sont relevées en même temps.
+    """
+    grille = st.session_state.get('grille_depenses')
+    if grille is None or grille['mois'] != mois:
+        grille = st.session_state['grille_depenses'] = {
+            'mois': mois,
+            'base': list_depenses(user_id, mois),
+            'archivees': archived_ids(user_id, 'depenses', mois),
+            'jeton': (grille or {}).get('jeton', 0) + 1,
+        }
+    return grille
+
+
 st.title("💸 Dépenses")
 st.caption(f"Mois sélectionné : {mois}")
 
-# Formulaire d'ajout
-st.subheader("Saisir une dépense")
-cats_actives = list_categories(user_id, actives_seulement=True)
 
-if cats_actives.empty:
-    st.warning("⚠️ Aucune catégorie active. Ajoutez-en dans l'onglet 'Catégories et Budgets'.")
-else:
-    noms_cats = cats_actives['nom'].tolist()
-    ids_cats = cats_actives['id'].tolist()
-    
+# Fragments : saisir une dépense ne réexécute que le formulaire, éditer la grille que
+# l'historique ; un ajout relance toute la page pour que la grille le montre
+@st.fragment
+def saisie_depense():
+    st.subheader("Saisir une dépense")
+    cats_actives = list_categories(user_id, actives_seulement=True)
+
+    if cats_actives.empty:
+        st.warning("⚠️ Aucune catégorie active. Ajoutez-en dans l'onglet 'Catégories et Budgets'.")
+        return
+
+    noms_cats = dict(zip(cats_actives['id'], cats_actives['nom']))
+    # Catégorie automatique (None) proposée dès que l'utilisateur a des règles actives
+    regles_actives = list_rules(user_id)['actif'].any()
+    if regles_actives:
+        noms_cats = {None: "🏷️ Automatique (règles)", **noms_cats}
+
     with st.form("form_ajout_depense", clear_on_submit=True):
         col1, col2 = st.columns(2)
         date_depense = col1.date_input("Date", value=date.today())
-        cat_choisie = col2.selectbox("Catégorie", options=noms_cats)
-        
+        cat_choisie = col2.selectbox("Catégorie", options=list(noms_cats), format_func=noms_cats.get)
+
         description_depense = st.text_input("Description", placeholder="Ex: Courses supermarché, Essence, etc.")
-        
+
         col3, col4 = st.columns([1, 3])
         montant = col3.number_input("Montant (€)", min_value=0.01, step=0.01, format="%.2f")
-        
+
         submitted = st.form_submit_button("➕ Enregistrer la dépense", use_container_width=True)
-        
+
         if submitted:
-            idx = noms_cats.index(cat_choisie)
             mois_depense = date_depense.strftime('%Y-%m')
-            
+            if cat_choisie is None:
+                cat_choisie = categorize(user_id, [description_depense], [float(montant)])[0]
+
+            if cat_choisie is None:
+                st.warning("⚠️ Aucune règle ne reconnaît cette description : choisissez une catégorie.")
             # Vérifier que la dépense est dans le bon mois
-            if mois_depense != mois:
+            elif mois_depense != mois:
                 st.warning(f"⚠️ La date sélectionnée ({date_depense.strftime('%d/%m/%Y')}) correspond au mois {mois_depense}, pas au mois sélectionné ({mois}).")
                 if st.button("Enregistrer quand même"):
-                    add_depense(user_id, date_depense, int(ids_cats[idx]), description_depense, float(montant), mois_depense)
+                    add_depense(user_id, date_depense, int(cat_choisie), description_depense, float(montant), mois_depense)
+                    recharger_grille()
                     st.success("✅ Dépense enregistrée !")
                     st.rerun()
             else:
-                add_depense(user_id, date_depense, int(ids_cats[idx]), description_depense, float(montant), mois)
+                add_depense(user_id, date_depense, int(cat_choisie), description_depense, float(montant), mois)
+                recharger_grille()
                 st.success("✅ Dépense enregistrée !")
                 st.rerun()
 
-st.divider()
 
-# Historique des dépenses
-st.subheader("Historique des dépenses")
-df_depenses = list_depenses(user_id, mois)
-
-if df_depenses.empty:
-    st.info("Aucune dépense pour ce mois.")
-else:
-    # Métrique totale
-    total_dep = df_depenses['montant'].sum()
-    st.metric("Total dépensé ce mois", f"{total_dep:,.2f} €".replace(",", " "))
-    
-    # Tableau des dépenses
-    df_display = df_depenses.copy()
-    df_display = df_display.rename(columns={
-        "date_depense": "Date",
-        "categorie": "Catégorie",
-        "description": "Description",
-        "montant": "Montant (€)"
-    })
-    
-    # Formater la date
-    df_display['Date'] = pd.to_datetime(df_display['Date']).dt.strftime('%d/%m/%Y')
-    df_display['Montant (€)'] = df_display['Montant (€)'].apply(lambda x: f"{x:,.2f} €".replace(",", " "))
-    df_display = df_display.drop(columns=['id', 'categorie_id'])
-    
-    st.dataframe(df_display, use_container_width=True, hide_index=True)
-    
-    # Suppression
-    st.divider()
-    st.subheader("Supprimer une dépense")
-    depense_options = {
-        f"{row['date_depense']} - {row['categorie']} - {row['description']} ({row['montant']:,.2f} €)": row['id']
-        for _, row in df_depenses.iterrows()
-    }
-    
-    selected = st.selectbox(
-        "Sélectionner une dépense à supprimer",
-        options=["-"] + list(depense_options.keys())
+@st.fragment
+def historique_depenses():
+    st.subheader("Historique des dépenses")
+    grille = grille_courante()
+    df_depenses = grille['base']
+
+    if 'grille_depenses_conflit' in st.session_state:
+        st.error(st.session_state.pop('grille_depenses_conflit'))
+
+    if df_depenses.empty:
+        st.info("Aucune dépense pour ce mois.")
+    else:
+        # Métrique totale
+        total_dep = df_depenses['montant'].sum()
+        st.metric("Total dépensé ce mois", f"{total_dep:,.2f} €".replace(",", " "))
+
+    cats_actives = list_categories(user_id, actives_seulement=True)
+    toutes_cats = list_categories(user_id, actives_seulement=False)
+    ids_par_nom = dict(zip(toutes_cats['nom'], toutes_cats['id']))
+    options_cats = sorted(set(cats_actives['nom']) | set(df_depenses['categorie'].dropna()))
+
+    # Lignes archivées : affichées à part, ni modifiables ni supprimables
+    colonnes = ['date_depense', 'categorie', 'description', 'montant']
+    archivees = df_depenses['id'].isin(grille['archivees'])
+    if archivees.any():
+        st.caption(f"🗄️ {archivees.sum()} dépense(s) archivée(s), en lecture seule :")
+        st.dataframe(
+            df_depenses.loc[archivees, colonnes],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'date_depense': st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
+                'categorie': "Catégorie",
+                'description': "Description",
+                'montant': st.column_config.NumberColumn("Montant (€)", format="%.2f €"),
+            },
+        )
+
+    # Frame éditable : dates en objets date, id et categorie_id masqués (vides pour les lignes ajoutées)
+    editable = df_depenses[~archivees].reindex(columns=['id', 'categorie_id', *colonnes]).assign(
+        date_depense=lambda df: pd.to_datetime(df['date_depense']).dt.date
     )
-    
-    if selected != "-":
-        depense_id = depense_options[selected]
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            if st.button("🗑️ Supprimer", type="primary"):
-                delete_depense(user_id, depense_id)
-                st.success("✅ Dépense supprimée.")
-                st.rerun()
 
+    with st.form(f"form_grille_depenses_{grille['jeton']}"):
+        st.caption(
+            "Modifiez les cellules, ajoutez des lignes en bas du tableau ou supprimez-en, puis enregistrez. "
+            "Une catégorie laissée vide est déduite des règles de catégorisation."
+        )
+        edited = st.data_editor(
+            editable,
+            key=f"editeur_depenses_{grille['jeton']}",
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'id': None,
+                'categorie_id': None,
+                'date_depense': st.column_config.DateColumn("Date", format="DD/MM/YYYY", required=True),
+                'categorie': st.column_config.SelectboxColumn("Catégorie", options=options_cats),
+                'description': st.column_config.TextColumn("Description"),
+                'montant': st.column_config.NumberColumn("Montant (€)", min_value=0.01, step=0.01, format="%.2f €", required=True),
+            },
+        )
+        enregistrer = st.form_submit_button("💾 Enregistrer les modifications", use_container_width=True)
+
+    if st.button("🔄 Recharger le mois"):
+        recharger_grille()
+        rerun_fragment()
+
+    if enregistrer:
+        ajouts, modifications, suppressions = diff_rows(editable, edited, colonnes)
+        lignes = ajouts + [apres for _, apres in modifications]
+        incompletes = [ligne for ligne in lignes if any(pd.isna(ligne[c]) for c in ('date_depense', 'montant'))]
+        # Seules les catégories saisies sont converties en id : les lignes lues gardent le leur
+        saisies = ajouts + [apres for avant, apres in modifications if apres['categorie'] != avant['categorie']]
+        for ligne in saisies:
+            ligne['categorie_id'] = ids_par_nom.get(ligne['categorie']) if pd.notna(ligne['categorie']) else None
+        inconnues = sorted({ligne['categorie'] for ligne in saisies
+                            if pd.notna(ligne['categorie']) and ligne['categorie_id'] is None})
+        sans_categorie = [ligne for ligne in lignes if pd.isna(ligne['categorie_id']) and pd.isna(ligne['categorie'])]
+        deduites = categorize(user_id, [ligne['description'] for ligne in sans_categorie],
+                              [ligne['montant'] for ligne in sans_categorie])
+        non_reconnues = [ligne for ligne, cat in zip(sans_categorie, deduites) if cat is None]
+        if incompletes:
+            st.error("Chaque ligne doit avoir une date et un montant.")
+        elif inconnues:
+            st.error(
+                "Catégorie(s) renommée(s) ou supprimée(s) entre-temps : " + ", ".join(f"« {nom} »" for nom in inconnues)
+                + ". Rechargez le mois."
+            )
+        elif non_reconnues:
+            st.error(
+                "Aucune règle ne reconnaît " + ", ".join(f"« {ligne['description'] if pd.notna(ligne['description']) else ''} »" for ligne in non_reconnues)
+                + " : choisissez une catégorie."
+            )
+        else:
+            for ligne, cat in zip(sans_categorie, deduites):
+                ligne['categorie_id'] = cat
+            try:
+                nb = apply_depenses_changes(user_id, ajouts, modifications, suppressions)
+            except EditConflict as e:
+                # Rien n'a été écrit : la grille est relue avec les valeurs de l'autre session
+                st.session_state['grille_depenses_conflit'] = f"⚠️ {e} Le mois a été rechargé, ressaisissez vos modifications."
+                recharger_grille()
+                rerun_fragment()
+            else:
+                recharger_grille()
+                st.success(f"✅ {nb} ligne(s) enregistrée(s).")
+                rerun_fragment()
+
+
+saisie_depense()
+
+st.divider()
+
+historique_depenses()
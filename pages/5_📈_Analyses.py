@@ -4,9 +4,15 @@ Page d'analyses avancées pour data scientists
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from src.data_operations import get_all_data
-from src.analytics import plot_trends, export_data
-from src.database import get_user_id
+from src.data_operations import period_totals, category_stats
+from src.analytics import plot_trends, plot_projection, export_data
+from src.forecast import forecast_spending
+from src.projection import BLOC, MIN_MOIS, project_savings
+from src.exports import start_excel_export
+from src.database import get_user_id, friendly_timeouts
+from src.profiling import profile_page
+
+profile_page(__file__)
 
 # Vérification de l'authentification
 username = st.session_state.get('username')
@@ -19,98 +25,112 @@ user_id = get_user_id(username)
 st.title("📈 Analyses Avancées")
 st.caption("Outils d'analyse pour data scientists")
 
-# Sélection de la période
-st.subheader("Période d'analyse")
-col1, col2 = st.columns(2)
+# Fragments : changer la période ne réexécute que les analyses, lancer un export ne
+# recalcule ni les tendances ni les agrégats
+@st.fragment
+def analyse_periode():
+    # Sélection de la période
+    st.subheader("Période d'analyse")
+    col1, col2 = st.columns(2)
 
-with col1:
-    date_debut = st.date_input(
-        "Date de début",
-        value=pd.Timestamp.today() - pd.DateOffset(months=6),
-        max_value=pd.Timestamp.today()
-    )
+    with col1:
+        date_debut = st.date_input(
+            "Date de début",
+            value=pd.Timestamp.today() - pd.DateOffset(months=6),
+            max_value=pd.Timestamp.today()
+        )
 
-with col2:
-    date_fin = st.date_input(
-        "Date de fin",
-        value=pd.Timestamp.today(),
-        max_value=pd.Timestamp.today()
-    )
+    with col2:
+        date_fin = st.date_input(
+            "Date de fin",
+            value=pd.Timestamp.today(),
+            max_value=pd.Timestamp.today()
+        )
 
-if date_debut > date_fin:
-    st.error("La date de début doit être antérieure à la date de fin.")
-    st.stop()
+    if date_debut > date_fin:
+        st.error("La date de début doit être antérieure à la date de fin.")
+        return
 
-# Générer la liste des mois
-months = pd.date_range(start=date_debut, end=date_fin, freq='MS')
-months_str = [m.strftime('%Y-%m') for m in months]
+    # Générer la liste des mois
+    months = pd.date_range(start=date_debut, end=date_fin, freq='MS')
+    months_str = [m.strftime('%Y-%m') for m in months]
 
-if not months_str:
+    if not months_str:
         st.info("Aucune période sélectionnée.")
-        st.stop()
+        return
 
-st.divider()
+    st.divider()
 
-# Graphique des tendances
-st.subheader("Évolution des revenus et dépenses")
-if len(months_str) > 1:
-        plot_trends(user_id, months_str)
-else:
+    # Graphique des tendances
+    st.subheader("Évolution des revenus et dépenses")
+    horizon = st.slider("Mois prévus (mois en cours compris)", min_value=0, max_value=12, value=3,
+                        key="horizon_prevision")
+    with friendly_timeouts():
+        prevision = forecast_spending(user_id, horizon) if horizon else None
+    if len(months_str) > 1:
+        with friendly_timeouts():
+            plot_trends(user_id, months_str, prevision['total'] if prevision else None)
+    else:
         st.info("Sélectionnez une période d'au moins 2 mois pour voir les tendances.")
 
-st.divider()
+    if prevision and not prevision['categories'].empty:
+        with st.expander(f"Prévisions par catégorie ({prevision['mois_historique']} mois d'historique)"):
+            mois_courant = prevision['total']['mois'].iloc[0]
+            par_cat = prevision['categories']
+            fin_de_mois = par_cat[par_cat['mois'] == mois_courant].set_index('categorie')
+            tableau = pd.DataFrame({
+                'Dépensé à date (€)': fin_de_mois['depense_a_date'],
+                'Fin de mois prévue (€)': fin_de_mois['prevision'],
+                'Bande basse (€)': fin_de_mois['basse'],
+                'Bande haute (€)': fin_de_mois['haute'],
+                'Mois suivants (€)': par_cat[par_cat['mois'] != mois_courant].groupby('categorie')['prevision'].sum(),
+                'Méthode': fin_de_mois['methode'],
+            }).fillna({'Mois suivants (€)': 0.0}).rename_axis('Catégorie').reset_index()
+            st.dataframe(
+                tableau.style.format({c: '{:,.2f}' for c in tableau.columns if c.endswith('(€)')}),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.caption(
+                "Saisonnière naïve, lissage exponentiel ou leur moyenne selon la catégorie ; "
+                "bande à 80 %. Le mois en cours ne peut finir sous ce qui est déjà dépensé."
+            )
 
-# Statistiques globales
-st.subheader("Statistiques globales")
-data = get_all_data(user_id)
-
-# Filtrer par période
-if not data['revenus'].empty:
-        data['revenus']['mois'] = pd.to_datetime(data['revenus']['mois'], format='%Y-%m', errors='coerce')
-        revenus_periode = data['revenus'][
-            (data['revenus']['mois'] >= pd.Timestamp(date_debut)) &
-            (data['revenus']['mois'] <= pd.Timestamp(date_fin))
-        ]
-else:
-        revenus_periode = pd.DataFrame()
-
-if not data['depenses'].empty:
-        data['depenses']['date_depense'] = pd.to_datetime(data['depenses']['date_depense'], errors='coerce')
-        depenses_periode = data['depenses'][
-            (data['depenses']['date_depense'] >= pd.Timestamp(date_debut)) &
-            (data['depenses']['date_depense'] <= pd.Timestamp(date_fin))
-        ]
-else:
-        depenses_periode = pd.DataFrame()
-
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-        total_rev = revenus_periode['montant'].sum() if not revenus_periode.empty else 0
+    st.divider()
+
+    # Statistiques globales
+    st.subheader("Statistiques globales")
+    # Agrégats calculés par le moteur d'analyse (SQLite ou DuckDB), sans charger l'historique
+    with friendly_timeouts():
+        totaux = period_totals(user_id, date_debut, date_fin)
+        stats_categories = category_stats(user_id, date_debut, date_fin)
+
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        total_rev = totaux['revenus']
         st.metric("Total revenus", f"{total_rev:,.2f} €".replace(",", " "))
 
-with col2:
-        total_dep = depenses_periode['montant'].sum() if not depenses_periode.empty else 0
+    with col2:
+        total_dep = totaux['depenses']
         st.metric("Total dépenses", f"{total_dep:,.2f} €".replace(",", " "))
 
-with col3:
+    with col3:
         solde = total_rev - total_dep
         st.metric("Solde", f"{solde:,.2f} €".replace(",", " "))
 
-with col4:
+    with col4:
         nb_mois = len(months_str)
         moyenne_mensuelle = solde / nb_mois if nb_mois > 0 else 0
         st.metric("Moyenne mensuelle", f"{moyenne_mensuelle:,.2f} €".replace(",", " "))
 
-st.divider()
+    st.divider()
 
-# Analyse par catégorie
-if not depenses_periode.empty:
+    # Analyse par catégorie
+    if not stats_categories.empty:
         st.subheader("Analyse par catégorie")
-        depenses_par_cat = depenses_periode.groupby('categorie')['montant'].agg(['sum', 'count', 'mean']).reset_index()
-        depenses_par_cat.columns = ['Catégorie', 'Total (€)', 'Nombre', 'Moyenne (€)']
-        depenses_par_cat = depenses_par_cat.sort_values('Total (€)', ascending=False)
-        
+        depenses_par_cat = stats_categories.set_axis(['Catégorie', 'Total (€)', 'Nombre', 'Moyenne (€)'], axis=1)
+
         st.dataframe(
             depenses_par_cat.style.format({
                 'Total (€)': '{:,.2f}',
@@ -120,15 +140,65 @@ if not depenses_periode.empty:
             hide_index=True
         )
 
-st.divider()
 
-# Export de données
-st.subheader("Export des données")
-st.write("Téléchargez vos données pour analyses externes :")
+@st.fragment
+def projection_solde():
+    st.subheader("Projection du solde")
+    col1, col2 = st.columns(2)
+    solde_depart = col1.number_input("Solde à la fin du mois en cours (€)", value=0.0, step=100.0, format="%.2f",
+                                     key="solde_depart_projection")
+    horizon = col2.slider("Mois projetés", min_value=3, max_value=36, value=12, key="horizon_projection")
+
+    with friendly_timeouts():
+        projection = project_savings(user_id, horizon, solde_depart)
+    bandes = projection['bandes']
+    if bandes.empty:
+        st.info(f"Au moins {MIN_MOIS} mois clos de revenus et de dépenses sont nécessaires à la projection.")
+        return
 
-col1, col2 = st.columns(2)
+    fin = bandes.iloc[-1]
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"Solde médian en {fin['mois']}", f"{fin['p50']:,.2f} €".replace(",", " "))
+    col2.metric("Fourchette à 90 %", f"{fin['p5']:,.0f} à {fin['p95']:,.0f} €".replace(",", " "))
+    col3.metric("Risque de solde négatif", f"{fin['prob_negatif']:.0%}")
+
+    plot_projection(bandes)
+    st.caption(
+        f"{projection['nb_trajectoires']:,}".replace(",", " ")
+        + f" trajectoires tirées dans les {projection['mois_historique']} derniers mois clos "
+        f"(mois entiers, par blocs de {BLOC} mois) ; bandes à 50 % et 90 %."
+    )
 
-with col1:
+    with st.expander("Dépenses projetées par catégorie"):
+        categories = projection['categories']
+        tableau = pd.DataFrame({
+            'Catégorie': categories['categorie'].fillna("Sans catégorie"),
+            'Moyenne mensuelle passée (€)': categories['moyenne_mensuelle'],
+            f'Sur {horizon} mois, bas (€)': categories['p10'],
+            f'Sur {horizon} mois, médiane (€)': categories['p50'],
+            f'Sur {horizon} mois, haut (€)': categories['p90'],
+        }).sort_values(f'Sur {horizon} mois, médiane (€)', ascending=False)
+        st.dataframe(
+            tableau.style.format({c: '{:,.2f}' for c in tableau.columns if c.endswith('(€)')}),
+            use_container_width=True,
+            hide_index=True
+        )
+        bas, median, haut = projection['revenus']
+        st.caption(
+            f"Revenus sur {horizon} mois : {median:,.2f} € (de {bas:,.2f} à {haut:,.2f} €). "
+            "Bas et haut : 10 % et 90 % des trajectoires.".replace(",", " ")
+        )
+
+
+@st.fragment
+def export_donnees():
+    # Export de données
+    st.subheader("Export des données")
+    st.write("Téléchargez vos données pour analyses externes :")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
         if st.button("📥 Exporter en CSV", use_container_width=True):
             csv_data = export_data(user_id, format='csv')
             col_csv1, col_csv2, col_csv3 = st.columns(3)
@@ -154,13 +224,41 @@ with col1:
                     mime="text/csv"
                 )
 
-with col2:
+    with col2:
         if st.button("📊 Exporter en Excel", use_container_width=True):
-            excel_data = export_data(user_id, format='excel')
+            # L'export tourne dans un thread de fond : la page reste réactive
+            ancien = st.session_state.get('export_excel')
+            if ancien is not None and ancien.done:
+                ancien.cleanup()
+            st.session_state.export_excel = start_excel_export(user_id)
+
+        job = st.session_state.get('export_excel')
+        if job is not None and not job.done:
+            # Seul ce fragment est réexécuté chaque seconde pendant l'export
+            @st.fragment(run_every=1)
+            def suivi_export_excel():
+                if job.done:
+                    st.rerun()
+                st.progress(job.progress, text=job.message)
+
+            suivi_export_excel()
+        elif job is not None and job.error is not None:
+            st.error(f"L'export Excel a échoué : {job.error}")
+        elif job is not None:
             st.download_button(
                 label="📊 Télécharger Excel",
-                data=excel_data,
+                data=job.read(),
                 file_name=f"budget_complet_{username}_{datetime.now().strftime('%Y%m%d')}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
+
+analyse_periode()
+
+st.divider()
+
+projection_solde()
+
+st.divider()
+
+export_donnees()
@@ -0,0 +1,238 @@
+"""
+Page d'administration : dimensionnement du cache de lecture, suivi des requêtes SQL,
+archivage des mois anciens, journal des modifications, transactions récurrentes et profils des reruns
+"""
+import streamlit as st
+from src.archive import ARCHIVE_MONTHS, archive_dir, archive_old_months
+from src.auth import is_admin
+from src.cache import CACHE, VERSIONS
+from src.data_operations import cache_stats, clear_cache, check_cache_consistency
+from src.database import QUERY_STATS, QUERY_TIMEOUT, SLOW_QUERY
+from src.disk_cache import disk_cache_path, disk_cache_stats
+from src.journal import RETENTION_DAYS, compact_journal, last_sequence, list_consumers
+from src.recurrences import materialize_recurrences
+from src.profiling import (
+    profile_page, profiling_enabled, list_profiles, top_functions, collapsed_stacks, profile_path
+)
+
+profile_page(__file__)
+
+# Vérification de l'authentification
+username = st.session_state.get('username')
+if not username:
+    st.error("Vous devez être connecté pour accéder à cette page.")
+    st.stop()
+
+if not is_admin(username):
+    st.error("Cette page est réservée aux administrateurs (variable d'environnement BUDGET_ADMINS).")
+    st.stop()
+
+st.title("🛠️ Administration")
+
+# Cache de lecture
+st.subheader("Cache de lecture")
+stats = cache_stats()
+
+hits, misses = stats['Hits'].sum(), stats['Misses'].sum()
+col1, col2, col3, col4 = st.columns(4)
+
+with col1:
+    st.metric("Entrées", int(stats['Entrées'].sum()))
+
+with col2:
+    st.metric(
+        "Mémoire",
+        f"{CACHE.total_bytes() / 1024 / 1024:,.1f} / {CACHE.max_bytes / 1024 / 1024:,.0f} Mo".replace(",", " ")
+    )
+
+with col3:
+    st.metric("Taux de hit", f"{100 * hits / (hits + misses) if hits + misses else 0:.1f}%")
+
+with col4:
+    st.metric("Évictions", int(stats['Évictions'].sum() + stats['Expirations'].sum()))
+
+stats['Mémoire (Mo)'] = stats.pop('Octets') / 1024 / 1024
+st.dataframe(
+    stats.style.format({'Taux de hit (%)': '{:.1f}', 'Mémoire (Mo)': '{:.2f}'}),
+    use_container_width=True,
+    hide_index=True
+)
+
+disque = disk_cache_stats()
+if disque.empty:
+    st.caption("Cache disque désactivé (BUDGET_DISK_CACHE=1 pour le conserver entre deux démarrages).")
+else:
+    d = disque.iloc[0]
+    lectures = d['hits'] + d['misses']
+    st.caption(
+        f"Cache disque {disk_cache_path().name} : {int(d['entrees'])} entrées, "
+        f"{d['octets'] / 1024 / 1024:,.1f} Mo, {int(d['recharges'])} rechargées au démarrage, "
+        f"taux de hit {100 * d['hits'] / lectures if lectures else 0:.1f}%, {int(d['evictions'])} évictions"
+    )
+if VERSIONS.store is None:
+    st.caption("Versions du cache propres à ce processus (BUDGET_CACHE_COHERENCE=1 pour plusieurs processus sur la base).")
+else:
+    st.caption("Versions du cache partagées entre processus : les écritures des autres processus écartent les entrées périmées.")
+
+col1, col2 = st.columns(2)
+
+with col1:
+    if st.button("🗑️ Vider le cache"):
+        clear_cache()
+        st.success("✅ Cache vidé.")
+        st.rerun()
+
+with col2:
+    verifier = st.button("🔎 Vérifier la cohérence")
+
+if verifier:
+    # Relit chaque entrée à jour : les patchs d'écriture traversante doivent égaler la base
+    rapport = check_cache_consistency()
+    ecarts = rapport[~rapport['Cohérent']]
+    if ecarts.empty:
+        st.success(f"✅ {len(rapport)} entrées identiques à une lecture fraîche.")
+    else:
+        st.error(f"❌ {len(ecarts)} entrées sur {len(rapport)} diffèrent de la base.")
+        st.dataframe(ecarts, use_container_width=True, hide_index=True)
+
+st.divider()
+
+# Requêtes SQL
+st.subheader("Requêtes SQL")
+st.caption(
+    f"Lectures en lecture seule, interrompues au-delà de {QUERY_TIMEOUT:g} s "
+    f"(BUDGET_QUERY_TIMEOUT) ; lentes au-delà de {SLOW_QUERY:g} s (BUDGET_SLOW_QUERY)."
+)
+sql = QUERY_STATS.snapshot()
+col1, col2, col3, col4 = st.columns(4)
+
+with col1:
+    st.metric("Requêtes", sql['queries'])
+
+with col2:
+    st.metric("Temps SQL cumulé", f"{sql['seconds']:.2f} s")
+
+with col3:
+    st.metric("Lectures lentes", sql['slow'])
+
+with col4:
+    st.metric("Lectures annulées", sql['cancelled'])
+
+st.divider()
+
+# Archivage des mois anciens
+st.subheader("Archivage des mois anciens")
+st.caption(
+    f"Les mois antérieurs aux {ARCHIVE_MONTHS} derniers (BUDGET_ARCHIVE_MONTHS) quittent SQLite pour "
+    f"des fichiers Parquet par utilisateur et par année ({archive_dir()}) ; ils restent consultables "
+    "et comptés dans les totaux, mais ne sont plus modifiables."
+)
+
+if st.button("🗄️ Archiver maintenant"):
+    with st.spinner("Archivage en cours..."):
+        rapport = archive_old_months()
+    if rapport.empty:
+        st.info("Aucun mois à archiver.")
+    else:
+        st.success(f"✅ {int(rapport['lignes'].sum())} lignes archivées pour {rapport['user_id'].nunique()} utilisateur(s).")
+        st.dataframe(rapport, use_container_width=True, hide_index=True)
+
+st.divider()
+
+# Journal des modifications
+st.subheader("Journal des modifications")
+consommateurs = list_consumers()
+st.caption(
+    f"Dernier numéro : {last_sequence()} ; {len(consommateurs)} consommateur(s) enregistré(s). "
+    f"Le compactage purge ce que tous ont lu et ce qui date de plus de {RETENTION_DAYS} jours "
+    "(BUDGET_JOURNAL_RETENTION_DAYS)."
+)
+if not consommateurs.empty:
+    st.dataframe(consommateurs, use_container_width=True, hide_index=True)
+
+if st.button("🧹 Compacter le journal"):
+    with st.spinner("Compactage en cours..."):
+        supprimees = compact_journal()
+    st.success(f"✅ {supprimees['lues']} lue(s) par tous, {supprimees['expirees']} expirée(s).")
+
+st.divider()
+
+# Transactions récurrentes
+st.subheader("Transactions récurrentes")
+st.caption(
+    "Les occurrences échues sont générées une fois par jour au premier passage ; ce bouton "
+    "rattrape immédiatement celles de tous les utilisateurs."
+)
+
+if st.button("🔁 Générer maintenant"):
+    with st.spinner("Génération en cours..."):
+        rapport = materialize_recurrences()
+    if rapport.empty:
+        st.info("Aucune occurrence échue.")
+    else:
+        st.success(f"✅ {int(rapport['lignes'].sum())} transaction(s) générée(s) pour {rapport['user_id'].nunique()} utilisateur(s).")
+        st.dataframe(rapport, use_container_width=True, hide_index=True)
+
+st.divider()
+
+# Profilage des reruns
+st.subheader("Profilage des reruns")
+st.caption(
+    "Ajoutez ?profile=1 à l'URL (ou BUDGET_PROFILING=1) pour exécuter chaque rerun de vos pages "
+    "sous cProfile ; ?profile=0 l'arrête."
+)
+
+
+def basculer_profilage():
+    """Le choix de l'interrupteur l'emporte sur le paramètre d'URL"""
+    st.session_state['profilage'] = st.session_state['interrupteur_profilage']
+    st.query_params.pop('profile', None)
+
+
+st.toggle("Profiler mes reruns (cette session)", value=profiling_enabled(),
+          key='interrupteur_profilage', on_change=basculer_profilage)
+
+profils = list_profiles()
+if profils.empty:
+    st.info("Aucun profil enregistré.")
+    st.stop()
+
+st.dataframe(
+    profils.drop(columns=['id']).style.format({'Durée (ms)': '{:.0f}'}),
+    use_container_width=True,
+    hide_index=True
+)
+
+libelles = {
+    p['id']: f"{p['Date']:%d/%m %H:%M:%S} - {p['Page']} - {p['Utilisateur']} ({p['Durée (ms)']:.0f} ms)"
+    for p in profils.to_dict('records')
+}
+profil_id = st.selectbox("Profil", options=list(libelles), format_func=libelles.get)
+tri = st.radio("Tri", options=['cumulative', 'tottime'], horizontal=True,
+               format_func={'cumulative': "Temps cumulé", 'tottime': "Temps propre"}.get)
+
+st.dataframe(
+    top_functions(profil_id, tri=tri).style.format({
+        'Temps propre (ms)': '{:.2f}', 'Temps cumulé (ms)': '{:.2f}', 'Par appel (ms)': '{:.3f}'
+    }),
+    use_container_width=True,
+    hide_index=True
+)
+
+col1, col2 = st.columns(2)
+
+with col1:
+    st.download_button(
+        "📥 pstats (snakeviz, pstats)",
+        data=profile_path(profil_id).read_bytes(),
+        file_name=f"{profil_id}.pstats",
+        mime="application/octet-stream"
+    )
+
+with col2:
+    st.download_button(
+        "🔥 Pile repliée (flamegraph.pl, speedscope)",
+        data=collapsed_stacks(profil_id).encode('utf-8'),
+        file_name=f"{profil_id}.folded",
+        mime="text/plain"
+    )
@@ -0,0 +1,106 @@
+"""
+Page des transactions récurrentes (loyer, salaire, abonnements...)
+"""
+import streamlit as st
+import pandas as pd
+from src.data_operations import list_categories
+from src.database import get_user_id
+from src.fragments import rerun_fragment
+from src.profiling import profile_page
+from src.recurrences import (
+    FREQUENCES, list_recurrences, add_recurrence, toggle_recurrence, delete_recurrence, materialize_recurrences
+)
+
+profile_page(__file__)
+
+# Vérification de l'authentification
+username = st.session_state.get('username')
+if not username:
+    st.error("Vous devez être connecté pour accéder à cette page.")
+    st.stop()
+
+user_id = get_user_id(username)
+
+st.title("🔁 Transactions récurrentes")
+st.caption(
+    "Les revenus et dépenses récurrents sont ajoutés automatiquement à leur date "
+    "(génération quotidienne, mois manqués rattrapés)."
+)
+
+
+@st.fragment
+def ajout_recurrence():
+    st.subheader("Nouvelle règle")
+    cats_actives = list_categories(user_id, actives_seulement=True)
+
+    with st.form("form_recurrence", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            type_ = st.radio("Type", ['depense', 'revenu'], horizontal=True,
+                             format_func={'depense': "Dépense", 'revenu': "Revenu"}.get)
+            libelle = st.text_input("Libellé", placeholder="Ex : Loyer, Salaire, Netflix")
+            montant = st.number_input("Montant (€)", min_value=0.01, step=10.0, format="%.2f")
+            categorie = st.selectbox(
+                "Catégorie (dépenses)",
+                cats_actives['id'].tolist(),
+                format_func=dict(zip(cats_actives['id'], cats_actives['chemin'])).get
+            )
+        with col2:
+            c1, c2 = st.columns(2)
+            intervalle = c1.number_input("Tous les", min_value=1, value=1, step=1)
+            frequence = c2.selectbox("Fréquence", list(FREQUENCES), format_func=FREQUENCES.get)
+            debut = st.date_input("Première occurrence", value=pd.Timestamp.today().date())
+            fin = st.date_input("Dernière occurrence (facultatif)", value=None)
+
+        if st.form_submit_button("➕ Ajouter la règle", use_container_width=True):
+            if not libelle:
+                st.warning("Veuillez saisir un libellé.")
+            elif type_ == 'depense' and categorie is None:
+                st.warning("Veuillez choisir une catégorie.")
+            elif fin is not None and fin < debut:
+                st.warning("La dernière occurrence précède la première.")
+            else:
+                add_recurrence(user_id, type_, libelle, montant, frequence, debut, fin,
+                               int(categorie) if type_ == 'depense' else None, int(intervalle))
+                # Occurrences déjà échues (début dans le passé) générées tout de suite
+                materialize_recurrences(user_ids=[user_id])
+                st.rerun()
+
+
+@st.fragment
+def regles():
+    st.subheader("Règles")
+    df = list_recurrences(user_id)
+    if df.empty:
+        st.info("Aucune règle de récurrence.")
+        return
+
+    for row in df.itertuples(index=False):
+        col1, col2, col3 = st.columns([4, 1, 1])
+        periodicite = f"tous les {row.intervalle} {FREQUENCES[row.frequence]}" if row.intervalle > 1 \
+            else {'mois': "tous les mois", 'semaine': "toutes les semaines", 'jour': "tous les jours"}[row.frequence]
+        signe = "+" if row.type == 'revenu' else "−"
+        col1.write(
+            f"**{row.libelle}** {signe}{row.montant:,.2f} € {periodicite}"
+            + (f" · {row.categorie}" if row.categorie else "")
+        )
+        col1.caption(
+            f"Depuis le {row.debut}" + (f", jusqu'au {row.fin}" if row.fin else "")
+            + (f" · dernière occurrence : {row.derniere}" if row.derniere else "")
+            + ("" if row.actif else " · suspendue")
+        )
+        if col2.button("⏸️ Suspendre" if row.actif else "▶️ Reprendre", key=f"rec_toggle_{row.id}"):
+            toggle_recurrence(user_id, int(row.id), 0 if row.actif else 1)
+            if not row.actif:
+                materialize_recurrences(user_ids=[user_id])
+            rerun_fragment()
+        if col3.button("🗑️ Supprimer", key=f"rec_suppr_{row.id}"):
+            delete_recurrence(user_id, int(row.id))
+            rerun_fragment()
+
+
+ajout_recurrence()
+
+st.divider()
+
+regles()
@@ -0,0 +1,165 @@
+"""
+Page des règles de catégorisation automatique des dépenses
+"""
+import streamlit as st
+import pandas as pd
+from src.categorization import (
+    TYPES, list_rules, add_rule, toggle_rule, delete_rule, learn_suggestions, recategorize_history
+)
+from src.data_operations import avec_noms, list_categories
+from src.database import get_user_id
+from src.fragments import rerun_fragment
+from src.profiling import profile_page
+
+profile_page(__file__)
+
+# Vérification de l'authentification
+username = st.session_state.get('username')
+if not username:
+    st.error("Vous devez être connecté pour accéder à cette page.")
+    st.stop()
+
+user_id = get_user_id(username)
+
+st.title("🏷️ Règles de catégorisation")
+st.caption(
+    "Une dépense saisie sans catégorie prend celle de la première règle qui reconnaît sa description "
+    "(priorité la plus haute, puis règle bornée par montant, puis la plus ancienne)."
+)
+
+
+@st.fragment
+def ajout_regle():
+    st.subheader("Nouvelle règle")
+    cats_actives = list_categories(user_id, actives_seulement=True)
+
+    with st.form("form_regle", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            type_ = st.radio("Type", list(TYPES), horizontal=True, format_func=TYPES.get)
+            motif = st.text_input(
+                "Motif", placeholder="Ex : carrefour, auchan · amzn, amazon · ^PRLV SEPA .*EDF",
+                help="Mots-clés et alias : plusieurs variantes séparées par des virgules. Les alias "
+                     "reconnaissent aussi les noms collés ou tronqués des relevés (« amzn » dans « AMZNMKTP »)."
+            )
+            categorie = st.selectbox(
+                "Catégorie",
+                cats_actives['id'].tolist(),
+                format_func=dict(zip(cats_actives['id'], cats_actives['chemin'])).get
+            )
+        with col2:
+            c1, c2 = st.columns(2)
+            montant_min = c1.number_input("Montant min (€)", min_value=0.0, value=None, step=1.0, format="%.2f")
+            montant_max = c2.number_input("Montant max (€)", min_value=0.0, value=None, step=1.0, format="%.2f")
+            priorite = st.number_input("Priorité", value=0, step=1,
+                                       help="La règle de priorité la plus haute l'emporte.")
+
+        if st.form_submit_button("➕ Ajouter la règle", use_container_width=True):
+            if categorie is None:
+                st.warning("Veuillez choisir une catégorie.")
+            else:
+                try:
+                    add_rule(user_id, type_, motif, int(categorie), montant_min, montant_max, int(priorite))
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    st.rerun()
+
+
+@st.fragment
+def regles():
+    st.subheader("Règles")
+    df = list_rules(user_id)
+    if df.empty:
+        st.info("Aucune règle de catégorisation.")
+        return
+
+    for row in avec_noms(user_id, df).itertuples(index=False):
+        col1, col2, col3 = st.columns([4, 1, 1])
+        bornes = ""
+        if pd.notna(row.montant_min) or pd.notna(row.montant_max):
+            bornes = " · " + " et ".join(
+                texte for texte in (
+                    f"≥ {row.montant_min:,.2f} €" if pd.notna(row.montant_min) else None,
+                    f"≤ {row.montant_max:,.2f} €" if pd.notna(row.montant_max) else None,
+                ) if texte
+            )
+        col1.write(f"**{row.motif}** → {row.categorie}")
+        col1.caption(
+            TYPES[row.type] + bornes
+            + (f" · priorité {row.priorite}" if row.priorite else "")
+            + ("" if row.actif else " · suspendue")
+        )
+        if col2.button("⏸️ Suspendre" if row.actif else "▶️ Reprendre", key=f"regle_toggle_{row.id}"):
+            toggle_rule(user_id, int(row.id), 0 if row.actif else 1)
+            rerun_fragment()
+        if col3.button("🗑️ Supprimer", key=f"regle_suppr_{row.id}"):
+            delete_rule(user_id, int(row.id))
+            rerun_fragment()
+
+
+@st.fragment
+def suggestions():
+    st.subheader("Suggestions")
+    st.caption(
+        "Mots fréquents des descriptions que vos règles ne couvrent pas encore, presque toujours "
+        "rangés dans la même catégorie."
+    )
+    df = learn_suggestions(user_id)
+    if df.empty:
+        st.info("Aucune suggestion pour l'instant.")
+        return
+
+    for row in df.itertuples(index=False):
+        col1, col2 = st.columns([5, 1])
+        col1.write(f"**{row.motif}** → {row.categorie}")
+        col1.caption(f"{row.nb} dépense(s), {row.precision:.0%} dans cette catégorie · ex. « {row.exemple} »")
+        if col2.button("➕ Créer", key=f"suggestion_{row.motif}_{row.categorie_id}"):
+            add_rule(user_id, 'mot', row.motif, int(row.categorie_id))
+            rerun_fragment()
+
+
+@st.fragment
+def recategorisation():
+    st.subheader("Recatégoriser l'historique")
+    toutes_cats = list_categories(user_id, actives_seulement=False)
+    noms = dict(zip(toutes_cats['id'], toutes_cats['chemin']))
+    defaut = toutes_cats.loc[toutes_cats['nom'] == "Autres", 'id'].tolist()
+    perimetre = st.multiselect(
+        "Dépenses actuellement dans (vide : toutes)", list(noms), default=defaut, format_func=noms.get,
+        key="perimetre_recategorisation"
+    )
+    categories = [int(c) for c in perimetre] or None
+
+    col1, col2 = st.columns(2)
+    if col1.button("🔍 Aperçu", use_container_width=True):
+        apercu = recategorize_history(user_id, categories, dry_run=True)
+        if apercu.empty:
+            st.info("Aucune dépense ne changerait de catégorie.")
+        else:
+            st.dataframe(apercu, use_container_width=True, hide_index=True,
+                         column_config={'montant': st.column_config.NumberColumn("Montant (€)", format="%.2f €")})
+    if col2.button("🏷️ Appliquer les règles", use_container_width=True):
+        with st.spinner("Recatégorisation en cours..."):
+            rapport = recategorize_history(user_id, categories)
+        if rapport.empty:
+            st.info("Aucune dépense n'a changé de catégorie.")
+        else:
+            st.success(f"✅ {int(rapport['nb'].sum())} dépense(s) recatégorisée(s).")
+            st.dataframe(rapport, use_container_width=True, hide_index=True,
+                         column_config={'montant': st.column_config.NumberColumn("Montant (€)", format="%.2f €")})
+
+
+ajout_regle()
+
+st.divider()
+
+regles()
+
+st.divider()
+
+suggestions()
+
+st.divider()
+
+recategorisation()
@@ -0,0 +1,123 @@
+"""
+Alertes de dépassement de budget
+
+Une passe ensembliste compare, pour tous les utilisateurs (ou quelques-uns), les dépenses
+du mois de chaque catégorie budgétée, sous-catégories comprises, à son budget :
+seuils BUDGET_ALERT_THRESHOLDS (80 et 100 % par défaut) et dépassement projeté au rythme
+actuel pour le mois en cours. Les alertes déclenchées sont enregistrées une seule fois par
+(utilisateur, mois, catégorie, règle) ; la barre latérale les lit par l'index
+(user_id, vue) sans rien recalculer.
+"""
+import calendar
+import os
+from datetime import date
+
+import pandas as pd
+import streamlit as st
+
+from .cache import cached_reader, invalidate
+from .database import get_connection, read_query
+
+
+# Seuils en pourcentage du budget
+SEUILS = tuple(int(s) for s in os.getenv("BUDGET_ALERT_THRESHOLDS", "80,100").split(",") if s.strip())
+
+# Jours écoulés avant de projeter la fin du mois (trop bruité en tout début de mois)
+PROJECTION_JOURS_MIN = 7
+
+
+def _evaluation(filtre: str) -> str:
+    """Alertes à déclencher pour le mois :mois (règles : seuil_<pct>, projection)"""
+    regles = " UNION ALL ".join(f"SELECT 'seuil_{s}', {s}" for s in SEUILS) or "SELECT NULL, NULL WHERE 0"
+    return f"""
+        WITH dep AS (
+            SELECT d.user_id, cc.ancetre_id AS categorie_id, SUM(d.c) AS c
+            FROM (
+                SELECT user_id, categorie_id, montant_centimes AS c FROM depenses
+                WHERE jour BETWEEN :debut AND :fin {filtre}
+                UNION ALL
+                SELECT user_id, categorie_id, total_centimes FROM rollup_depenses
+                WHERE mois = :mois {filtre}
+            ) d JOIN categories_closure cc ON cc.descendant_id = d.categorie_id
+            GROUP BY d.user_id, cc.ancetre_id
+        ),
+        etat AS (
+            SELECT b.user_id, b.categorie_id, b.budget_centimes AS budget, COALESCE(dep.c, 0) AS depense
+            FROM budgets b
+            JOIN categories c ON c.id = b.categorie_id AND c.actif = 1
+            LEFT JOIN dep ON dep.user_id = b.user_id AND dep.categorie_id = b.categorie_id
+            WHERE b.mois = :mois AND b.budget_centimes > 0 {filtre.replace('user_id', 'b.user_id')}
+        ),
+        regles(regle, pct) AS ({regles})
+        INSERT OR IGNORE INTO alertes(user_id, mois, categorie_id, regle, depense_centimes, budget_centimes)
+        SELECT etat.user_id, :mois, etat.categorie_id, regles.regle, etat.depense, etat.budget
+        FROM etat CROSS JOIN regles
+        WHERE etat.depense * 100 >= etat.budget * regles.pct
+        UNION ALL
+        SELECT user_id, :mois, categorie_id, 'projection', depense, budget
+        FROM etat
+        WHERE :ecoules >= {PROJECTION_JOURS_MIN} AND depense < budget AND depense * :jours_mois >= budget * :ecoules
+        RETURNING user_id, mois, categorie_id, regle
+    """
+
+
+def evaluate_alerts(mois: str = None, today: date = None, user_ids: list = None, conn=None) -> pd.DataFrame:
+    """Déclenche les alertes du mois (mois courant par défaut) de tous les utilisateurs, ou des
+    `user_ids` ; retourne les alertes nouvellement déclenchées"""
+    today = today or date.today()
+    mois = mois or today.strftime('%Y-%m')
+    annee, m = (int(x) for x in mois.split("-"))
+    jours_mois = calendar.monthrange(annee, m)[1]
+    # Projection seulement pour le mois en cours
+    ecoules = today.day if (annee, m) == (today.year, today.month) else 0
+    filtre = ""
+    if user_ids is not None:
+        filtre = f"AND user_id IN ({','.join(str(int(u)) for u in user_ids) or 'NULL'})"
+
+    conn = conn or get_connection()
+    with conn:
+        lignes = conn.execute(_evaluation(filtre), {
+            'mois': mois,
+            'debut': date(annee, m, 1).toordinal(),
+            'fin': date(annee, m, jours_mois).toordinal(),
+            'jours_mois': jours_mois,
+            'ecoules': ecoules,
+        }).fetchall()
+    alertes = pd.DataFrame(lignes, columns=['user_id', 'mois', 'categorie_id', 'regle'])
+    for user_id in alertes['user_id'].unique():
+        invalidate(int(user_id), 'alertes')
+    return alertes
+
+
+def evaluate_due(user_id: int, jour: date):
+    """Alertes du mois de l'utilisateur connecté, une fois par session et par jour (fait avancer
+    la projection) ; la passe de tous les utilisateurs est celle du cron (utils/evaluate_alerts)"""
+    if st.session_state.get('alertes_du') == (user_id, jour):
+        return None
+    alertes = evaluate_alerts(today=jour, user_ids=[user_id])
+    st.session_state.alertes_du = (user_id, jour)
+    return alertes
+
+
+@cached_reader(tables=('alertes', 'categories'), max_entries=2000, ttl=3600, max_mb=4)
+def list_alertes(user_id: int) -> pd.DataFrame:
+    """Alertes non lues d'un utilisateur, les plus récentes d'abord"""
+    q = """
+        SELECT a.id, a.mois, a.categorie_id, c.nom AS categorie, a.regle,
+               a.depense_centimes / 100.0 AS depense, a.budget_centimes / 100.0 AS budget, a.declenchee_le
+        FROM alertes a JOIN categories c ON c.id = a.categorie_id
+        WHERE a.user_id = ? AND a.vue = 0
+        ORDER BY a.id DESC
+    """
+    return read_query(q, (user_id,))
+
+
+def dismiss_alertes(user_id: int, ids: list = None):
+    """Marque comme lues les alertes `ids` (toutes si None)"""
+    conn = get_connection()
+    with conn:
+        if ids is None:
+            conn.execute("UPDATE alertes SET vue = 1 WHERE user_id = ? AND vue = 0;", (user_id,))
+        else:
+            conn.executemany("UPDATE alertes SET vue = 1 WHERE id = ? AND user_id = ?;", [(int(i), user_id) for i in ids])
+    invalidate(user_id, 'alertes')
@@ -1,28 +1,65 @@
 """
 Module d'analyses et de visualisations pour data scientists
 """
+import threading
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from .data_operations import get_all_data
 
 
-def monthly_summary(user_id: int, mois: str) -> dict:
-    """Calcule le résumé mensuel"""
+class MonthBundle:
+    """Données d'un mois lues une fois par rerun et partagées par le résumé et les graphiques"""
+
+    def __init__(self, revenus: pd.DataFrame, depenses: pd.DataFrame, budgets: pd.DataFrame):
+        self.revenus = revenus
+        self.depenses = depenses
+        self.budgets = budgets
+        # Montants stockés en centimes : l'arrondi au centime élimine la dérive des flottants
+        self.total_revenus = round(float(revenus['montant'].sum()), 2) if not revenus.empty else 0.0
+        self.par_categorie = (
+            depenses.groupby('categorie')['montant'].sum() if not depenses.empty else pd.Series(dtype=float)
+        )
+        self.budget_map = dict(zip(budgets['categorie'], budgets['budget']))
+
+
+@st.cache_resource
+def _lecteurs() -> ThreadPoolExecutor:
+    """Threads partagés par les sessions pour les lectures parallèles d'un mois"""
+    return ThreadPoolExecutor(max_workers=6, thread_name_prefix="lecture-mois")
+
+
+def _dans_le_contexte(ctx, lecteur, *args):
+    # Contexte du rerun appelant : les appels Streamlit des lecteurs (pool en st.cache_resource) s'y rattachent
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return lecteur(*args)
+
+
+def load_month(user_id: int, mois: str) -> MonthBundle:
+    """Revenus, dépenses et budgets du mois, lus en parallèle sur les connexions du pool de lecture"""
     from .data_operations import list_revenus, list_depenses, list_budgets
-    
-    revenus = list_revenus(user_id, mois)
-    depenses = list_depenses(user_id, mois)
-    budgets = list_budgets(user_id, mois)
 
-    total_revenus = float(revenus['montant'].sum()) if not revenus.empty else 0.0
-    total_depenses = float(depenses['montant'].sum()) if not depenses.empty else 0.0
+    ctx = get_script_run_ctx()
+    taches = [
+        _lecteurs().submit(_dans_le_contexte, ctx, lecteur, user_id, mois)
+        for lecteur in (list_revenus, list_depenses, list_budgets)
+    ]
+    return MonthBundle(*(tache.result() for tache in taches))
+
+
+def monthly_summary(user_id: int, mois: str, bundle: MonthBundle = None) -> dict:
+    """Calcule le résumé mensuel"""
+    bundle = bundle or load_month(user_id, mois)
+    return summarize_month(bundle.total_revenus, bundle.par_categorie, bundle.budget_map)
+
 
-    # Dépenses par catégorie
-    par_categorie = depenses.groupby('categorie')['montant'].sum() if not depenses.empty else pd.Series(dtype=float)
-    budget_map = dict(zip(budgets['categorie'], budgets['budget']))
+def summarize_month(total_revenus: float, par_categorie: pd.Series, budget_map: dict) -> dict:
+    """Résumé d'un mois à partir des totaux : dépenses par catégorie et budgets par catégorie"""
+    total_depenses = round(float(par_categorie.sum()), 2) if not par_categorie.empty else 0.0
 
     lignes = []
     categories = sorted(set(budget_map.keys()) | set(par_categorie.index))
@@ -49,19 +86,48 @@ def monthly_summary(user_id: int, mois: str) -> dict:
     }
 
 
-def plot_category_comparison(user_id: int, mois: str):
+def category_level(rollup: pd.DataFrame, parent_id: int = None) -> pd.DataFrame:
+    """Détail par catégorie (colonnes de summarize_month) des enfants de `parent_id`
+    (racines si None), à partir de data_operations.category_rollup.
+
+    Budget d'un nœud : le sien s'il en a un, sinon la somme de ceux de ses sous-catégories.
+    Les dépenses rangées directement sur le parent forment une ligne « (direct) ».
+    """
+    if parent_id is None:
+        niveau = rollup[rollup['parent_id'].isna()]
+    else:
+        niveau = rollup[rollup['parent_id'] == parent_id]
+    budget = niveau['budget'].fillna(niveau['budget_enfants'])
+    df = pd.DataFrame({'Catégorie': niveau['nom'], 'Budget': budget, 'Dépensé': niveau['depense']})
+
+    if parent_id is not None:
+        parent = rollup[rollup['id'] == parent_id].iloc[0]
+        direct = round(float(parent['depense'] - niveau['depense'].sum()), 2)
+        if direct:
+            df.loc[len(df)] = [f"{parent['nom']} (direct)", 0.0, direct]
+
+    # Mêmes lignes que summarize_month : budget défini ou dépenses non nulles
+    df = df[niveau['budget'].notna().reindex(df.index, fill_value=False) | (df['Budget'] > 0) | (df['Dépensé'] != 0)]
+    df = df.assign(
+        **{
+            'Reste (catégorie)': df['Budget'] - df['Dépensé'],
+            'Pourcentage utilisé': (df['Dépensé'] / df['Budget'] * 100).where(df['Budget'] > 0, 0),
+        }
+    )
+    return df.sort_values('Catégorie', ignore_index=True)
+
+
+def plot_category_comparison(user_id: int, mois: str, bundle: MonthBundle = None):
     """Graphique comparant budget vs dépenses par catégorie"""
-    from .data_operations import list_budgets, list_depenses
+    bundle = bundle or load_month(user_id, mois)
+    budgets = bundle.budgets
     
-    budgets = list_budgets(user_id, mois)
-    depenses = list_depenses(user_id, mois)
-    
-    if budgets.empty and depenses.empty:
+    if budgets.empty and bundle.depenses.empty:
         st.info("Aucune donnée disponible pour ce mois.")
         return
     
     # Préparer les données
-    depenses_par_cat = depenses.groupby('categorie')['montant'].sum() if not depenses.empty else pd.Series()
+    depenses_par_cat = bundle.par_categorie
     
     df_viz = pd.DataFrame({
         'Catégorie': budgets['categorie'].tolist() if not budgets.empty else depenses_par_cat.index.tolist(),
@@ -101,23 +167,18 @@ def plot_category_comparison(user_id: int, mois: str):
     st.plotly_chart(fig, use_container_width=True)
 
 
-def plot_trends(user_id: int, months: list):
-    """Graphique des tendances sur plusieurs mois"""
-    from .data_operations import list_revenus, list_depenses
-    
-    revenus_totaux = []
-    depenses_totales = []
+def plot_trends(user_id: int, months: list, prevision: pd.DataFrame = None):
+    """Graphique des tendances sur plusieurs mois, avec la bande de prévision des dépenses
+    (`prevision` : frame 'total' de forecast.forecast_spending) si fournie"""
+    from .data_operations import monthly_totals
     
-    for mois in months:
-        rev = list_revenus(user_id, mois)
-        dep = list_depenses(user_id, mois)
-        revenus_totaux.append(rev['montant'].sum() if not rev.empty else 0)
-        depenses_totales.append(dep['montant'].sum() if not dep.empty else 0)
+    # Une requête groupée par table au lieu de deux lectures par mois
+    totaux = monthly_totals(user_id, months)
     
     df_trends = pd.DataFrame({
-        'Mois': months,
-        'Revenus': revenus_totaux,
-        'Dépenses': depenses_totales
+        'Mois': totaux['mois'],
+        'Revenus': totaux['revenus'],
+        'Dépenses': totaux['depenses']
     })
     
     fig = go.Figure()
@@ -137,6 +198,43 @@ def plot_trends(user_id: int, months: list):
         name='Dépenses',
         line=dict(color='red', width=2)
     ))
+
+    if prevision is not None and not prevision.empty:
+        # Raccord au dernier mois clos affiché, avant le mois en cours
+        prevision = prevision[['mois', 'prevision', 'basse', 'haute']]
+        clos = df_trends[df_trends['Mois'] < prevision['mois'].iloc[0]].tail(1)
+        if not clos.empty:
+            depart = float(clos['Dépenses'].iloc[0])
+            prevision = pd.concat([
+                pd.DataFrame({'mois': clos['Mois'], 'prevision': depart, 'basse': depart, 'haute': depart}),
+                prevision
+            ], ignore_index=True)
+
+        fig.add_trace(go.Scatter(
+            x=prevision['mois'],
+            y=prevision['haute'],
+            mode='lines',
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=prevision['mois'],
+            y=prevision['basse'],
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor='rgba(255, 0, 0, 0.15)',
+            name='Bande à 80 %',
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=prevision['mois'],
+            y=prevision['prevision'],
+            mode='lines+markers',
+            name='Dépenses prévues',
+            line=dict(color='red', width=2, dash='dash')
+        ))
     
     fig.update_layout(
         title='Évolution des Revenus et Dépenses',
@@ -149,17 +247,60 @@ def plot_trends(user_id: int, months: list):
     st.plotly_chart(fig, use_container_width=True)
 
 
-def plot_category_distribution(user_id: int, mois: str):
+def plot_projection(bandes: pd.DataFrame):
+    """Graphique de la projection du solde (`bandes` : frame de projection.project_savings),
+    médiane et bandes à 50 % et 90 %"""
+    fig = go.Figure()
+
+    for haute, basse, opacite, nom in (('p95', 'p5', 0.12, 'Bande à 90 %'), ('p75', 'p25', 0.25, 'Bande à 50 %')):
+        fig.add_trace(go.Scatter(
+            x=bandes['mois'],
+            y=bandes[haute],
+            mode='lines',
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=bandes['mois'],
+            y=bandes[basse],
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor=f'rgba(0, 128, 0, {opacite})',
+            name=nom,
+            hoverinfo='skip'
+        ))
+
+    fig.add_trace(go.Scatter(
+        x=bandes['mois'],
+        y=bandes['p50'],
+        mode='lines+markers',
+        name='Solde médian',
+        line=dict(color='green', width=2)
+    ))
+    fig.add_hline(y=0, line=dict(color='red', width=1, dash='dot'))
+
+    fig.update_layout(
+        title='Projection du solde',
+        xaxis_title='Mois',
+        yaxis_title='Solde (€)',
+        height=400,
+        hovermode='x unified'
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def plot_category_distribution(user_id: int, mois: str, bundle: MonthBundle = None):
     """Graphique en camembert de la répartition des dépenses"""
-    from .data_operations import list_depenses
+    bundle = bundle or load_month(user_id, mois)
     
-    depenses = list_depenses(user_id, mois)
-    
-    if depenses.empty:
+    if bundle.depenses.empty:
         st.info("Aucune dépense pour ce mois.")
         return
     
-    depenses_par_cat = depenses.groupby('categorie')['montant'].sum().reset_index()
+    depenses_par_cat = bundle.par_categorie.reset_index()
     depenses_par_cat.columns = ['Catégorie', 'Montant']
     
     fig = px.pie(
@@ -175,9 +316,8 @@ def plot_category_distribution(user_id: int, mois: str):
 
 def export_data(user_id: int, format: str = 'csv'):
     """Exporte toutes les données de l'utilisateur"""
-    data = get_all_data(user_id)
-    
     if format == 'csv':
+        data = get_all_data(user_id)
         # Exporter chaque table en CSV
         return {
             'revenus': data['revenus'].to_csv(index=False).encode('utf-8'),
@@ -185,14 +325,16 @@ def export_data(user_id: int, format: str = 'csv'):
             'budgets': data['budgets'].to_csv(index=False).encode('utf-8')
         }
     elif format == 'excel':
-        # Exporter en Excel avec plusieurs feuilles
-        import io
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            data['revenus'].to_excel(writer, sheet_name='Revenus', index=False)
-            data['depenses'].to_excel(writer, sheet_name='Dépenses', index=False)
-            data['budgets'].to_excel(writer, sheet_name='Budgets', index=False)
-        return output.getvalue()
+        # Export synchrone ; la page Analyses passe par start_excel_export (arrière-plan)
+        from .exports import ExportJob
+        job = ExportJob(user_id)
+        try:
+            job.run()
+            if job.error:
+                raise job.error
+            return job.read()
+        finally:
+            job.cleanup()
     
     return None
 
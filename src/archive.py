@@ -0,0 +1,383 @@
+"""
+Archivage des mois anciens (données froides) en Parquet compressé
+
+Les dépenses et revenus des mois antérieurs à l'horizon BUDGET_ARCHIVE_MONTHS quittent les
+tables SQLite pour des fichiers Parquet par utilisateur et par année
+(<dossier>/<user_id>/<table>/<année>.parquet, compression zstd). Les totaux de ces mois
+restent dans SQLite (rollup_depenses, rollup_revenus), la liste des mois archivés dans
+archives_mois. Les lignes archivées sont en lecture seule ; les lecteurs de
+src.data_operations les fusionnent avec les lignes chaudes quand la période remonte
+dans le passé.
+"""
+import json
+import os
+from datetime import date
+from numbers import Number
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .cache import invalidate
+from .database import get_connection, get_db_path, read_query
+
+
+# Nombre de mois conservés dans SQLite (mois courant compris)
+ARCHIVE_MONTHS = int(os.getenv("BUDGET_ARCHIVE_MONTHS", "24"))
+
+# Colonnes archivées, par table
+COLONNES = {
+    'depenses': ['id', 'user_id', 'jour', 'categorie_id', 'description', 'montant_centimes'],
+    'revenus': ['id', 'user_id', 'mois', 'origine', 'montant_centimes'],
+}
+
+# date.fromordinal(EPOCH_ORDINAL) == 1970-01-01
+EPOCH_ORDINAL = 719163
+
+
+def archive_dir() -> Path:
+    """Dossier des archives : BUDGET_ARCHIVE_DIR, sinon 'archive' à côté de la base"""
+    return Path(os.getenv("BUDGET_ARCHIVE_DIR") or get_db_path().parent / "archive")
+
+
+def _fichier(user_id: int, table: str, annee: int) -> Path:
+    return archive_dir() / str(user_id) / table / f"{annee}.parquet"
+
+
+def _mois_de_jours(jours: pd.Series) -> pd.Series:
+    """Numéros de jour -> mois 'YYYY-MM' (vectorisé)"""
+    return pd.to_datetime(jours - EPOCH_ORDINAL, unit='D').dt.strftime('%Y-%m')
+
+
+def _bornes(mois: str) -> tuple:
+    """Premier et dernier numéro de jour d'un mois 'YYYY-MM'"""
+    annee, m = (int(x) for x in mois.split("-"))
+    return date(annee, m, 1).toordinal(), date(annee + (m == 12), m % 12 + 1, 1).toordinal() - 1
+
+
+def archived_months(user_id: int, conn=None) -> list:
+    """Mois archivés d'un utilisateur (ordre chronologique)"""
+    q = "SELECT mois FROM archives_mois WHERE user_id=? ORDER BY mois"
+    if conn is not None:
+        return [row[0] for row in conn.execute(q, (user_id,))]
+    return read_query(q, (user_id,))['mois'].tolist()
+
+
+# -----------------------
+# Lecture des partitions archivées
+# -----------------------
+def _lire(user_id: int, table: str, annees, filtres=None) -> pd.DataFrame:
+    """Lit les fichiers annuels existants, avec filtres poussés dans le lecteur Parquet"""
+    morceaux = [
+        pq.read_table(chemin, filters=filtres).to_pandas()
+        for chemin in (_fichier(user_id, table, a) for a in sorted(set(annees)))
+        if chemin.exists()
+    ]
+    if not morceaux:
+        return pd.DataFrame(columns=COLONNES[table])
+    return pd.concat(morceaux, ignore_index=True)
+
+
+def archived_depenses(user_id: int, debut: int, fin: int, mois_archives: list = None) -> pd.DataFrame:
+    """Dépenses archivées dont le numéro de jour est dans [debut, fin]"""
+    mois_archives = archived_months(user_id) if mois_archives is None else mois_archives
+    annees = {int(m[:4]) for m in mois_archives if _bornes(m)[0] <= fin and _bornes(m)[1] >= debut}
+    if not annees:
+        return pd.DataFrame(columns=COLONNES['depenses'])
+    lignes = _lire(user_id, 'depenses', annees, [('jour', '>=', debut), ('jour', '<=', fin)])
+    # Lignes d'un archivage en cours, annulé ou interrompu : encore dans SQLite, qui fait foi
+    chaudes = read_query("SELECT id FROM depenses WHERE user_id=? AND jour BETWEEN ? AND ?", (user_id, debut, fin))
+    garder = _mois_de_jours(lignes['jour']).isin(mois_archives) & ~lignes['id'].isin(chaudes['id'])
+    return lignes[garder].reset_index(drop=True)
+
+
+def archived_revenus(user_id: int, mois_debut: str, mois_fin: str, mois_archives: list = None) -> pd.DataFrame:
+    """Revenus archivés des mois compris entre mois_debut et mois_fin"""
+    mois_archives = archived_months(user_id) if mois_archives is None else mois_archives
+    mois = [m for m in mois_archives if mois_debut <= m <= mois_fin]
+    if not mois:
+        return pd.DataFrame(columns=COLONNES['revenus'])
+    annees = [int(m[:4]) for m in mois]
+    lignes = _lire(user_id, 'revenus', annees, [('mois', 'in', mois)])
+    # Lignes d'un archivage en cours, annulé ou interrompu : encore dans SQLite, qui fait foi
+    chaudes = read_query("SELECT id FROM revenus WHERE user_id=? AND mois BETWEEN ? AND ?",
+                         (user_id, mois[0], mois[-1]))
+    return lignes[~lignes['id'].isin(chaudes['id'])].reset_index(drop=True)
+
+
+def iter_archived(user_id: int, table: str, batch_size: int):
+    """Lignes archivées d'une table par lots (DataFrames), lues groupe par groupe dans chaque
+    fichier annuel : la mémoire ne dépend pas de la taille de l'historique"""
+    mois_archives = archived_months(user_id)
+    for annee in sorted({int(m[:4]) for m in mois_archives}):
+        chemin = _fichier(user_id, table, annee)
+        if not chemin.exists():
+            continue
+        if table == 'depenses':
+            q, bornes = "SELECT id FROM depenses WHERE user_id=? AND jour BETWEEN ? AND ?", \
+                (date(annee, 1, 1).toordinal(), date(annee, 12, 31).toordinal())
+        else:
+            q, bornes = "SELECT id FROM revenus WHERE user_id=? AND mois BETWEEN ? AND ?", \
+                (f"{annee}-01", f"{annee}-12")
+        # Lignes d'un archivage en cours, annulé ou interrompu : encore dans SQLite, qui fait foi
+        chaudes = read_query(q, (user_id, *bornes))['id']
+        for lot in pq.ParquetFile(chemin).iter_batches(batch_size=batch_size, columns=COLONNES[table]):
+            lignes = lot.to_pandas()
+            mois = _mois_de_jours(lignes['jour']) if table == 'depenses' else lignes['mois']
+            garder = mois.isin(mois_archives) & ~lignes['id'].isin(chaudes)
+            if garder.any():
+                yield lignes[garder].reset_index(drop=True)
+
+
+# -----------------------
+# Agrégats des mois archivés (en centimes)
+# -----------------------
+def rollup_totals(user_id: int, mois_debut: str, mois_fin: str) -> pd.DataFrame:
+    """Totaux archivés par mois : colonnes revenus et depenses (centimes), index 'mois'"""
+    return read_query(
+        """
+        SELECT mois, SUM(rc) AS revenus, SUM(dc) AS depenses FROM (
+            SELECT mois, total_centimes AS rc, 0 AS dc FROM rollup_revenus
+            WHERE user_id=? AND mois BETWEEN ? AND ?
+            UNION ALL
+            SELECT mois, 0, total_centimes FROM rollup_depenses
+            WHERE user_id=? AND mois BETWEEN ? AND ?
+        ) GROUP BY mois
+        """,
+        (user_id, mois_debut, mois_fin, user_id, mois_debut, mois_fin), index_col='mois'
+    )
+
+
+def archived_by_category(user_id: int, debut: date, fin: date) -> pd.DataFrame:
+    """Dépenses archivées de la période par catégorie : categorie_id, total_centimes, nb.
+
+    Les mois entièrement couverts viennent des agrégats ; les mois coupés par la période,
+    des lignes Parquet.
+    """
+    mois_archives = [m for m in archived_months(user_id) if debut.strftime('%Y-%m') <= m <= fin.strftime('%Y-%m')]
+    if not mois_archives:
+        return pd.DataFrame(columns=['categorie_id', 'total_centimes', 'nb'])
+
+    complets = [m for m in mois_archives if debut.toordinal() <= _bornes(m)[0] and _bornes(m)[1] <= fin.toordinal()]
+    partiels = [m for m in mois_archives if m not in complets]
+
+    morceaux = []
+    if complets:
+        morceaux.append(read_query(
+            f"""
+            SELECT categorie_id, SUM(total_centimes) AS total_centimes, SUM(nb) AS nb FROM rollup_depenses
+            WHERE user_id=? AND mois IN ({','.join('?' * len(complets))})
+            GROUP BY categorie_id
+            """,
+            (user_id, *complets)
+        ))
+    if partiels:
+        lignes = archived_depenses(user_id, debut.toordinal(), fin.toordinal(), partiels)
+        morceaux.append(
+            lignes.groupby('categorie_id', as_index=False)
+            .agg(total_centimes=('montant_centimes', 'sum'), nb=('id', 'count'))
+        )
+    return (
+        pd.concat(morceaux, ignore_index=True)
+        .groupby('categorie_id', as_index=False)[['total_centimes', 'nb']].sum()
+    )
+
+
+def archived_period_totals(user_id: int, debut: date, fin: date) -> dict:
+    """Revenus (mois commençant dans la période) et dépenses archivés de la période, en centimes"""
+    revenus = read_query(
+        """
+        SELECT COALESCE(SUM(total_centimes), 0) AS c FROM rollup_revenus
+        WHERE user_id=? AND mois || '-01' BETWEEN ? AND ?
+        """,
+        (user_id, debut.isoformat(), fin.isoformat())
+    )['c'].iloc[0]
+    depenses = archived_by_category(user_id, debut, fin)['total_centimes'].sum()
+    return {'revenus': int(revenus), 'depenses': int(depenses)}
+
+
+# -----------------------
+# Tâche d'archivage
+# -----------------------
+def _cle(ligne) -> tuple:
+    """Valeurs d'une ligne comparables entre SQLite et Parquet (NULL, entiers)"""
+    return tuple(None if pd.isna(v) else (int(v) if isinstance(v, Number) else v) for v in ligne)
+
+
+def reserve_archived_ids(conn, tables=('depenses', 'revenus')):
+    """Passage des tables à AUTOINCREMENT (migration) : les numéros des lignes archivées ne
+    seront plus redonnés. Une ligne SQLite qui porte déjà le numéro d'une autre ligne archivée
+    (réemploi antérieur à la migration) en reçoit un nouveau ; une copie identique, laissée
+    par un archivage interrompu, garde le sien."""
+    for table in tables:
+        fichiers = sorted(archive_dir().glob(f"*/{table}/*.parquet"))
+        if not fichiers:
+            continue
+        archivees = pd.concat([pq.read_table(f, columns=COLONNES[table]).to_pandas() for f in fichiers],
+                              ignore_index=True)
+        communes = pd.read_sql_query(
+            f"SELECT {', '.join(COLONNES[table])} FROM {table} WHERE id IN (SELECT value FROM json_each(?));",
+            conn, params=(json.dumps(archivees['id'].astype(int).tolist()),)
+        )
+        copies = set(map(_cle, archivees[archivees['id'].isin(communes['id'])].itertuples(index=False)))
+        reemplois = [int(ligne[0]) for ligne in map(_cle, communes.itertuples(index=False)) if ligne not in copies]
+        with conn:
+            suivant = max(int(archivees['id'].max()),
+                          conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table};").fetchone()[0])
+            for ancien in reemplois:
+                suivant += 1
+                conn.execute(f"UPDATE {table} SET id = ? WHERE id = ?;", (suivant, ancien))
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = ?;", (table,))
+            conn.execute("INSERT INTO sqlite_sequence(name, seq) VALUES (?, ?);", (table, suivant))
+def _ecrire_annee(user_id: int, table: str, annee: int, nouvelles: pd.DataFrame, mois_archives: set,
+                  chaudes: set, ecartes: set = frozenset()):
+    """Réécrit le fichier d'une année (lignes déjà archivées + nouvelles), de façon atomique.
+
+    Une ligne du fichier dont le numéro est encore dans SQLite (`chaudes`) n'y a été écrite que
+    par un archivage annulé ou interrompu : la ligne SQLite fait foi (les numéros AUTOINCREMENT
+    ne sont jamais redonnés). Les lignes `ecartes` (écrites par une tentative annulée, supprimées
+    depuis) ne sont reprises que si elles sont relues."""
+    chemin = _fichier(user_id, table, annee)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    lignes = nouvelles[COLONNES[table]]
+    if chemin.exists():
+        existantes = pq.read_table(chemin).to_pandas()
+        mois = _mois_de_jours(existantes['jour']) if table == 'depenses' else existantes['mois']
+        # Seules les lignes des mois enregistrés comptent (archivage interrompu sinon)
+        existantes = existantes[mois.isin(mois_archives) & ~existantes['id'].isin(chaudes)
+                                & ~existantes['id'].isin(ecartes)]
+        lignes = pd.concat([existantes, lignes], ignore_index=True)
+    tri = ['jour', 'id'] if table == 'depenses' else ['mois', 'id']
+    lignes = lignes.sort_values(tri, ignore_index=True)
+
+    temporaire = chemin.with_suffix(".parquet.tmp")
+    pq.write_table(pa.Table.from_pandas(lignes, preserve_index=False), temporaire, compression='zstd')
+    os.replace(temporaire, chemin)
+    return chemin
+
+
+# Tentatives sans verrou avant d'archiver un utilisateur sous verrou d'écriture
+TENTATIVES = 3
+
+
+class _LignesModifiees(Exception):
+    """Une ligne lue a été modifiée ou supprimée avant sa suppression : transaction annulée"""
+
+    def __init__(self, ids: dict):
+        super().__init__(ids)
+        self.ids = ids
+
+
+def _nul(valeur):
+    """None (NULL) pour une valeur manquante lue par pandas"""
+    return None if pd.isna(valeur) else valeur
+
+
+def _archiver_utilisateur(conn, user_id: int, jour_limite: int, limite: str, ecartes: dict, verrou: bool) -> list:
+    """Archive les mois anciens d'un utilisateur ; lève _LignesModifiees si une ligne a changé
+    entre sa lecture et sa suppression (avec `verrou`, lecture et suppression sous BEGIN IMMEDIATE)"""
+    rapport = []
+    with conn:
+        if verrou:
+            conn.execute("BEGIN IMMEDIATE;")
+        depenses = pd.read_sql_query(
+            f"SELECT {', '.join(COLONNES['depenses'])} FROM depenses WHERE user_id=? AND jour < ?",
+            conn, params=(user_id, jour_limite)
+        )
+        revenus = pd.read_sql_query(
+            f"SELECT {', '.join(COLONNES['revenus'])} FROM revenus WHERE user_id=? AND mois < ?",
+            conn, params=(user_id, limite)
+        )
+        depenses['mois'] = _mois_de_jours(depenses['jour'])
+        mois_archives = set(archived_months(user_id, conn))
+
+        for table, frame in (('depenses', depenses), ('revenus', revenus)):
+            chaudes = {i for i, in conn.execute(f"SELECT id FROM {table} WHERE user_id=?;", (user_id,))}
+            for annee, partie in frame.groupby(frame['mois'].str[:4].astype(int)):
+                chemin = _ecrire_annee(user_id, table, annee, partie, mois_archives, chaudes, ecartes[table])
+                rapport.append({'user_id': user_id, 'table': table, 'annee': annee,
+                                'lignes': len(partie), 'octets': chemin.stat().st_size})
+
+        rollup_dep = depenses.groupby(['mois', 'categorie_id'], as_index=False).agg(
+            total=('montant_centimes', 'sum'), nb=('id', 'count'))
+        rollup_rev = revenus.groupby('mois', as_index=False).agg(total=('montant_centimes', 'sum'), nb=('id', 'count'))
+
+        # Lignes déplacées, pas supprimées : rien au journal des modifications (src.journal).
+        # Le drapeau n'existe que dans cette transaction, invisible des autres écrivains
+        conn.execute("INSERT INTO journal_pause(pause) VALUES (1);")
+        # Suppression conditionnée aux valeurs lues (comme data_operations._appliquer) : une ligne
+        # modifiée depuis sa lecture n'est pas supprimée et l'utilisateur est réarchivé
+        supprimees = conn.executemany(
+            """
+            DELETE FROM depenses WHERE id=? AND user_id=? AND jour=? AND categorie_id IS ?
+            AND description IS ? AND montant_centimes=?;
+            """,
+            [(int(r.id), user_id, int(r.jour), None if pd.isna(r.categorie_id) else int(r.categorie_id),
+              _nul(r.description), int(r.montant_centimes)) for r in depenses.itertuples()]
+        ).rowcount
+        supprimees += conn.executemany(
+            "DELETE FROM revenus WHERE id=? AND user_id=? AND mois=? AND origine IS ? AND montant_centimes=?;",
+            [(int(r.id), user_id, r.mois, _nul(r.origine), int(r.montant_centimes)) for r in revenus.itertuples()]
+        ).rowcount
+        if supprimees != len(depenses) + len(revenus):
+            raise _LignesModifiees({'depenses': set(depenses['id'].astype(int)),
+                                    'revenus': set(revenus['id'].astype(int))})
+        conn.execute("DELETE FROM journal_pause;")
+        conn.executemany(
+            """
+            INSERT INTO rollup_depenses(user_id, mois, categorie_id, total_centimes, nb) VALUES(?,?,?,?,?)
+            ON CONFLICT(user_id, mois, categorie_id) DO UPDATE SET
+                total_centimes = total_centimes + excluded.total_centimes, nb = nb + excluded.nb;
+            """,
+            [(user_id, r.mois, int(r.categorie_id), int(r.total), int(r.nb)) for r in rollup_dep.itertuples()]
+        )
+        conn.executemany(
+            """
+            INSERT INTO rollup_revenus(user_id, mois, total_centimes, nb) VALUES(?,?,?,?)
+            ON CONFLICT(user_id, mois) DO UPDATE SET
+                total_centimes = total_centimes + excluded.total_centimes, nb = nb + excluded.nb;
+            """,
+            [(user_id, r.mois, int(r.total), int(r.nb)) for r in rollup_rev.itertuples()]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO archives_mois(user_id, mois) VALUES(?, ?);",
+            [(user_id, m) for m in sorted(set(depenses['mois']) | set(revenus['mois']))]
+        )
+    return rapport
+
+
+def archive_old_months(horizon: int = ARCHIVE_MONTHS, today: date = None, conn=None) -> pd.DataFrame:
+    """Archive les mois antérieurs aux `horizon` derniers mois ; rapport par utilisateur, table et année.
+
+    Les fichiers Parquet sont écrits avant la transaction SQLite qui supprime les lignes,
+    alimente les agrégats et enregistre les mois : une interruption laisse les lignes dans
+    SQLite, et l'exécution suivante réécrit les fichiers sans doublon. Une ligne modifiée ou
+    supprimée entre la lecture et la suppression annule la transaction de l'utilisateur, qui
+    est relu et réarchivé ; après TENTATIVES échecs, la dernière passe se fait sous verrou
+    d'écriture (les écrivains attendent l'écriture des fichiers).
+    """
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (horizon - 1)
+    limite = f"{index // 12:04d}-{index % 12 + 1:02d}"
+    jour_limite = _bornes(limite)[0]
+    conn = conn or get_connection()
+
+    users = [row[0] for row in conn.execute(
+        "SELECT user_id FROM depenses WHERE jour < ? UNION SELECT user_id FROM revenus WHERE mois < ?",
+        (jour_limite, limite)
+    )]
+    rapport = []
+    for user_id in users:
+        ecartes = {'depenses': set(), 'revenus': set()}
+        for tentative in range(TENTATIVES + 1):
+            try:
+                rapport.extend(_archiver_utilisateur(conn, user_id, jour_limite, limite, ecartes,
+                                                     verrou=tentative == TENTATIVES))
+                break
+            except _LignesModifiees as exc:
+                for table, ids in exc.ids.items():
+                    ecartes[table] |= ids
+        invalidate(user_id, 'depenses', 'revenus')
+
+    return pd.DataFrame(rapport, columns=['user_id', 'table', 'annee', 'lignes', 'octets'])
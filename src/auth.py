@@ -13,7 +13,13 @@ from pathlib import Path
 def load_config():
     """Charge la configuration d'authentification depuis secrets.toml ou config.yaml"""
     # Essayer d'abord avec secrets.toml (Streamlit Cloud)
-    if "credentials" in st.secrets:
+    try:
+        has_secrets = "credentials" in st.secrets
+    except FileNotFoundError:
+        # Aucun secrets.toml : Streamlit lève une erreur au lieu de renvoyer False
+        has_secrets = False
+
+    if has_secrets:
         # Construire un dict Python mutable à partir de st.secrets
         usernames = {}
         for username, data in st.secrets["credentials"]["usernames"].items():
@@ -71,6 +77,13 @@ def load_config():
     }
 
 
+def is_admin(username: str) -> bool:
+    """Indique si l'utilisateur a accès à la page d'administration (variable BUDGET_ADMINS,
+    aucun administrateur par défaut)"""
+    admins = {u.strip() for u in os.getenv("BUDGET_ADMINS", "").split(",") if u.strip()}
+    return username in admins
+
+
 def init_authenticator():
     """Initialise et retourne l'authentificateur Streamlit"""
     config = load_config()
@@ -0,0 +1,428 @@
+"""
+Module de cache borné pour les lecteurs de données
+(budgets en octets par fonction et global, éviction LRU/TTL, statistiques)
+
+Les résultats sont partagés sans copie ni sérialisation : chaque appel reçoit une
+copie superficielle en Copy-on-Write, et les clés incluent la version des données.
+Après l'écriture d'une seule ligne, les entrées peuvent être corrigées sur place
+(patch) plutôt que jetées. Un second niveau sur disque (src.disk_cache) peut s'y brancher,
+et des versions partagées entre processus (src.coherence).
+"""
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Copy-on-Write : toujours actif à partir de pandas 3, à activer explicitement avant
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Budget global du cache, en Mo (dimensionnement des conteneurs)
+DEFAULT_MAX_MB = float(os.getenv("BUDGET_CACHE_MAX_MB", "256"))
+
+# Pseudo-utilisateur dont la version avance à chaque vidage complet (propagé aux autres processus)
+TOUS = 0
+
+
+def estimate_size(value) -> int:
+    """Estime l'empreinte mémoire d'un résultat (DataFrame, Series, conteneurs)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _share(value):
+    """Vue remise à l'appelant : mêmes tampons que le cache, copiés seulement s'il les modifie"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, dict):
+        return {k: _share(v) for k, v in value.items()}
+    return value
+
+
+def _freeze(value):
+    """Rend un argument hachable (listes de mois, etc.)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _difference(valeur, attendu):
+    """Description du premier écart entre deux résultats, None s'ils sont identiques"""
+    if isinstance(attendu, (pd.DataFrame, pd.Series)):
+        try:
+            (pd.testing.assert_frame_equal if isinstance(attendu, pd.DataFrame) else pd.testing.assert_series_equal)(
+                valeur, attendu
+            )
+        except AssertionError as e:
+            return str(e).strip().splitlines()[0]
+        return None
+    if isinstance(attendu, dict):
+        if not isinstance(valeur, dict) or valeur.keys() != attendu.keys():
+            return "clés différentes"
+        for k in attendu:
+            ecart = _difference(valeur[k], attendu[k])
+            if ecart:
+                return f"{k} : {ecart}"
+        return None
+    return None if valeur == attendu else f"{valeur!r} au lieu de {attendu!r}"
+
+
+class DataVersions:
+    """Version des données par utilisateur et par table, avancée à chaque écriture.
+
+    Avec un `store` (versions partagées, src.coherence), les versions d'un utilisateur
+    sont lues en base à sa première lecture et avancées en base à chaque écriture ;
+    refresh relève celles que les autres processus ont avancées.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._charges = set()
+        self.store = None
+
+    def attach(self, store):
+        """Branche un stockage durable ; les versions en mémoire sont oubliées"""
+        with self._lock:
+            self.store = store
+            self._versions.clear()
+            self._charges.clear()
+
+    def _charger(self, user_id: int):
+        if self.store is not None and user_id not in self._charges:
+            self._versions.update(self.store.load(user_id))
+            self._charges.add(user_id)
+
+    def get(self, user_id: int, tables: tuple) -> tuple:
+        with self._lock:
+            self._charger(user_id)
+            return tuple(self._versions.get((user_id, t), 0) for t in tables)
+
+    def snapshot(self) -> dict:
+        """Copie de toutes les versions {(user_id, table): version}"""
+        with self._lock:
+            return dict(self._versions)
+
+    def refresh(self) -> dict:
+        """Versions avancées par les autres processus : {user_id: tables modifiées}, pour les
+        utilisateurs déjà chargés (les autres seront lus à jour à leur première lecture)"""
+        with self._lock:
+            if self.store is None:
+                return {}
+            modifiees = {}
+            for (user_id, table), version in self.store.changes().items():
+                if (user_id == TOUS or user_id in self._charges) and version > self._versions.get((user_id, table), 0):
+                    self._versions[(user_id, table)] = version
+                    modifiees.setdefault(user_id, set()).add(table)
+            return modifiees
+
+    def bump(self, user_id: int, tables: tuple):
+        with self._lock:
+            if self.store is not None:
+                self._charger(user_id)
+                self._versions.update(self.store.bump(user_id, tables))
+                return
+            for t in tables:
+                self._versions[(user_id, t)] = self._versions.get((user_id, t), 0) + 1
+
+
+VERSIONS = DataVersions()
+
+
+class CachePolicy:
+    """Limites d'une fonction : nombre d'entrées, durée de vie (s) et octets, tables lues"""
+
+    def __init__(self, max_entries: int = None, ttl: float = None, max_bytes: int = None, tables: tuple = (),
+                 func=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.tables = tables
+        # Fonction d'origine : arguments nommés des patchs et vérification de cohérence
+        self.func = func
+
+
+class _Entry:
+    # tick : dernier accès (LRU) ; stored : rangement, comparé au début des écritures (patch)
+    __slots__ = ("value", "nbytes", "expires", "tick", "stored")
+
+    def __init__(self, value, nbytes: int, expires: float, tick: int, stored: int = None):
+        self.value = value
+        self.nbytes = nbytes
+        self.expires = expires
+        self.tick = tick
+        self.stored = tick if stored is None else stored
+
+
+class ReaderCache:
+    """Cache LRU partagé par toutes les sessions du processus"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._policies = {}
+        self._entries = {}
+        self._stats = {}
+        self._tick = 0
+        # Second niveau (DiskCache), consulté par cached_reader sur un miss
+        self.l2 = None
+
+    def register(self, name: str, policy: CachePolicy):
+        with self._lock:
+            self._policies[name] = policy
+            self._entries.setdefault(name, OrderedDict())
+            self._stats.setdefault(name, {
+                'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0, 'patches': 0,
+                'bytes': 0
+            })
+
+    def get(self, name: str, key):
+        """Retourne (trouvé, valeur) et rafraîchit la position LRU"""
+        with self._lock:
+            entries, stats = self._entries[name], self._stats[name]
+            entry = entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._remove(name, key)
+                stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                stats['misses'] += 1
+                return False, None
+            stats['hits'] += 1
+            self._tick += 1
+            entry.tick = self._tick
+            entries.move_to_end(key)
+            return True, entry.value
+
+    def policy(self, name: str):
+        return self._policies.get(name)
+
+    def mark(self) -> int:
+        """Repère pris avant une écriture : les entrées rangées après ne seront pas corrigées"""
+        with self._lock:
+            self._tick += 1
+            return self._tick
+
+    def put(self, name: str, key, value, ttl: float = None):
+        """Range un résultat ; `ttl` remplace la durée de vie de la fonction (reste d'une entrée du disque)"""
+        policy = self._policies[name]
+        nbytes = estimate_size(value)
+        # Un résultat plus gros que le budget n'est pas conservé
+        if (policy.max_bytes and nbytes > policy.max_bytes) or nbytes > self.max_bytes:
+            return
+        ttl = policy.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else float('inf')
+        with self._lock:
+            if key in self._entries[name]:
+                self._remove(name, key)
+            self._tick += 1
+            self._entries[name][key] = _Entry(value, nbytes, expires, self._tick)
+            self._stats[name]['bytes'] += nbytes
+            self._enforce(name)
+
+    def _remove(self, name: str, key):
+        entry = self._entries[name].pop(key)
+        self._stats[name]['bytes'] -= entry.nbytes
+
+    def _evict_oldest(self, name: str):
+        key = next(iter(self._entries[name]))
+        self._remove(name, key)
+        self._stats[name]['evictions'] += 1
+
+    def _enforce(self, name: str):
+        """Applique les limites de la fonction puis le budget global"""
+        policy, entries, stats = self._policies[name], self._entries[name], self._stats[name]
+        while policy.max_entries and len(entries) > policy.max_entries:
+            self._evict_oldest(name)
+        while policy.max_bytes and stats['bytes'] > policy.max_bytes:
+            self._evict_oldest(name)
+        while self.total_bytes() > self.max_bytes:
+            # Entrée la moins récemment utilisée, toutes fonctions confondues
+            plus_ancienne = min(
+                (n for n in self._entries if self._entries[n]),
+                key=lambda n: next(iter(self._entries[n].values())).tick
+            )
+            self._evict_oldest(plus_ancienne)
+
+    def total_bytes(self) -> int:
+        return sum(s['bytes'] for s in self._stats.values())
+
+    def purge(self, user_id: int, tables: tuple):
+        """Supprime les entrées d'un utilisateur qui dépendent des tables modifiées"""
+        with self._lock:
+            for name, policy in self._policies.items():
+                if not set(policy.tables) & set(tables):
+                    continue
+                for key in [k for k in self._entries[name] if k[0] == user_id]:
+                    self._remove(name, key)
+                    self._stats[name]['invalidations'] += 1
+
+    def patch(self, user_id: int, tables: tuple, patch, depuis: int):
+        """Écriture traversante : avance la version des tables et corrige les entrées de l'utilisateur.
+
+        `patch(name, arguments, value)` reçoit les arguments nommés de l'appel mis en cache et
+        retourne la nouvelle valeur (la même si l'entrée n'est pas concernée), ou None si
+        le delta ne peut pas être appliqué sûrement : l'entrée est alors invalidée.
+        Seules les entrées rangées avant `depuis` (mark, pris avant la transaction) sont
+        corrigées : une lecture faite entre le COMMIT et le patch voit déjà la ligne.
+        """
+        with self._lock:
+            anciennes = {name: VERSIONS.get(user_id, p.tables) for name, p in self._policies.items()}
+            VERSIONS.bump(user_id, tables)
+            for name, policy in self._policies.items():
+                if not set(policy.tables) & set(tables):
+                    continue
+                version = VERSIONS.get(user_id, policy.tables)
+                for key in [k for k in self._entries[name] if k[0] == user_id]:
+                    entry = self._entries[name][key]
+                    self._remove(name, key)
+                    valeur = None
+                    # Une entrée d'une version antérieure est déjà périmée
+                    if key[3] == anciennes[name] and entry.stored <= depuis and policy.func is not None:
+                        arguments = inspect.signature(policy.func).bind(user_id, *key[1], **dict(key[2]))
+                        arguments.apply_defaults()
+                        try:
+                            valeur = patch(name, arguments.arguments, entry.value)
+                        except Exception:
+                            valeur = None
+                    if valeur is None:
+                        self._stats[name]['invalidations'] += 1
+                        continue
+                    nbytes = entry.nbytes if valeur is entry.value else estimate_size(valeur)
+                    self._entries[name][key[:3] + (version,)] = _Entry(
+                        valeur, nbytes, entry.expires, entry.tick, entry.stored
+                    )
+                    self._stats[name]['bytes'] += nbytes
+                    self._stats[name]['patches'] += valeur is not entry.value
+                self._enforce(name)
+
+    def verify(self, user_id: int = None) -> pd.DataFrame:
+        """Compare chaque entrée à jour avec un nouvel appel de la fonction (cohérence des patchs)"""
+        with self._lock:
+            a_verifier = [
+                (name, key, entry.value)
+                for name, entries in self._entries.items()
+                for key, entry in entries.items()
+                if (user_id is None or key[0] == user_id)
+                and key[3] == VERSIONS.get(key[0], self._policies[name].tables)
+            ]
+        lignes = []
+        for name, key, valeur in a_verifier:
+            frais = self._policies[name].func(key[0], *key[1], **dict(key[2]))
+            ecart = _difference(valeur, frais)
+            lignes.append({'Fonction': name, 'Utilisateur': key[0], 'Arguments': repr(key[1] + key[2]),
+                           'Cohérent': ecart is None, 'Écart': ecart or ''})
+        return pd.DataFrame(lignes, columns=['Fonction', 'Utilisateur', 'Arguments', 'Cohérent', 'Écart'])
+
+    def clear(self, name: str = None):
+        with self._lock:
+            for n in ([name] if name else list(self._entries)):
+                self._entries[n].clear()
+                self._stats[n]['bytes'] = 0
+        if self.l2 is not None:
+            self.l2.clear(name)
+
+    def stats(self) -> pd.DataFrame:
+        """Statistiques par fonction : entrées, octets, taux de hit, évictions"""
+        with self._lock:
+            lignes = []
+            for name, s in self._stats.items():
+                appels = s['hits'] + s['misses']
+                lignes.append({
+                    'Fonction': name,
+                    'Entrées': len(self._entries[name]),
+                    'Octets': s['bytes'],
+                    'Hits': s['hits'],
+                    'Misses': s['misses'],
+                    'Taux de hit (%)': 100 * s['hits'] / appels if appels else 0.0,
+                    'Évictions': s['evictions'],
+                    'Expirations': s['expirations'],
+                    'Invalidations': s['invalidations'],
+                    'Patchs': s['patches'],
+                })
+        return pd.DataFrame(lignes)
+
+
+CACHE = ReaderCache(max_bytes=int(DEFAULT_MAX_MB * 1024 * 1024))
+
+
+def synchronize():
+    """Écarte les entrées périmées par les écritures des autres processus (versions partagées)"""
+    if VERSIONS.store is None:
+        return
+    for user_id, tables in VERSIONS.refresh().items():
+        if user_id == TOUS:
+            CACHE.clear()
+        else:
+            CACHE.purge(user_id, tuple(tables))
+
+
+def invalidate(user_id: int, *tables: str):
+    """À appeler après une écriture : avance la version des tables et libère les entrées périmées"""
+    VERSIONS.bump(user_id, tables)
+    CACHE.purge(user_id, tables)
+
+
+def write_start() -> int:
+    """À appeler avant la transaction d'une écriture traversante ; repère passé à write_through"""
+    return CACHE.mark()
+
+
+def write_through(user_id: int, table: str, patch, depuis: int):
+    """À appeler après l'écriture d'une seule ligne : corrige les entrées rangées avant `depuis`
+    (write_start) au lieu de les jeter ; les autres sont invalidées"""
+    CACHE.patch(user_id, (table,), patch, depuis)
+
+
+def cached_reader(tables: tuple, max_entries: int = None, ttl: float = None, max_mb: float = None):
+    """Décorateur remplaçant st.cache_data pour les lecteurs (premier argument : user_id).
+
+    La clé inclut la version des `tables` lues : un résultat calculé pendant une
+    écriture concurrente est rangé sous l'ancienne version, qui n'est plus lue une fois
+    l'écriture terminée. Il peut être servi entre le COMMIT et l'avance de la version
+    (il est alors déjà à jour) ; write_through ne le corrige pas, il l'invalide.
+    """
+    def decorator(func):
+        name = func.__name__
+        CACHE.register(name, CachePolicy(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+            tables=tables,
+            func=func
+        ))
+
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            synchronize()
+            key = (user_id, _freeze(args), _freeze(kwargs), VERSIONS.get(user_id, tables))
+            hit, value = CACHE.get(name, key)
+            if not hit:
+                l2, restant = CACHE.l2, None
+                if l2 is not None:
+                    hit, value, restant = l2.get(name, key)
+                if not hit:
+                    value = func(user_id, *args, **kwargs)
+                    if l2 is not None:
+                        l2.put(name, key, value, ttl)
+                CACHE.put(name, key, value, ttl=restant)
+            return _share(value)
+
+        wrapper.clear = lambda: CACHE.clear(name)
+        return wrapper
+    return decorator
@@ -0,0 +1,505 @@
+"""
+Catégorisation automatique des dépenses
+
+Règles par utilisateur (table regles_categorie), toutes bornables par montant :
+- 'mot' : mots ou expressions séparés par des virgules, reconnus comme mots entiers ;
+- 'alias' : noms de marchand tels qu'ils figurent sur les relevés, séparés par des virgules,
+  reconnus en début de mot (« amzn » reconnaît « AMZNMKTP*2K4 ») ;
+- 'regex' : expression régulière, sans casse, sur la description brute.
+
+Les mots et alias de toutes les règles d'un utilisateur sont compilés en deux expressions
+factorisées par préfixes (à chaque position, seules les branches qui commencent par le
+caractère lu sont essayées). Chaque description distincte n'est analysée qu'une fois, après
+normalisation (minuscules, sans accents, chiffres ni ponctuation) : un million de lignes de
+relevé ne comptent que quelques milliers de libellés ; seules les regex voient chaque
+description brute distincte. Les regex sont réunies en deux alternatives (ancrées par ^ ou
+non) qui écartent en une passe les descriptions qu'aucune ne reconnaît ; chaque regex n'est
+ensuite essayée que sur les autres. Leur coût croît donc avec leur nombre : une passe Python
+par regex sur les descriptions retenues (environ 5 s pour 30 regex sur un million de
+libellés distincts, 9 s sans les alternatives). Entre plusieurs règles reconnues pour une dépense, la priorité
+la plus haute l'emporte, puis une règle bornée par montant, puis la plus ancienne ; les
+montants sont comparés en bloc, ligne par ligne, sans boucle Python.
+"""
+import re
+import sys
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from .alerts import evaluate_alerts
+from .cache import cached_reader, invalidate
+from .data_operations import avec_noms, list_categories, to_centimes
+from .database import get_connection, read_query
+
+
+TYPES = {'mot': "Mots-clés", 'alias': "Alias de marchand", 'regex': "Expression régulière"}
+
+# Mots des relevés bancaires qui ne disent rien de la catégorie (suggestions)
+MOTS_VIDES = frozenset("""
+    achat aux avec carte chez des echeance facture paiement par pour prlv prelevement retrait
+    sepa sur une vir virement
+""".split())
+
+
+# -----------------------
+# Normalisation et compilation
+# -----------------------
+def _table_normalisation() -> dict:
+    """Table de str.translate : lettres latines -> minuscules sans accents, le reste -> espace"""
+    table = {}
+    for code in range(0x250):
+        base = unicodedata.normalize('NFKD', chr(code)).encode('ascii', 'ignore').decode().lower()
+        table[code] = base if base.isalpha() else ' '
+    # Accents combinants (texte décomposé)
+    table.update({code: '' for code in range(0x300, 0x370)})
+    table.update({ord(c): r for c, r in (('œ', 'oe'), ('Œ', 'oe'), ('æ', 'ae'), ('Æ', 'ae'), ('ß', 'ss'))})
+    return table
+
+
+_NORMALISATION = _table_normalisation()
+
+
+def normalize(description) -> str:
+    """Description réduite à ses mots en minuscules sans accents, séparés d'une espace"""
+    if not isinstance(description, str):
+        return ''
+    return ' '.join(description.translate(_NORMALISATION).split())
+
+
+def _variantes(motif: str) -> list:
+    """Variantes normalisées d'un motif 'mot' ou 'alias' (séparées par des virgules)"""
+    return sorted({v for v in map(normalize, motif.split(',')) if v})
+
+
+def _arbre(mots) -> str:
+    """Alternative de `mots` factorisée par préfixes ; à une même position, le plus long d'abord"""
+    racine = {}
+    for mot in mots:
+        noeud = racine
+        for c in mot:
+            noeud = noeud.setdefault(c, {})
+        noeud[''] = {}
+
+    def motif(noeud) -> str:
+        branches = [re.escape(c) + motif(suite) for c, suite in sorted(noeud.items()) if c]
+        if not branches:
+            return ''
+        corps = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{corps})?' if '' in noeud else corps
+
+    return motif(racine)
+
+
+def _valider(type_: str, motif: str):
+    """ValueError si le motif ne peut pas servir de règle"""
+    if type_ == 'regex':
+        try:
+            if re.compile(motif, re.IGNORECASE).search(''):
+                raise ValueError("L'expression reconnaît une description vide, donc toutes les dépenses.")
+        except re.error as e:
+            raise ValueError(f"Expression régulière invalide : {e}") from e
+    elif type_ in TYPES:
+        if not _variantes(motif):
+            raise ValueError("Le motif ne contient aucune lettre.")
+    else:
+        raise ValueError(f"Type de règle inconnu : {type_}")
+
+
+def _ancree(motif: str) -> bool:
+    """Vrai si le motif commence par ^ sans alternative au premier niveau (« ^a|b » ne l'est pas)"""
+    if not motif.startswith('^'):
+        return False
+    profondeur, classe, echappe = 0, False, False
+    for i, c in enumerate(motif):
+        if echappe:
+            echappe = False
+        elif c == '\\':
+            echappe = True
+        elif classe:
+            # « ] » juste après « [ » ou « [^ » est un caractère de la classe
+            classe = c != ']' or motif[i - 1] == '[' or motif[i - 2:i] == '[^'
+        elif c == '[':
+            classe = True
+        elif c == '(':
+            profondeur += 1
+        elif c == ')':
+            profondeur -= 1
+        elif c == '|' and profondeur == 0:
+            return False
+    return True
+
+
+def _alternatives(expressions: list) -> tuple:
+    """(filtres, expressions hors filtres) : une alternative des regex ancrées par ^ (essayée au
+    seul début de la description) et une des autres ; une description qu'aucun filtre ne
+    reconnaît n'est reconnue par aucune de ces regex. Restent hors des filtres les références
+    arrière, qui changent de sens une fois les groupes renumérotés, et ce qui ne compile pas
+    dans une alternative (drapeaux globaux, noms de groupe en double)."""
+    seules, groupes = set(), {True: [], False: []}
+    for expression in expressions:
+        motif = expression.pattern
+        ancree = _ancree(motif)
+        branche = f'(?:{motif[1:] if ancree else motif})'
+        try:
+            re.compile(branche)
+        except re.error:
+            seules.add(expression)
+            continue
+        if re.search(r'\\[1-9]|\(\?P=', motif):
+            seules.add(expression)
+        else:
+            groupes[ancree].append((expression, branche))
+    if sum(len(g) for g in groupes.values()) < 2:
+        return [], set(expressions)
+    filtres = []
+    for ancree, branches in groupes.items():
+        if not branches:
+            continue
+        try:
+            filtres.append(re.compile(('^' if ancree else '') + '(?:' + '|'.join(b for _, b in branches) + ')',
+                                      re.IGNORECASE | re.DOTALL))
+        except re.error:
+            seules.update(e for e, _ in branches)
+    return filtres, seules
+
+
+class RuleMatcher:
+    """Règles actives d'un utilisateur compilées pour classer des descriptions en masse"""
+
+    def __init__(self, regles: pd.DataFrame):
+        # Rang = ordre de préférence : priorité, règle bornée par montant, ancienneté
+        libre = regles['montant_min_centimes'].isna() & regles['montant_max_centimes'].isna()
+        regles = regles.assign(libre=libre).sort_values(
+            ['priorite', 'libre', 'id'], ascending=[False, True, True], ignore_index=True
+        )
+        self.nb = len(regles)
+        self.categories = regles['categorie_id'].to_numpy(np.int64)
+        # Bornes complétées d'un rang fictif self.nb qu'aucun montant ne satisfait
+        self.minimum = np.append(regles['montant_min_centimes'].astype(float).fillna(-np.inf), np.inf)
+        self.maximum = np.append(regles['montant_max_centimes'].astype(float).fillna(np.inf), -np.inf)
+        self.libre = regles['libre'].to_numpy(bool)
+
+        rangs = {'mot': {}, 'alias': {}}
+        regex = []
+        for rang, (type_, motif) in enumerate(zip(regles['type'], regles['motif'])):
+            if type_ == 'regex':
+                regex.append((rang, re.compile(motif, re.IGNORECASE | re.DOTALL)))
+            else:
+                for variante in _variantes(motif):
+                    rangs[type_].setdefault(variante, []).append(rang)
+
+        # Une variante reconnue entraîne celles qui en sont le début (« total » dans
+        # « total access »), que l'expression, qui prend la plus longue, ne rend pas
+        self._candidats = {}
+        for type_, par_variante in rangs.items():
+            for variante in par_variante:
+                if type_ == 'mot':
+                    mots = variante.split(' ')
+                    debuts = (' '.join(mots[:k]) for k in range(1, len(mots) + 1))
+                else:
+                    debuts = (variante[:k] for k in range(1, len(variante) + 1))
+                self._candidats[type_, variante] = sorted(
+                    {r for debut in debuts for r in par_variante.get(debut, ())}
+                )
+        # Lookahead : une correspondance à chaque début de mot, même à l'intérieur d'une autre
+        self._mots = re.compile(f"(?=(?<![^ ])({_arbre(rangs['mot'])})(?![^ ]))") if rangs['mot'] else None
+        self._alias = re.compile(f"(?=(?<![^ ])({_arbre(rangs['alias'])}))") if rangs['alias'] else None
+        self._regex = regex
+        self._filtres = _alternatives([expression for _, expression in regex])
+
+    def __sizeof__(self) -> int:
+        """Empreinte estimée, lue par sys.getsizeof : c'est elle que le budget en octets du
+        cache (src.cache.estimate_size) compte pour _matcher, et non la seule instance"""
+        tableaux = sum(a.nbytes for a in (self.categories, self.minimum, self.maximum, self.libre))
+        candidats = sys.getsizeof(self._candidats) + sum(
+            sys.getsizeof(variante) + sys.getsizeof(rangs) for (_, variante), rangs in self._candidats.items()
+        )
+        # Un motif compilé compte son code (sre) dans sys.getsizeof
+        filtres, _ = self._filtres
+        expressions = sum(
+            sys.getsizeof(e) for e in (self._mots, self._alias, *filtres, *(e for _, e in self._regex))
+            if e is not None
+        )
+        return object.__sizeof__(self) + tableaux + candidats + expressions
+
+    def _candidats_textes(self, textes) -> tuple:
+        """(indice du texte normalisé, rang) de chaque règle mot ou alias qui s'y trouve"""
+        indices, rangs = [], []
+        for i, texte in enumerate(textes):
+            trouves = set()
+            for type_, expression in (('mot', self._mots), ('alias', self._alias)):
+                if expression is not None:
+                    for variante in expression.findall(texte):
+                        trouves.update(self._candidats[type_, variante])
+            indices.extend([i] * len(trouves))
+            rangs.extend(trouves)
+        return np.array(indices, np.int64), np.array(rangs, np.int64)
+
+    def _candidats_bruts(self, bruts) -> tuple:
+        """(indice de la description brute, rang) de chaque règle regex qui s'y trouve.
+
+        Une passe par filtre (alternatives des regex, voir _alternatives) écarte les
+        descriptions qu'aucune regex ne reconnaît ; chaque regex n'est ensuite essayée que sur
+        les autres. Le coût reste d'une passe Python par regex sur les descriptions retenues,
+        et sur toutes pour une regex hors des filtres.
+        """
+        filtres, seules = self._filtres
+        tout = range(len(bruts))
+        retenues = sorted(set().union(*([i for i, brut in enumerate(bruts) if f.search(brut)] for f in filtres))) \
+            if filtres else tout
+        indices, rangs = [], []
+        for rang, expression in self._regex:
+            parmi = tout if expression in seules else retenues
+            trouves = [i for i in parmi if expression.search(bruts[i])]
+            indices.extend(trouves)
+            rangs.extend([rang] * len(trouves))
+        return np.array(indices, np.int64), np.array(rangs, np.int64)
+
+    def _premiers(self, codes: np.ndarray, nb_codes: int, indices: np.ndarray, rangs: np.ndarray,
+                  montants: np.ndarray) -> np.ndarray:
+        """Rang de la première règle, dans l'ordre de préférence, dont le montant de chaque ligne
+        satisfait les bornes parmi les candidates de son code ; self.nb si aucune.
+
+        Par code, seules comptent les règles bornées classées avant la première règle sans
+        bornes (le repli) : quelques passes vectorisées sur les lignes, une par règle bornée.
+        """
+        if rangs.size == 0:
+            return np.full(codes.size, self.nb)
+        ordre = np.lexsort((rangs, indices))
+        indices, rangs = indices[ordre], rangs[ordre]
+        libre = self.libre[rangs]
+        debut = np.r_[True, indices[1:] != indices[:-1]]
+        avant = np.cumsum(libre) - libre
+        utiles = avant == np.maximum.accumulate(np.where(debut, avant, 0))
+        indices, rangs, libre = indices[utiles], rangs[utiles], libre[utiles]
+
+        repli = np.full(nb_codes, self.nb)
+        repli[indices[libre]] = rangs[libre]
+        premiers = repli[codes]
+        indices, rangs = indices[~libre], rangs[~libre]
+        if rangs.size:
+            n = np.arange(rangs.size)
+            position = n - np.maximum.accumulate(np.where(np.r_[True, indices[1:] != indices[:-1]], n, 0))
+            bornees = np.full((position.max() + 1, nb_codes), self.nb)
+            bornees[position, indices] = rangs
+            for k in range(len(bornees) - 1, -1, -1):
+                rang = bornees[k][codes]
+                retenue = (self.minimum[rang] <= montants) & (montants <= self.maximum[rang])
+                premiers = np.where(retenue, rang, premiers)
+        return premiers
+
+    def classify(self, descriptions, montants_centimes) -> np.ndarray:
+        """categorie_id retenue pour chaque dépense (-1 si aucune règle) ; montant NaN :
+        seules les règles sans bornes s'appliquent"""
+        # Chaînes Python : parcourir des chaînes Arrow coûte un objet par élément
+        descriptions = pd.Series(descriptions).to_numpy(dtype=object, na_value='')
+        resultat = np.full(len(descriptions), -1, np.int64)
+        if self.nb == 0 or resultat.size == 0:
+            return resultat
+        montants = np.asarray(montants_centimes, dtype=float)
+
+        codes_bruts, bruts = pd.factorize(descriptions)
+        # normalize() en ligne : l'appel de fonction coûte autant que la traduction
+        codes_textes, textes = pd.factorize(
+            np.array([' '.join(b.translate(_NORMALISATION).split()) for b in bruts], dtype=object)
+        )
+        # Mots et alias par texte normalisé, regex par description brute : la première règle
+        # retenue est la meilleure des deux
+        premiers = self._premiers(codes_textes[codes_bruts], len(textes), *self._candidats_textes(textes), montants)
+        if self._regex:
+            premiers = np.minimum(premiers, self._premiers(codes_bruts, len(bruts), *self._candidats_bruts(bruts), montants))
+        trouvees = premiers < self.nb
+        resultat[trouvees] = self.categories[premiers[trouvees]]
+        return resultat
+
+
+# -----------------------
+# Règles
+# -----------------------
+@cached_reader(tables=('regles_categorie',), max_entries=2000, ttl=3600, max_mb=8)
+def list_rules(user_id: int) -> pd.DataFrame:
+    """Règles de catégorisation d'un utilisateur, par ordre de préférence (catégorie par id)"""
+    return read_query(
+        """
+        SELECT id, type, motif, categorie_id, montant_min_centimes / 100.0 AS montant_min,
+               montant_max_centimes / 100.0 AS montant_max, priorite, actif
+        FROM regles_categorie WHERE user_id = ?
+        ORDER BY priorite DESC, (montant_min_centimes IS NULL AND montant_max_centimes IS NULL), id
+        """,
+        (user_id,)
+    )
+
+
+@cached_reader(tables=('regles_categorie', 'categories'), max_entries=500, ttl=3600, max_mb=16)
+def _matcher(user_id: int) -> RuleMatcher:
+    """Règles actives vers des catégories actives, compilées"""
+    return RuleMatcher(read_query(
+        """
+        SELECT r.id, r.type, r.motif, r.categorie_id, r.montant_min_centimes, r.montant_max_centimes, r.priorite
+        FROM regles_categorie r JOIN categories c ON c.id = r.categorie_id AND c.actif = 1
+        WHERE r.user_id = ? AND r.actif = 1
+        """,
+        (user_id,)
+    ))
+
+
+def add_rule(user_id: int, type_: str, motif: str, categorie_id: int, montant_min: float = None,
+             montant_max: float = None, priorite: int = 0):
+    """Ajoute une règle (type 'mot', 'alias' ou 'regex') ; ValueError si le motif est inutilisable"""
+    motif = motif.strip()
+    _valider(type_, motif)
+    if montant_min is not None and montant_max is not None and montant_min > montant_max:
+        raise ValueError("Le montant minimum dépasse le maximum.")
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO regles_categorie(user_id, type, motif, categorie_id, montant_min_centimes,
+                                         montant_max_centimes, priorite)
+            VALUES (?, ?, ?, ?, ?, ?, ?);
+            """,
+            (user_id, type_, motif, int(categorie_id),
+             None if montant_min is None else to_centimes(montant_min),
+             None if montant_max is None else to_centimes(montant_max), int(priorite))
+        )
+    invalidate(user_id, 'regles_categorie')
+
+
+def toggle_rule(user_id: int, regle_id: int, actif: int):
+    """Suspend ou reprend une règle"""
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE regles_categorie SET actif=? WHERE id=? AND user_id=?;", (actif, regle_id, user_id))
+    invalidate(user_id, 'regles_categorie')
+
+
+def delete_rule(user_id: int, regle_id: int):
+    """Supprime une règle ; les dépenses déjà catégorisées ne changent pas"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM regles_categorie WHERE id=? AND user_id=?;", (regle_id, user_id))
+    invalidate(user_id, 'regles_categorie')
+
+
+# -----------------------
+# Classification
+# -----------------------
+def categorize(user_id: int, descriptions, montants=None) -> list:
+    """Catégorie donnée par les règles à chaque description (montants en euros), None si aucune"""
+    descriptions = list(descriptions)
+    centimes = np.full(len(descriptions), np.nan) if montants is None \
+        else np.round(np.asarray(montants, dtype=float) * 100)
+    return [int(c) if c >= 0 else None for c in _matcher(user_id).classify(descriptions, centimes)]
+
+
+def recategorize_history(user_id: int, categories: list = None, dry_run: bool = False, conn=None) -> pd.DataFrame:
+    """Réapplique les règles aux dépenses de l'utilisateur (à celles des `categories` si
+    précisé) ; retourne les changements par (ancienne, nouvelle) catégorie : nb, montant.
+
+    Lecture, classification et mise à jour dans une transaction : un seul UPDATE joint à une
+    table temporaire des nouvelles catégories. Les dépenses sans règle gardent leur catégorie ;
+    les mois archivés (Parquet) ne sont pas modifiables. Avec `dry_run`, rien n'est écrit.
+    """
+    conn = conn or get_connection()
+    filtre, params = "", [user_id]
+    if categories is not None:
+        filtre = f"AND categorie_id IN ({','.join('?' * len(categories)) or 'NULL'})"
+        params.extend(int(c) for c in categories)
+
+    with conn:
+        if not dry_run:
+            conn.execute("BEGIN IMMEDIATE;")
+        depenses = pd.read_sql_query(
+            f"SELECT id, categorie_id, description, montant_centimes FROM depenses WHERE user_id = ? {filtre};",
+            conn, params=params
+        )
+        nouvelles = _matcher(user_id).classify(depenses['description'], depenses['montant_centimes'].to_numpy(float))
+        changees = depenses.assign(nouvelle_id=nouvelles)[(nouvelles >= 0) & (nouvelles != depenses['categorie_id'])]
+        if not dry_run and not changees.empty:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS recategorisation(id INTEGER PRIMARY KEY, categorie_id INTEGER NOT NULL);")
+            conn.execute("DELETE FROM temp.recategorisation;")
+            conn.executemany(
+                "INSERT INTO temp.recategorisation(id, categorie_id) VALUES (?, ?);",
+                zip(changees['id'].tolist(), changees['nouvelle_id'].tolist())
+            )
+            conn.execute(
+                """
+                UPDATE depenses SET categorie_id = r.categorie_id
+                FROM temp.recategorisation r
+                WHERE depenses.id = r.id AND depenses.user_id = ?;
+                """,
+                (user_id,)
+            )
+            mois = [m for m, in conn.execute(
+                "SELECT DISTINCT mois FROM depenses WHERE id IN (SELECT id FROM temp.recategorisation) ORDER BY mois;"
+            )]
+            conn.execute("DROP TABLE temp.recategorisation;")
+
+    if not dry_run and not changees.empty:
+        invalidate(user_id, 'depenses')
+        for m in mois:
+            evaluate_alerts(m, user_ids=[user_id])
+
+    noms = list_categories(user_id, actives_seulement=False).set_index('id')['nom']
+    resume = changees.groupby(['categorie_id', 'nouvelle_id'], as_index=False).agg(
+        nb=('id', 'count'), montant=('montant_centimes', 'sum')
+    ).sort_values('nb', ascending=False, ignore_index=True)
+    return pd.DataFrame({
+        'ancienne': resume['categorie_id'].map(noms),
+        'nouvelle': resume['nouvelle_id'].map(noms),
+        'nb': resume['nb'],
+        'montant': resume['montant'] / 100.0,
+    })
+
+
+# -----------------------
+# Suggestions apprises de l'historique
+# -----------------------
+def suggest_rules(libelles: pd.DataFrame, matcher: RuleMatcher, min_support: int = 3,
+                  min_precision: float = 0.9) -> pd.DataFrame:
+    """Mots-clés appris de libellés déjà catégorisés (description, categorie_id, nb, montant_centimes)
+    que les règles ne couvrent pas : mots présents dans au moins `min_support` dépenses, dont une
+    part d'au moins `min_precision` dans une même catégorie. Colonnes : motif, categorie_id, nb,
+    precision, exemple."""
+    colonnes = ['motif', 'categorie_id', 'nb', 'precision', 'exemple']
+    libelles = libelles[matcher.classify(libelles['description'], libelles['montant_centimes'].to_numpy(float)) < 0]
+    if libelles.empty:
+        return pd.DataFrame(columns=colonnes)
+    # Regroupement par texte normalisé : références et dates des relevés disparaissent
+    codes, textes = pd.factorize(np.array([normalize(d) for d in libelles['description'].tolist()], dtype=object))
+    par_texte = libelles.assign(texte=codes).sort_values('nb', ascending=False).groupby(
+        ['texte', 'categorie_id'], as_index=False
+    ).agg(nb=('nb', 'sum'), exemple=('description', 'first'))
+    mots_du_texte = pd.Series(
+        [sorted({m for m in t.split() if len(m) >= 3 and m not in MOTS_VIDES}) for t in textes]
+    )
+    mots = par_texte.assign(motif=mots_du_texte.to_numpy()[par_texte['texte']]).explode('motif').dropna(subset=['motif'])
+    if mots.empty:
+        return pd.DataFrame(columns=colonnes)
+
+    par_categorie = mots.sort_values('nb', ascending=False).groupby(['motif', 'categorie_id'], as_index=False).agg(
+        nb=('nb', 'sum'), exemple=('exemple', 'first')
+    )
+    par_categorie['precision'] = par_categorie['nb'] / par_categorie.groupby('motif')['nb'].transform('sum')
+    retenus = par_categorie[(par_categorie['nb'] >= min_support) & (par_categorie['precision'] >= min_precision)]
+    return retenus.sort_values(['nb', 'motif'], ascending=[False, True], ignore_index=True)[colonnes]
+
+
+@cached_reader(tables=('depenses', 'regles_categorie', 'categories'), max_entries=500, ttl=3600, max_mb=16)
+def _suggestions(user_id: int, min_support: int, min_precision: float) -> pd.DataFrame:
+    libelles = read_query(
+        """
+        SELECT description, categorie_id, COUNT(*) AS nb, CAST(AVG(montant_centimes) AS INTEGER) AS montant_centimes
+        FROM depenses WHERE user_id = ? AND description IS NOT NULL AND description != ''
+        GROUP BY description, categorie_id
+        """,
+        (user_id,)
+    )
+    return suggest_rules(libelles, _matcher(user_id), min_support, min_precision)
+
+
+def learn_suggestions(user_id: int, min_support: int = 3, min_precision: float = 0.9, limit: int = 20) -> pd.DataFrame:
+    """Règles 'mot' proposées d'après les dépenses de l'utilisateur (voir suggest_rules), avec le nom
+    de la catégorie"""
+    return avec_noms(user_id, _suggestions(user_id, min_support, min_precision).head(limit), position=2)
@@ -0,0 +1,108 @@
+"""
+Cohérence du cache entre processus (optionnelle : BUDGET_CACHE_COHERENCE=1)
+
+Plusieurs processus Streamlit sur la même base (conteneurs sur un volume partagé, workers)
+ont chacun leur cache de lecture : sans versions partagées, une écriture dans l'un laisse
+les autres servir l'ancien état. Les versions des données deviennent alors durables (table
+versions_donnees, avancée par invalidate) et chaque avance reçoit un numéro global (seq).
+
+Au début de chaque lecture en cache, PRAGMA data_version indique sans lire de table si un
+autre processus (ou une autre connexion) a validé une transaction depuis le passage
+précédent ; seulement dans ce cas, les versions avancées depuis le dernier seq relevé
+sont lues par l'index et les entrées qui en dépendent sont écartées. Le cache disque
+(src.disk_cache) branche aussi ces versions.
+"""
+import os
+import sqlite3
+import threading
+
+from .cache import CACHE, VERSIONS
+from .database import get_db_path
+
+
+ENABLED = os.getenv("BUDGET_CACHE_COHERENCE", "0") == "1"
+
+
+class PersistentVersions:
+    """Versions des données dans la base (table versions_donnees)"""
+
+    def __init__(self, db_path):
+        # Connexion dédiée en autocommit : le rollback d'un écrivain sur la connexion partagée
+        # ne peut pas faire revenir une version en arrière (et resservir une ancienne clé)
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._data_version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+            self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM versions_donnees;").fetchone()[0]
+
+    def instance(self) -> str:
+        with self._lock:
+            return self._conn.execute("SELECT valeur FROM parametres WHERE cle = 'instance';").fetchone()[0]
+
+    def load(self, user_id: int) -> dict:
+        with self._lock:
+            lignes = self._conn.execute(
+                "SELECT nom_table, version FROM versions_donnees WHERE user_id = ?;", (user_id,)
+            ).fetchall()
+        return {(user_id, table): version for table, version in lignes}
+
+    def bump(self, user_id: int, tables: tuple) -> dict:
+        with self._lock:
+            # Une transaction : les tables d'une même écriture changent ensemble pour les autres processus
+            self._conn.execute("BEGIN IMMEDIATE;")
+            try:
+                versions = {
+                    (user_id, table): self._conn.execute(
+                        """
+                        INSERT INTO versions_donnees(user_id, nom_table, version, seq)
+                        VALUES (?, ?, 1, (SELECT COALESCE(MAX(seq), 0) + 1 FROM versions_donnees))
+                        ON CONFLICT(user_id, nom_table) DO UPDATE SET version = version + 1, seq = excluded.seq
+                        RETURNING version;
+                        """,
+                        (user_id, table)
+                    ).fetchone()[0]
+                    for table in tables
+                }
+            except BaseException:
+                self._conn.execute("ROLLBACK;")
+                raise
+            self._conn.execute("COMMIT;")
+        return versions
+
+    def changes(self) -> dict:
+        """Versions avancées depuis l'appel précédent {(user_id, table): version} ; sans requête
+        si aucune autre connexion n'a rien validé entre-temps"""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+            if data_version == self._data_version:
+                return {}
+            self._data_version = data_version
+            lignes = self._conn.execute(
+                "SELECT user_id, nom_table, version, seq FROM versions_donnees WHERE seq > ?;", (self._seq,)
+            ).fetchall()
+            if lignes:
+                self._seq = max(seq for *_, seq in lignes)
+        return {(user_id, table): version for user_id, table, version, _ in lignes}
+
+
+_VERSIONS = None
+_VERSIONS_LOCK = threading.Lock()
+
+
+def enable_cache_coherence(force: bool = False):
+    """Branche les versions partagées si BUDGET_CACHE_COHERENCE=1 ou avec `force` (cache disque),
+    une fois par processus ; retourne le PersistentVersions ou None.
+
+    Les scripts qui écrivent en base (cron) l'appellent aussi pour que leurs écritures
+    soient vues des processus de l'application.
+    """
+    global _VERSIONS
+    if not (ENABLED or force):
+        return None
+    with _VERSIONS_LOCK:
+        if _VERSIONS is None:
+            _VERSIONS = PersistentVersions(get_db_path())
+            # Les entrées déjà en mémoire sont rangées sous des versions non durables
+            CACHE.clear()
+            VERSIONS.attach(_VERSIONS)
+    return _VERSIONS
@@ -1,114 +1,524 @@
 """
 Module pour les opérations de lecture/écriture sur la base de données
 """
+import numpy as np
 import pandas as pd
-import streamlit as st
 from datetime import date
-from .database import get_connection, get_user_id
+from decimal import Decimal, ROUND_HALF_UP
+from .database import get_connection, get_user_id, read_query, JOUR_JULIEN_OFFSET
+from .cache import CACHE, TOUS, VERSIONS, cached_reader, invalidate, write_start, write_through
+from .duckdb_engine import get_analytics_engine
+from .alerts import evaluate_alerts
+from .archive import (
+    EPOCH_ORDINAL, archived_months, archived_depenses, archived_revenus,
+    archived_by_category, archived_period_totals, iter_archived, rollup_totals,
+)
 
 
 # -----------------------
-# Lecteurs mis en cache
+# Conversions de stockage
 # -----------------------
-@st.cache_data
+def to_centimes(montant: float) -> int:
+    """Convertit un montant en euros vers des centimes entiers (arrondi commercial)"""
+    return int((Decimal(str(montant)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_jour(d) -> int:
+    """Convertit une date (ou une chaîne ISO) en numéro de jour"""
+    if not isinstance(d, date):
+        d = date.fromisoformat(str(d)[:10])
+    return d.toordinal()
+
+
+def bornes_mois(mois: str) -> tuple:
+    """Retourne le premier et le dernier numéro de jour d'un mois 'YYYY-MM'"""
+    annee, m = (int(x) for x in mois.split("-"))
+    debut = date(annee, m, 1)
+    fin = date(annee + (m == 12), m % 12 + 1, 1)
+    return debut.toordinal(), fin.toordinal() - 1
+
+
+# -----------------------
+# Lecteurs mis en cache (limites par fonction, budget global BUDGET_CACHE_MAX_MB),
+# exécutés sur les connexions en lecture seule dans un budget de temps
+# -----------------------
+@cached_reader(tables=('categories',), max_entries=2000, ttl=3600, max_mb=16)
 def list_categories(user_id: int, actives_seulement: bool = True) -> pd.DataFrame:
-    """Liste les catégories d'un utilisateur"""
-    conn = get_connection()
-    q = "SELECT id, nom, actif FROM categories WHERE user_id = ?"
+    """Liste les catégories d'un utilisateur, avec leur parent, leur niveau et leur chemin"""
+    q = """
+        SELECT c.id, c.nom, c.actif, c.parent_id,
+               (SELECT MAX(profondeur) FROM categories_closure WHERE descendant_id=c.id) AS niveau,
+               (SELECT group_concat(nom, ' › ') FROM (
+                    SELECT a.nom FROM categories_closure cc JOIN categories a ON a.id=cc.ancetre_id
+                    WHERE cc.descendant_id=c.id ORDER BY cc.profondeur DESC
+               )) AS chemin
+        FROM categories c WHERE c.user_id = ?
+    """
     if actives_seulement:
-        q += " AND actif=1"
-    q += " ORDER BY nom;"
-    return pd.read_sql_query(q, conn, params=(user_id,))
+        q += " AND c.actif=1"
+    q += " ORDER BY c.nom;"
+    return read_query(q, (user_id,))
+
+
+def avec_noms(user_id: int, frame: pd.DataFrame, position: int = None, actives_seulement: bool = False) -> pd.DataFrame:
+    """Ajoute la colonne 'categorie' d'après 'categorie_id', depuis la dimension en cache (list_categories).
+
+    Les lectures de faits ne joignent pas categories : un renommage n'invalide que la
+    dimension. Les noms sont pris par codes (position de chaque id dans la dimension) ;
+    id inconnu, ou inactif si `actives_seulement`, -> None.
+    """
+    dimension = list_categories(user_id, actives_seulement=actives_seulement)
+    codes = pd.Index(dimension['id']).get_indexer(frame['categorie_id'])
+    noms = np.append(dimension['nom'].to_numpy(dtype=object), None)
+    frame = frame.copy(deep=False)
+    frame.insert(len(frame.columns) if position is None else position, 'categorie', noms[codes])
+    return frame
 
 
-@st.cache_data
+@cached_reader(tables=('depenses', 'budgets', 'categories'), max_entries=2000, ttl=3600, max_mb=16)
+def category_rollup(user_id: int, mois: str) -> pd.DataFrame:
+    """Dépenses du mois et budgets cumulés à chaque niveau de la hiérarchie des catégories.
+
+    budget : budget posé sur la catégorie elle-même ; budget_enfants : somme des budgets
+    de ses sous-catégories ; depense : dépenses de la catégorie et de tout son sous-arbre.
+    """
+    # Une jointure par la table de fermeture (index ancêtre puis descendant), sans parcours récursif
+    q = """
+        WITH dep AS (
+            SELECT categorie_id, SUM(c) AS c FROM (
+                SELECT categorie_id, montant_centimes AS c FROM depenses
+                WHERE user_id=? AND jour BETWEEN ? AND ?
+                UNION ALL
+                SELECT categorie_id, total_centimes FROM rollup_depenses WHERE user_id=? AND mois=?
+            ) GROUP BY categorie_id
+        ),
+        bud AS (
+            SELECT b.categorie_id, b.budget_centimes AS c
+            FROM budgets b JOIN categories c ON c.id=b.categorie_id
+            WHERE b.user_id=? AND b.mois=? AND c.actif=1
+        )
+        SELECT a.id, a.nom, a.parent_id, a.actif,
+               SUM(CASE WHEN cc.profondeur = 0 THEN bud.c END) / 100.0 AS budget,
+               COALESCE(SUM(CASE WHEN cc.profondeur > 0 THEN bud.c END), 0) / 100.0 AS budget_enfants,
+               COALESCE(SUM(dep.c), 0) / 100.0 AS depense
+        FROM categories a
+        JOIN categories_closure cc ON cc.ancetre_id=a.id
+        LEFT JOIN dep ON dep.categorie_id=cc.descendant_id
+        LEFT JOIN bud ON bud.categorie_id=cc.descendant_id
+        WHERE a.user_id=?
+        GROUP BY a.id
+        ORDER BY a.nom
+    """
+    return read_query(q, (user_id, *bornes_mois(mois), user_id, mois, user_id, mois, user_id))
+
+
+@cached_reader(tables=('revenus',), max_entries=5000, ttl=3600, max_mb=32)
 def list_revenus(user_id: int, mois: str) -> pd.DataFrame:
     """Liste les revenus d'un utilisateur pour un mois donné"""
-    conn = get_connection()
-    return pd.read_sql_query(
-        "SELECT id, origine, montant FROM revenus WHERE user_id=? AND mois=? ORDER BY id DESC;",
-        conn, params=(user_id, mois)
+    revenus = read_query(
+        "SELECT id, origine, montant_centimes / 100.0 AS montant FROM revenus WHERE user_id=? AND mois=? ORDER BY id DESC;",
+        (user_id, mois)
+    )
+    if mois not in archived_months(user_id):
+        return revenus
+    archives = archived_revenus(user_id, mois, mois)
+    archives = archives.assign(montant=archives['montant_centimes'] / 100)[revenus.columns]
+    return _fusionner(revenus, archives, ['id'])
+
+
+@cached_reader(tables=('budgets',), max_entries=5000, ttl=3600, max_mb=32)
+def _budgets_du_mois(user_id: int, mois: str) -> pd.DataFrame:
+    """Budgets d'un mois, sans nom de catégorie (recherche sur l'index unique user_id, mois)"""
+    return read_query(
+        "SELECT id, categorie_id, budget_centimes / 100.0 AS budget FROM budgets WHERE user_id=? AND mois=?;",
+        (user_id, mois)
     )
 
 
-@st.cache_data
 def list_budgets(user_id: int, mois: str) -> pd.DataFrame:
-    """Liste les budgets d'un utilisateur pour un mois donné"""
-    conn = get_connection()
-    q = """
-        SELECT b.id, b.categorie_id, c.nom AS categorie, b.budget
-        FROM budgets b
-        JOIN categories c ON c.id=b.categorie_id
-        WHERE b.user_id=? AND b.mois=? AND c.actif=1
-        ORDER BY c.nom
+    """Liste les budgets d'un utilisateur pour un mois donné (catégories actives, par nom)"""
+    budgets = avec_noms(user_id, _budgets_du_mois(user_id, mois), position=2, actives_seulement=True)
+    return budgets.dropna(subset=['categorie']).sort_values('categorie', ignore_index=True)
+
+
+@cached_reader(tables=('depenses',), max_entries=5000, ttl=3600, max_mb=96)
+def _depenses_du_mois(user_id: int, mois: str) -> pd.DataFrame:
+    """Dépenses d'un mois, sans nom de catégorie"""
+    # Filtre et tri sur l'index (user_id, jour, id), parcouru à rebours
+    q = f"""
+        SELECT id, date(jour + {JOUR_JULIEN_OFFSET}) AS date_depense,
+               description, montant_centimes / 100.0 AS montant, categorie_id
+        FROM depenses
+        WHERE user_id=? AND jour BETWEEN ? AND ?
+        ORDER BY jour DESC, id DESC
     """
-    return pd.read_sql_query(q, conn, params=(user_id, mois))
+    depenses = read_query(q, (user_id, *bornes_mois(mois)))
+    if mois not in archived_months(user_id):
+        return depenses
+    archives = _depenses_archivees(user_id, *bornes_mois(mois))
+    return _fusionner(depenses, archives[depenses.columns], ['date_depense', 'id'])
 
 
-@st.cache_data
 def list_depenses(user_id: int, mois: str) -> pd.DataFrame:
     """Liste les dépenses d'un utilisateur pour un mois donné"""
-    conn = get_connection()
-    q = """
-        SELECT d.id, d.date_depense, c.nom AS categorie, d.description, d.montant, d.categorie_id
-        FROM depenses d
-        JOIN categories c ON c.id=d.categorie_id
-        WHERE d.user_id=? AND d.mois=?
-        ORDER BY datetime(d.date_depense) DESC, d.id DESC
-    """
-    return pd.read_sql_query(q, conn, params=(user_id, mois))
+    return avec_noms(user_id, _depenses_du_mois(user_id, mois), position=2)
 
 
-@st.cache_data
-def get_all_data(user_id: int) -> dict:
-    """Récupère toutes les données d'un utilisateur pour analyses"""
-    conn = get_connection()
-    
-    revenus = pd.read_sql_query(
-        "SELECT * FROM revenus WHERE user_id=? ORDER BY mois, id",
-        conn, params=(user_id,)
+# -----------------------
+# Mois archivés (src.archive) : lignes Parquet en lecture seule et agrégats SQLite,
+# ajoutés aux lectures sur les tables chaudes
+# -----------------------
+def _fusionner(chaudes: pd.DataFrame, archivees: pd.DataFrame, tri: list, ascending: bool = False) -> pd.DataFrame:
+    """Lignes chaudes et archivées dans l'ordre de la requête chaude"""
+    if archivees.empty:
+        return chaudes
+    if chaudes.empty:
+        fusion = archivees.astype({c: t for c, t in chaudes.dtypes.items() if t != object})
+    else:
+        fusion = pd.concat([chaudes, archivees.astype(chaudes.dtypes.to_dict())], ignore_index=True)
+    return fusion.sort_values(tri, ascending=ascending, kind='stable', ignore_index=True)
+
+
+def _depenses_archivees(user_id: int, debut: int, fin: int) -> pd.DataFrame:
+    """Dépenses archivées entre deux numéros de jour, avec date ISO et montant"""
+    return _avec_dates(archived_depenses(user_id, debut, fin))
+
+
+def _avec_dates(lignes: pd.DataFrame) -> pd.DataFrame:
+    """Date ISO, mois et montant en euros de dépenses archivées (numéro de jour, centimes)"""
+    dates = pd.to_datetime(lignes['jour'].astype('int64') - EPOCH_ORDINAL, unit='D')
+    return lignes.assign(
+        date_depense=dates.dt.strftime('%Y-%m-%d'),
+        mois=dates.dt.strftime('%Y-%m'),
+        montant=lignes['montant_centimes'] / 100,
+    )
+
+
+def _avec_rollups(user_id: int, totaux: pd.DataFrame) -> pd.DataFrame:
+    """Ajoute aux totaux mensuels les agrégats des mois archivés"""
+    if totaux.empty:
+        return totaux
+    mois = totaux['mois'].astype(str)
+    archives = rollup_totals(user_id, mois.min(), mois.max())
+    if archives.empty:
+        return totaux
+    totaux = totaux.copy()
+    for colonne in ('revenus', 'depenses'):
+        delta = archives[colonne].reindex(mois.values).fillna(0).to_numpy()
+        totaux[colonne] = ((totaux[colonne] * 100).round() + delta) / 100
+    return totaux
+
+
+def _avec_stats_archivees(user_id: int, stats: pd.DataFrame, debut: date, fin: date) -> pd.DataFrame:
+    """Ajoute aux statistiques par catégorie (categorie_id) les dépenses archivées de la période"""
+    archives = archived_by_category(user_id, debut, fin)
+    if archives.empty:
+        return stats
+    archives = archives.groupby('categorie_id')
+    chaudes = stats.astype({'total': float, 'nombre': int}).set_index('categorie_id')
+    centimes = (chaudes['total'] * 100).round().add(archives['total_centimes'].sum(), fill_value=0)
+    nombre = chaudes['nombre'].add(archives['nb'].sum(), fill_value=0).astype(int)
+    return (
+        pd.DataFrame({'total': centimes / 100, 'nombre': nombre, 'moyenne': centimes / nombre / 100})
+        .rename_axis('categorie_id').reset_index()
+        .sort_values('total', ascending=False, ignore_index=True)
     )
-    
-    depenses = pd.read_sql_query(
-        "SELECT d.*, c.nom AS categorie FROM depenses d LEFT JOIN categories c ON d.categorie_id=c.id WHERE d.user_id=? ORDER BY d.date_depense",
-        conn, params=(user_id,)
+
+
+# -----------------------
+# Agrégations multi-mois : moteur DuckDB si BUDGET_ANALYTICS_BACKEND=duckdb, sinon SQLite
+# -----------------------
+@cached_reader(tables=('revenus', 'depenses'), max_entries=2000, ttl=3600, max_mb=16)
+def monthly_totals(user_id: int, months: list) -> pd.DataFrame:
+    """Totaux exacts (sommes en centimes) des revenus et dépenses pour une liste de mois 'YYYY-MM'"""
+    engine = get_analytics_engine()
+    if engine is not None:
+        return _avec_rollups(user_id, engine.monthly_totals(user_id, months))
+
+    months = sorted(months)
+    debut, _ = bornes_mois(months[0])
+    _, fin = bornes_mois(months[-1])
+
+    revenus = read_query(
+        """
+        SELECT mois, SUM(montant_centimes) AS revenus FROM revenus
+        WHERE user_id=? AND mois BETWEEN ? AND ?
+        GROUP BY mois
+        """,
+        (user_id, months[0], months[-1]), index_col='mois'
+    )
+    depenses = read_query(
+        f"""
+        SELECT strftime('%Y-%m', jour + {JOUR_JULIEN_OFFSET}) AS mois, SUM(montant_centimes) AS depenses
+        FROM depenses
+        WHERE user_id=? AND jour BETWEEN ? AND ?
+        GROUP BY 1
+        """,
+        (user_id, debut, fin), index_col='mois'
+    )
+
+    totaux = pd.DataFrame(index=pd.Index(months, name='mois'))
+    totaux['revenus'] = revenus['revenus'].reindex(totaux.index).fillna(0) / 100
+    totaux['depenses'] = depenses['depenses'].reindex(totaux.index).fillna(0) / 100
+    return _avec_rollups(user_id, totaux.reset_index())
+
+
+@cached_reader(tables=('revenus', 'depenses'), max_entries=2000, ttl=3600, max_mb=4)
+def period_totals(user_id: int, debut: date, fin: date) -> dict:
+    """Total des revenus (mois commençant dans la période) et des dépenses datées dans la période"""
+    archives = archived_period_totals(user_id, debut, fin)
+    engine = get_analytics_engine()
+    if engine is not None:
+        totaux = engine.period_totals(user_id, debut, fin)
+        return {k: _ajuster_total(v, archives[k]) for k, v in totaux.items()}
+
+    totaux = read_query(
+        """
+        SELECT
+            (SELECT COALESCE(SUM(montant_centimes), 0) FROM revenus
+             WHERE user_id=? AND mois || '-01' BETWEEN ? AND ?) / 100.0 AS revenus,
+            (SELECT COALESCE(SUM(montant_centimes), 0) FROM depenses
+             WHERE user_id=? AND jour BETWEEN ? AND ?) / 100.0 AS depenses
+        """,
+        (user_id, debut.isoformat(), fin.isoformat(), user_id, to_jour(debut), to_jour(fin))
     )
-    
-    budgets = pd.read_sql_query(
-        "SELECT b.*, c.nom AS categorie FROM budgets b LEFT JOIN categories c ON b.categorie_id=c.id WHERE b.user_id=? ORDER BY b.mois, c.nom",
-        conn, params=(user_id,)
+    return {k: _ajuster_total(float(v), archives[k]) for k, v in totaux.iloc[0].items()}
+
+
+@cached_reader(tables=('depenses',), max_entries=2000, ttl=3600, max_mb=16)
+def _stats_par_categorie(user_id: int, debut: date, fin: date) -> pd.DataFrame:
+    """Somme, nombre et moyenne des dépenses par categorie_id sur la période"""
+    engine = get_analytics_engine()
+    if engine is not None:
+        return _avec_stats_archivees(user_id, engine.category_stats(user_id, debut, fin), debut, fin)
+
+    stats = read_query(
+        """
+        SELECT categorie_id,
+               SUM(montant_centimes) / 100.0 AS total,
+               COUNT(*) AS nombre,
+               AVG(montant_centimes) / 100.0 AS moyenne
+        FROM depenses
+        WHERE user_id=? AND jour BETWEEN ? AND ?
+        GROUP BY categorie_id
+        ORDER BY total DESC
+        """,
+        (user_id, to_jour(debut), to_jour(fin))
     )
-    
+    return _avec_stats_archivees(user_id, stats, debut, fin)
+
+
+def category_stats(user_id: int, debut: date, fin: date) -> pd.DataFrame:
+    """Somme, nombre et moyenne des dépenses par catégorie sur la période"""
+    return avec_noms(user_id, _stats_par_categorie(user_id, debut, fin), position=0).drop(columns='categorie_id')
+
+
+# Historique complet d'un utilisateur (partagé avec l'export Excel en flux),
+# noms de catégorie ajoutés depuis la dimension
+ALL_DATA_QUERIES = {
+    'revenus': """
+        SELECT id, user_id, mois, origine, montant_centimes / 100.0 AS montant
+        FROM revenus WHERE user_id=? ORDER BY mois, id
+    """,
+    'depenses': f"""
+        SELECT id, user_id, date(jour + {JOUR_JULIEN_OFFSET}) AS date_depense, categorie_id, description,
+               montant_centimes / 100.0 AS montant, mois
+        FROM depenses WHERE user_id=? ORDER BY jour, id
+    """,
+    'budgets': """
+        SELECT id, user_id, mois, categorie_id, budget_centimes / 100.0 AS budget
+        FROM budgets WHERE user_id=? ORDER BY mois, categorie_id
+    """,
+}
+
+
+@cached_reader(tables=('revenus', 'depenses', 'budgets'), max_entries=100, ttl=900, max_mb=128)
+def _historique(user_id: int) -> dict:
+    """Historique complet, sans noms de catégorie"""
+    data = {
+        table: read_query(q, (user_id,))
+        for table, q in ALL_DATA_QUERIES.items()
+    }
+    revenus, depenses = _historique_archive(user_id)
+    data['revenus'] = _fusionner(data['revenus'], revenus, ['mois', 'id'], ascending=True)
+    data['depenses'] = _fusionner(data['depenses'], depenses, ['date_depense', 'id'], ascending=True)
+    return data
+
+
+def get_all_data(user_id: int) -> dict:
+    """Récupère toutes les données d'un utilisateur pour analyses"""
+    data = _historique(user_id)
+    budgets = avec_noms(user_id, data['budgets'])
     return {
-        'revenus': revenus,
-        'depenses': depenses,
-        'budgets': budgets
+        'revenus': data['revenus'],
+        'depenses': avec_noms(user_id, data['depenses']),
+        'budgets': budgets.sort_values(['mois', 'categorie'], kind='stable', ignore_index=True),
     }
 
 
+def _historique_archive(user_id: int) -> tuple:
+    revenus = archived_revenus(user_id, '0000-01', '9999-12')
+    revenus = revenus.assign(montant=revenus['montant_centimes'] / 100)
+    depenses = _depenses_archivees(user_id, 1, date.max.toordinal())
+    return (
+        revenus[['id', 'user_id', 'mois', 'origine', 'montant']],
+        depenses[['id', 'user_id', 'date_depense', 'categorie_id', 'description', 'montant', 'mois']],
+    )
+
+
+def iter_archived_history(user_id: int, table: str, chunk_size: int):
+    """Revenus ou dépenses archivés par lots, aux colonnes de ALL_DATA_QUERIES (sans nom de
+    catégorie), pour les exports : les fichiers Parquet ne sont jamais chargés en entier"""
+    for lignes in iter_archived(user_id, table, chunk_size):
+        if table == 'revenus':
+            yield lignes.assign(montant=lignes['montant_centimes'] / 100)[
+                ['id', 'user_id', 'mois', 'origine', 'montant']
+            ]
+        else:
+            yield _avec_dates(lignes)[
+                ['id', 'user_id', 'date_depense', 'categorie_id', 'description', 'montant', 'mois']
+            ]
+
+
+def archived_ids(user_id: int, table: str, mois: str) -> set:
+    """Numéros des lignes archivées (lecture seule) d'un mois de 'depenses' ou 'revenus'"""
+    if mois not in archived_months(user_id):
+        return set()
+    if table == 'depenses':
+        lignes = archived_depenses(user_id, *bornes_mois(mois))
+    else:
+        lignes = archived_revenus(user_id, mois, mois)
+    return set(lignes['id'].astype('int64').tolist())
+
+
 def clear_cache():
-    """Vide les caches de lecture"""
-    list_categories.clear()
-    list_revenus.clear()
-    list_budgets.clear()
-    list_depenses.clear()
-    get_all_data.clear()
+    """Vide les caches de lecture, ceux des autres processus compris (versions partagées)"""
+    CACHE.clear()
+    VERSIONS.bump(TOUS, ('cache',))
+
+
+def cache_stats() -> pd.DataFrame:
+    """Statistiques du cache de lecture (entrées, octets, taux de hit, évictions)"""
+    return CACHE.stats()
+
+
+def check_cache_consistency(user_id: int = None) -> pd.DataFrame:
+    """Compare les entrées du cache (dont celles corrigées par patch) avec une lecture fraîche"""
+    return CACHE.verify(user_id)
+
+
+# -----------------------
+# Écriture traversante : une ligne ajoutée ou supprimée est appliquée en delta aux
+# entrées en cache ; None demande l'invalidation quand le delta n'est pas sûr
+# -----------------------
+def _inserer_ligne(frame: pd.DataFrame, ligne: dict, tri: list):
+    """Insère une ligne à sa place dans l'ordre décroissant `tri` de la requête"""
+    # Frame vide : types des colonnes inconnus ; ligne déjà présente : lecture concurrente
+    if frame.empty or ligne['id'] in frame['id'].values:
+        return None
+    nouvelle = pd.DataFrame([ligne], columns=frame.columns).astype(frame.dtypes.to_dict())
+    return pd.concat([frame, nouvelle], ignore_index=True).sort_values(
+        tri, ascending=False, kind='stable', ignore_index=True
+    )
+
+
+def _retirer_ligne(frame: pd.DataFrame, id_ligne: int):
+    """Retire une ligne par son id (None si la frame devient vide)"""
+    if id_ligne not in frame['id'].values:
+        return frame
+    reste = frame[frame['id'] != id_ligne].reset_index(drop=True)
+    return None if reste.empty else reste
+
+
+def _ajuster_total(total: float, delta_centimes: int) -> float:
+    """Ajoute un delta en centimes à un total en euros, sans dérive des flottants"""
+    return (round(total * 100) + delta_centimes) / 100
+
+
+def _ajuster_totaux(frame: pd.DataFrame, mois: str, colonne: str, delta_centimes: int) -> pd.DataFrame:
+    """Ajuste la ligne d'un mois dans les totaux mensuels"""
+    masque = frame['mois'] == mois
+    if not masque.any():
+        return frame
+    totaux = frame.copy()
+    totaux.loc[masque, colonne] = ((totaux.loc[masque, colonne] * 100).round() + delta_centimes) / 100
+    return totaux
+
+
+def _patch_depense(ligne: dict, signe: int):
+    """Delta de l'ajout (signe=1) ou de la suppression (signe=-1) d'une dépense"""
+    jour = date.fromordinal(ligne['jour'])
+    mois = jour.strftime('%Y-%m')
+    delta = signe * ligne['montant_centimes']
+
+    def patch(name, arguments, value):
+        if name == '_depenses_du_mois':
+            if arguments['mois'] != mois:
+                return value
+            if signe < 0:
+                return _retirer_ligne(value, ligne['id'])
+            return _inserer_ligne(value, {
+                'id': ligne['id'],
+                'date_depense': jour.isoformat(),
+                'description': ligne['description'],
+                'montant': ligne['montant_centimes'] / 100,
+                'categorie_id': ligne['categorie_id'],
+            }, ['date_depense', 'id'])
+        if name == 'monthly_totals':
+            return _ajuster_totaux(value, mois, 'depenses', delta)
+        if name == 'period_totals':
+            if not arguments['debut'] <= jour <= arguments['fin']:
+                return value
+            return {**value, 'depenses': _ajuster_total(value['depenses'], delta)}
+        # Statistiques par catégorie, historique complet : relus
+        return None
+    return patch
+
+
+def _patch_revenu(ligne: dict, signe: int):
+    """Delta de l'ajout (signe=1) ou de la suppression (signe=-1) d'un revenu"""
+    mois = ligne['mois']
+    delta = signe * ligne['montant_centimes']
+
+    def patch(name, arguments, value):
+        if name == 'list_revenus':
+            if arguments['mois'] != mois:
+                return value
+            if signe < 0:
+                return _retirer_ligne(value, ligne['id'])
+            return _inserer_ligne(value, {
+                'id': ligne['id'],
+                'origine': ligne['origine'],
+                'montant': ligne['montant_centimes'] / 100,
+            }, ['id'])
+        if name == 'monthly_totals':
+            return _ajuster_totaux(value, mois, 'revenus', delta)
+        if name == 'period_totals':
+            if not arguments['debut'].isoformat() <= mois + '-01' <= arguments['fin'].isoformat():
+                return value
+            return {**value, 'revenus': _ajuster_total(value['revenus'], delta)}
+        return None
+    return patch
 
 
 # -----------------------
-# Écrivains (vider les caches après écriture)
+# Écrivains (avancer la version des tables modifiées après écriture)
 # -----------------------
 
 # Catégories
-def add_categorie(user_id: int, nom: str):
-    """Ajoute une catégorie pour un utilisateur"""
+def add_categorie(user_id: int, nom: str, parent_id: int = None):
+    """Ajoute une catégorie pour un utilisateur, éventuellement sous une catégorie parente"""
     conn = get_connection()
     with conn:
+        # Parent d'un autre utilisateur ignoré ; categories_closure est complétée par déclencheur
         conn.execute(
-            "INSERT OR IGNORE INTO categories(user_id, nom, actif) VALUES (?, ?, 1);",
-            (user_id, nom)
+            """
+            INSERT OR IGNORE INTO categories(user_id, nom, actif, parent_id)
+            VALUES (?, ?, 1, (SELECT id FROM categories WHERE id=? AND user_id=?));
+            """,
+            (user_id, nom, parent_id, user_id)
         )
-    clear_cache()
+    invalidate(user_id, 'categories')
 
 
 def rename_categorie(user_id: int, cat_id: int, nouveau_nom: str):
@@ -119,84 +529,246 @@ def rename_categorie(user_id: int, cat_id: int, nouveau_nom: str):
             "UPDATE categories SET nom=? WHERE id=? AND user_id=?;",
             (nouveau_nom, cat_id, user_id)
         )
-    clear_cache()
+    invalidate(user_id, 'categories')
+
+
+def move_categorie(user_id: int, cat_id: int, parent_id: int = None):
+    """Range une catégorie (et ses sous-catégories) sous un autre parent, ou à la racine.
+
+    Lève sqlite3.IntegrityError si le parent est la catégorie ou l'une de ses sous-catégories.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            UPDATE categories SET parent_id=(SELECT id FROM categories WHERE id=? AND user_id=?)
+            WHERE id=? AND user_id=?;
+            """,
+            (parent_id, user_id, cat_id, user_id)
+        )
+    invalidate(user_id, 'categories')
 
 
 def toggle_categorie(user_id: int, cat_id: int, actif: int):
-    """Active ou désactive une catégorie"""
+    """Active ou désactive une catégorie et ses sous-catégories
+    (la réactivation réactive aussi ses catégories parentes)"""
     conn = get_connection()
     with conn:
         conn.execute(
-            "UPDATE categories SET actif=? WHERE id=? AND user_id=?;",
-            (actif, cat_id, user_id)
+            """
+            UPDATE categories SET actif=? WHERE user_id=? AND id IN (
+                SELECT descendant_id FROM categories_closure WHERE ancetre_id=?
+                UNION
+                SELECT ancetre_id FROM categories_closure WHERE descendant_id=? AND ?=1
+            );
+            """,
+            (actif, user_id, cat_id, cat_id, actif)
         )
-    clear_cache()
+    invalidate(user_id, 'categories')
 
 
 # Revenus
 def add_revenu(user_id: int, mois: str, origine: str, montant: float):
     """Ajoute un revenu"""
+    centimes = to_centimes(montant)
+    depuis = write_start()
     conn = get_connection()
     with conn:
-        conn.execute(
-            "INSERT INTO revenus(user_id, mois, origine, montant) VALUES(?,?,?,?);",
-            (user_id, mois, origine, montant)
-        )
-    clear_cache()
+        (id_rev,), = conn.execute(
+            "INSERT INTO revenus(user_id, mois, origine, montant_centimes) VALUES(?,?,?,?) RETURNING id;",
+            (user_id, mois, origine, centimes)
+        ).fetchall()
+    write_through(user_id, 'revenus', _patch_revenu(
+        {'id': id_rev, 'mois': mois, 'origine': origine, 'montant_centimes': centimes}, 1
+    ), depuis)
 
 
 def delete_revenu(user_id: int, id_rev: int):
     """Supprime un revenu"""
+    depuis = write_start()
     conn = get_connection()
     with conn:
-        conn.execute(
-            "DELETE FROM revenus WHERE id=? AND user_id=?;",
+        lignes = conn.execute(
+            "DELETE FROM revenus WHERE id=? AND user_id=? RETURNING id, mois, montant_centimes;",
             (id_rev, user_id)
-        )
-    clear_cache()
+        ).fetchall()
+    for id_ligne, mois, centimes in lignes:
+        write_through(user_id, 'revenus', _patch_revenu(
+            {'id': id_ligne, 'mois': mois, 'montant_centimes': centimes}, -1
+        ), depuis)
 
 
 # Budgets
 def update_budget(user_id: int, mois: str, categorie_id: int, budget: float):
     """Met à jour ou crée un budget"""
+    update_budgets(user_id, mois, {categorie_id: budget})
+
+
+def update_budgets(user_id: int, mois: str, budgets: dict):
+    """Met à jour ou crée les budgets {categorie_id: budget} d'un mois, en une transaction"""
+    if not budgets:
+        return
     conn = get_connection()
     with conn:
-        conn.execute(
+        conn.executemany(
             """
-            INSERT INTO budgets(user_id, mois, categorie_id, budget) VALUES(?,?,?,?)
-            ON CONFLICT(user_id, mois, categorie_id) DO UPDATE SET budget=excluded.budget;
+            INSERT INTO budgets(user_id, mois, categorie_id, budget_centimes) VALUES(?,?,?,?)
+            ON CONFLICT(user_id, mois, categorie_id) DO UPDATE SET budget_centimes=excluded.budget_centimes;
             """,
-            (user_id, mois, categorie_id, budget)
+            [(user_id, mois, int(cat_id), to_centimes(budget)) for cat_id, budget in budgets.items()]
         )
-    clear_cache()
+    invalidate(user_id, 'budgets')
+    evaluate_alerts(mois, user_ids=[user_id])
 
 
 # Dépenses
-def add_depense(user_id: int, date_depense: date, categorie_id: int, description_depense: str, montant: float, mois: str):
-    """Ajoute une dépense"""
+def add_depense(user_id: int, date_depense: date, categorie_id: int, description_depense: str, montant: float, mois: str = None):
+    """Ajoute une dépense (le mois est dérivé de la date, le paramètre 'mois' est conservé pour compatibilité)"""
+    jour, centimes = to_jour(date_depense), to_centimes(montant)
+    depuis = write_start()
     conn = get_connection()
     with conn:
-        conn.execute(
-            "INSERT INTO depenses(user_id, date_depense, categorie_id, description, montant, mois) VALUES(?,?,?,?,?,?);",
-            (
-                user_id,
-                date_depense.isoformat() if isinstance(date_depense, date) else str(date_depense),
-                categorie_id,
-                description_depense,
-                montant,
-                mois
-            )
-        )
-    clear_cache()
+        (id_dep,), = conn.execute(
+            "INSERT INTO depenses(user_id, jour, categorie_id, description, montant_centimes) VALUES(?,?,?,?,?) RETURNING id;",
+            (user_id, jour, categorie_id, description_depense, centimes)
+        ).fetchall()
+    write_through(user_id, 'depenses', _patch_depense({
+        'id': id_dep,
+        'jour': jour,
+        'categorie_id': categorie_id,
+        'description': description_depense,
+        'montant_centimes': centimes,
+    }, 1), depuis)
+    evaluate_alerts(date.fromordinal(jour).strftime('%Y-%m'), user_ids=[user_id])
 
 
 def delete_depense(user_id: int, id_dep: int):
     """Supprime une dépense"""
+    depuis = write_start()
     conn = get_connection()
     with conn:
-        conn.execute(
-            "DELETE FROM depenses WHERE id=? AND user_id=?;",
+        lignes = conn.execute(
+            "DELETE FROM depenses WHERE id=? AND user_id=? RETURNING id, jour, montant_centimes;",
             (id_dep, user_id)
+        ).fetchall()
+    for id_ligne, jour, centimes in lignes:
+        write_through(user_id, 'depenses', _patch_depense(
+            {'id': id_ligne, 'jour': jour, 'montant_centimes': centimes}, -1
+        ), depuis)
+
+
+# -----------------------
+# Modifications groupées (grilles éditables) : une transaction, une invalidation,
+# concurrence optimiste sur les valeurs lues
+# -----------------------
+class EditConflict(Exception):
+    """Des lignes ont été modifiées ou supprimées par une autre session depuis leur lecture"""
+
+    def __init__(self, ids: list):
+        self.ids = ids
+        super().__init__(
+            f"{len(ids)} ligne(s) ont été modifiées entre-temps par une autre session : "
+            "aucune modification n'a été enregistrée."
         )
-    clear_cache()
 
+
+def _egal(a, b) -> bool:
+    """Égalité de deux cellules, valeurs manquantes comprises"""
+    if pd.isna(a) and pd.isna(b):
+        return True
+    return a == b
+
+
+def diff_rows(original: pd.DataFrame, edited: pd.DataFrame, colonnes: list) -> tuple:
+    """Compare une grille éditée à la frame chargée (colonne 'id') sur les `colonnes` éditables.
+
+    Retourne (ajouts, modifications [(avant, après)], suppressions) sous forme de dictionnaires,
+    avec toutes les colonnes des frames (les colonnes masquées, comme categorie_id, comprises).
+    """
+    avant = {int(r['id']): r for r in original.to_dict('records')}
+    ajouts, modifications, vus = [], [], set()
+    for ligne in edited.to_dict('records'):
+        if pd.isna(ligne['id']):
+            ajouts.append(ligne)
+            continue
+        id_ligne = int(ligne['id'])
+        vus.add(id_ligne)
+        if not all(_egal(ligne[c], avant[id_ligne][c]) for c in colonnes):
+            modifications.append((avant[id_ligne], ligne))
+    suppressions = [ligne for id_ligne, ligne in avant.items() if id_ligne not in vus]
+    return ajouts, modifications, suppressions
+
+
+def _appliquer(user_id: int, table: str, ajouts: list, modifications: list, suppressions: list,
+               insert_sql: str, update_sql: str, delete_sql: str, valeurs, insertion) -> int:
+    """Exécute un lot dans une transaction ; une mise à jour ou suppression n'aboutit que si la
+    ligne a encore les valeurs lues `valeurs(avant)` (sinon EditConflict et annulation du lot)"""
+    conn = get_connection()
+    conflits = []
+    with conn:
+        for avant in suppressions:
+            if conn.execute(delete_sql, (avant['id'], user_id, *valeurs(avant))).rowcount != 1:
+                conflits.append(avant['id'])
+        for avant, apres in modifications:
+            if conn.execute(update_sql, (*valeurs(apres), avant['id'], user_id, *valeurs(avant))).rowcount != 1:
+                conflits.append(avant['id'])
+        if conflits:
+            # Sortie du bloc par exception : la transaction est annulée
+            raise EditConflict(conflits)
+        conn.executemany(insert_sql, [(user_id, *insertion(ligne)) for ligne in ajouts])
+    nb = len(ajouts) + len(modifications) + len(suppressions)
+    if nb:
+        invalidate(user_id, table)
+    return nb
+
+
+def _mois_des_lignes(*lots) -> set:
+    """Mois 'YYYY-MM' des dates de dépense d'un lot (pour réévaluer leurs alertes)"""
+    return {str(ligne['date_depense'])[:7] for lot in lots for ligne in lot}
+
+
+def apply_depenses_changes(user_id: int, ajouts: list, modifications: list, suppressions: list) -> int:
+    """Applique un lot d'ajouts, modifications [(avant, après)] et suppressions de dépenses.
+
+    Lignes : dictionnaires avec date_depense, categorie_id, description, montant (et id si lue).
+    Retourne le nombre de lignes écrites ; lève EditConflict si une ligne a changé depuis sa lecture.
+    """
+    def valeurs(ligne):
+        return (to_jour(ligne['date_depense']), int(ligne['categorie_id']),
+                ligne['description'], to_centimes(ligne['montant']))
+
+    nb = _appliquer(
+        user_id, 'depenses', ajouts, modifications, suppressions,
+        "INSERT INTO depenses(user_id, jour, categorie_id, description, montant_centimes) VALUES(?,?,?,?,?);",
+        """
+        UPDATE depenses SET jour=?, categorie_id=?, description=?, montant_centimes=?
+        WHERE id=? AND user_id=? AND jour=? AND categorie_id=? AND description IS ? AND montant_centimes=?;
+        """,
+        """
+        DELETE FROM depenses
+        WHERE id=? AND user_id=? AND jour=? AND categorie_id=? AND description IS ? AND montant_centimes=?;
+        """,
+        valeurs, valeurs
+    )
+    # Seuls les ajouts et les nouvelles valeurs peuvent franchir un seuil
+    for mois in sorted(_mois_des_lignes(ajouts, [apres for _, apres in modifications])):
+        evaluate_alerts(mois, user_ids=[user_id])
+    return nb
+
+
+def apply_revenus_changes(user_id: int, mois: str, ajouts: list, modifications: list, suppressions: list) -> int:
+    """Applique un lot d'ajouts, modifications [(avant, après)] et suppressions de revenus du mois.
+
+    Lignes : dictionnaires avec origine, montant (et id si lue).
+    Retourne le nombre de lignes écrites ; lève EditConflict si une ligne a changé depuis sa lecture.
+    """
+    def valeurs(ligne):
+        return ligne['origine'], to_centimes(ligne['montant'])
+
+    return _appliquer(
+        user_id, 'revenus', ajouts, modifications, suppressions,
+        "INSERT INTO revenus(user_id, origine, montant_centimes, mois) VALUES(?,?,?,?);",
+        "UPDATE revenus SET origine=?, montant_centimes=? WHERE id=? AND user_id=? AND origine=? AND montant_centimes=?;",
+        "DELETE FROM revenus WHERE id=? AND user_id=? AND origine=? AND montant_centimes=?;",
+        valeurs, lambda ligne: (*valeurs(ligne), mois)
+    )
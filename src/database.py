@@ -4,12 +4,157 @@ Adapté pour Streamlit Cloud avec chemins relatifs
 """
 import sqlite3
 import os
+import queue
+import threading
+import time
+import pandas as pd
 import streamlit as st
+from contextlib import contextmanager
 from pathlib import Path
 
 
+# Budget de temps par défaut d'une lecture (s) et seuil de requête lente (s)
+QUERY_TIMEOUT = float(os.getenv("BUDGET_QUERY_TIMEOUT", "5"))
+SLOW_QUERY = float(os.getenv("BUDGET_SLOW_QUERY", "0.5"))
+
+# Nombre d'instructions SQLite entre deux vérifications du budget de temps
+PROGRESS_STEPS = 10_000
+
+
+class QueryTimeout(Exception):
+    """Lecture annulée car elle dépassait son budget de temps"""
+
+
+class QueryStats:
+    """Compteurs globaux du temps passé dans SQLite (toutes sessions confondues)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.seconds = 0.0
+        self.slow = 0
+        self.cancelled = 0
+
+    def record(self, seconds: float, query: bool = False):
+        with self._lock:
+            self.seconds += seconds
+            self.queries += query
+
+    def record_read(self, seconds: float, cancelled: bool = False):
+        """Comptabilise une lecture complète (lente ou annulée)"""
+        with self._lock:
+            self.slow += seconds >= SLOW_QUERY
+            self.cancelled += cancelled
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'queries': self.queries,
+                'seconds': self.seconds,
+                'slow': self.slow,
+                'cancelled': self.cancelled,
+            }
+
+
+QUERY_STATS = QueryStats()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Curseur qui chronomètre l'exécution et la lecture des résultats"""
+
+    def execute(self, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            QUERY_STATS.record(time.perf_counter() - t0, query=True)
+
+    def executemany(self, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            QUERY_STATS.record(time.perf_counter() - t0, query=True)
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            QUERY_STATS.record(time.perf_counter() - t0)
+
+    def fetchmany(self, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            QUERY_STATS.record(time.perf_counter() - t0)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connexion dont les curseurs (y compris ceux de conn.execute et pandas) sont chronométrés"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+class ReadOnlyConnection(TimedConnection):
+    """Connexion en lecture seule dont les requêtes sont interrompues au-delà d'une échéance"""
+
+    deadline = None
+
+    def _over_budget(self) -> int:
+        # Une valeur non nulle demande à SQLite d'interrompre la requête en cours
+        return int(self.deadline is not None and time.monotonic() > self.deadline)
+
+
+def connect_readonly(db_path=None) -> ReadOnlyConnection:
+    """Ouvre une connexion en lecture seule (URI mode=ro, PRAGMA query_only)"""
+    uri = Path(db_path or get_db_path()).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=ReadOnlyConnection)
+    conn.execute("PRAGMA query_only = ON;")
+    conn.set_progress_handler(conn._over_budget, PROGRESS_STEPS)
+    return conn
+
+
+class ReadPool:
+    """Réserve de connexions en lecture seule, partagée par les threads de script"""
+
+    def __init__(self, db_path, size: int = 8):
+        self.db_path = db_path
+        self.size = size
+        self._free = queue.LifoQueue()
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._free.get_nowait()
+        except queue.Empty:
+            conn = connect_readonly(self.db_path)
+        try:
+            yield conn
+        finally:
+            conn.deadline = None
+            if self._free.qsize() < self.size:
+                self._free.put(conn)
+            else:
+                conn.close()
+
+
 def get_db_path():
     """Retourne le chemin de la base de données, adapté pour Streamlit Cloud"""
+    # Chemin explicite via DB_PATH (image Docker, bancs d'essai)
+    if os.getenv("DB_PATH"):
+        db_path = Path(os.environ["DB_PATH"])
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        return db_path
+
     # Pour Streamlit Cloud, utiliser le dossier .streamlit/data
     # En développement local, utiliser data/
     # On détecte Streamlit Cloud en vérifiant si le dossier .streamlit existe
@@ -29,13 +174,258 @@ def get_db_path():
 def get_connection():
     """Créer et retourner une connexion SQLite avec vérification de thread désactivée."""
     db_path = get_db_path()
-    return sqlite3.connect(str(db_path), check_same_thread=False)
+    return sqlite3.connect(str(db_path), check_same_thread=False, factory=TimedConnection)
 
 
 @st.cache_resource
-def init_database():
-    """Initialiser les tables de la base de données si elles n'existent pas (idempotent)."""
-    conn = get_connection()
+def get_read_pool() -> ReadPool:
+    """Réserve de connexions de lecture, distincte de la connexion des écrivains"""
+    return ReadPool(get_db_path())
+
+
+def read_query(sql: str, params=(), budget: float = None, **kwargs) -> pd.DataFrame:
+    """Exécute une lecture sur une connexion en lecture seule, dans un budget de temps.
+
+    Lève QueryTimeout si la requête dépasse `budget` secondes (QUERY_TIMEOUT par défaut).
+    """
+    budget = QUERY_TIMEOUT if budget is None else budget
+    t0 = time.monotonic()
+    with get_read_pool().connection() as conn:
+        conn.deadline = t0 + budget if budget else None
+        try:
+            df = pd.read_sql_query(sql, conn, params=params, **kwargs)
+        except (sqlite3.OperationalError, pd.errors.DatabaseError) as e:
+            if "interrupted" not in str(e):
+                raise
+            QUERY_STATS.record_read(time.monotonic() - t0, cancelled=True)
+            raise QueryTimeout(
+                f"La lecture a été interrompue après {budget:g} s. "
+                "Réduisez la période analysée ou réessayez dans un instant."
+            ) from e
+    QUERY_STATS.record_read(time.monotonic() - t0)
+    return df
+
+
+@contextmanager
+def friendly_timeouts():
+    """Affiche un message au lieu d'une trace si une lecture dépasse son budget"""
+    try:
+        yield
+    except QueryTimeout as e:
+        st.warning(f"⏱️ {e}")
+        st.stop()
+
+
+# Décalage entre date.toordinal() et julianday() de SQLite (minuit)
+JOUR_JULIEN_OFFSET = 1721424.5
+
+# Version du schéma stockée dans PRAGMA user_version
+# (2 : numéros AUTOINCREMENT des dépenses et revenus, jamais redonnés après un archivage)
+SCHEMA_VERSION = 2
+
+# Tables dont les montants sont stockés en centimes entiers (version 1) ; AUTOINCREMENT
+# (version 2) : le numéro d'une ligne archivée, supprimée de SQLite, n'est jamais redonné
+_TABLES = {
+    "revenus": '''CREATE TABLE IF NOT EXISTS {nom} (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER NOT NULL,
+               mois TEXT NOT NULL,
+               origine TEXT NOT NULL,
+               montant_centimes INTEGER NOT NULL,
+               FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+           );''',
+    "budgets": '''CREATE TABLE IF NOT EXISTS {nom} (
+               id INTEGER PRIMARY KEY,
+               user_id INTEGER NOT NULL,
+               mois TEXT NOT NULL,
+               categorie_id INTEGER NOT NULL,
+               budget_centimes INTEGER NOT NULL,
+               UNIQUE(user_id, mois, categorie_id),
+               FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+               FOREIGN KEY(categorie_id) REFERENCES categories(id) ON DELETE CASCADE
+           );''',
+    # 'jour' est le numéro de jour (date.toordinal()), 'mois' en est dérivé
+    "depenses": f'''CREATE TABLE IF NOT EXISTS {{nom}} (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER NOT NULL,
+               jour INTEGER NOT NULL,
+               categorie_id INTEGER NOT NULL,
+               description TEXT,
+               montant_centimes INTEGER NOT NULL,
+               mois TEXT GENERATED ALWAYS AS (strftime('%Y-%m', jour + {JOUR_JULIEN_OFFSET})) VIRTUAL,
+               FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+               FOREIGN KEY(categorie_id) REFERENCES categories(id) ON DELETE SET NULL
+           );''',
+}
+
+# Copie des lignes de l'ancien schéma (montants REAL, dates TEXT)
+_MIGRATIONS = {
+    "revenus": """
+        INSERT INTO revenus_migration(id, user_id, mois, origine, montant_centimes)
+        SELECT id, user_id, mois, origine, CAST(ROUND(montant * 100) AS INTEGER)
+        FROM revenus;
+    """,
+    "budgets": """
+        INSERT INTO budgets_migration(id, user_id, mois, categorie_id, budget_centimes)
+        SELECT id, user_id, mois, categorie_id, CAST(ROUND(budget * 100) AS INTEGER)
+        FROM budgets;
+    """,
+    "depenses": f"""
+        INSERT INTO depenses_migration(id, user_id, jour, categorie_id, description, montant_centimes)
+        SELECT id, user_id,
+               CAST(COALESCE(julianday(date_depense), julianday(mois || '-01')) - {JOUR_JULIEN_OFFSET} AS INTEGER),
+               categorie_id, description, CAST(ROUND(montant * 100) AS INTEGER)
+        FROM depenses;
+    """,
+}
+
+# Colonnes journalisées (src.journal) : état avant/après de chaque ligne modifiée, en JSON
+JOURNAL_COLONNES = {
+    'revenus': ('id', 'user_id', 'mois', 'origine', 'montant_centimes'),
+    'depenses': ('id', 'user_id', 'jour', 'categorie_id', 'description', 'montant_centimes'),
+    'budgets': ('id', 'user_id', 'mois', 'categorie_id', 'budget_centimes'),
+    'categories': ('id', 'user_id', 'nom', 'actif', 'parent_id'),
+}
+
+
+def _etat(ligne: str, colonnes: tuple) -> str:
+    return "json_object(" + ", ".join(f"'{c}', {ligne}.{c}" for c in colonnes) + ")"
+
+
+# Une ligne de journal par ligne écrite, dans la transaction de l'écriture, quel que soit
+# l'écrivain ; journal_pause n'a de ligne que pendant un archivage (déplacement, pas modification)
+_JOURNAL_TRIGGERS = [
+    ddl
+    for table, colonnes in JOURNAL_COLONNES.items()
+    for ddl in (
+        f"""CREATE TRIGGER IF NOT EXISTS trg_journal_{table}_insert AFTER INSERT ON {table}
+            WHEN NOT EXISTS (SELECT 1 FROM journal_pause)
+            BEGIN
+                INSERT INTO journal(user_id, nom_table, op, ligne_id, apres)
+                VALUES (NEW.user_id, '{table}', 'insert', NEW.id, {_etat('NEW', colonnes)});
+            END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_journal_{table}_update AFTER UPDATE ON {table}
+            WHEN NOT EXISTS (SELECT 1 FROM journal_pause) AND {_etat('OLD', colonnes)} IS NOT {_etat('NEW', colonnes)}
+            BEGIN
+                INSERT INTO journal(user_id, nom_table, op, ligne_id, avant, apres)
+                VALUES (NEW.user_id, '{table}', 'update', NEW.id, {_etat('OLD', colonnes)}, {_etat('NEW', colonnes)});
+            END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_journal_{table}_delete AFTER DELETE ON {table}
+            WHEN NOT EXISTS (SELECT 1 FROM journal_pause)
+            BEGIN
+                INSERT INTO journal(user_id, nom_table, op, ligne_id, avant)
+                VALUES (OLD.user_id, '{table}', 'delete', OLD.id, {_etat('OLD', colonnes)});
+            END;""",
+    )
+]
+
+_INDEX = [
+    "CREATE INDEX IF NOT EXISTS idx_revenus_user_mois ON revenus(user_id, mois, id);",
+    "CREATE INDEX IF NOT EXISTS idx_depenses_user_jour ON depenses(user_id, jour, id);",
+    "CREATE INDEX IF NOT EXISTS idx_closure_descendant ON categories_closure(descendant_id, profondeur);",
+    "CREATE INDEX IF NOT EXISTS idx_recurrences_user ON recurrences(user_id, actif);",
+    "CREATE INDEX IF NOT EXISTS idx_regles_categorie_user ON regles_categorie(user_id, actif);",
+    "CREATE INDEX IF NOT EXISTS idx_alertes_user_vue ON alertes(user_id, vue, id);",
+    "CREATE INDEX IF NOT EXISTS idx_journal_user ON journal(user_id, seq);",
+    "CREATE INDEX IF NOT EXISTS idx_versions_donnees_seq ON versions_donnees(seq);",
+]
+
+# Maintien de categories_closure pour tous les écrivains (pages, provisionnement, jeux d'essai)
+_TRIGGERS = [
+    # Nouvelle catégorie : elle-même, puis les ancêtres de son parent un cran plus loin
+    """CREATE TRIGGER IF NOT EXISTS trg_categories_closure_insert AFTER INSERT ON categories
+       BEGIN
+           INSERT INTO categories_closure(ancetre_id, descendant_id, profondeur)
+           SELECT ancetre_id, NEW.id, profondeur + 1 FROM categories_closure WHERE descendant_id = NEW.parent_id
+           UNION ALL
+           SELECT NEW.id, NEW.id, 0;
+       END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_categories_cycle BEFORE UPDATE OF parent_id ON categories
+       WHEN NEW.parent_id IS NOT NULL AND EXISTS (
+           SELECT 1 FROM categories_closure WHERE ancetre_id = NEW.id AND descendant_id = NEW.parent_id
+       )
+       BEGIN
+           SELECT RAISE(ABORT, 'Une catégorie ne peut pas être rangée sous une de ses sous-catégories');
+       END;""",
+    # Déplacement : le sous-arbre perd ses anciens ancêtres et gagne ceux du nouveau parent
+    """CREATE TRIGGER IF NOT EXISTS trg_categories_closure_move AFTER UPDATE OF parent_id ON categories
+       WHEN NEW.parent_id IS NOT OLD.parent_id
+       BEGIN
+           DELETE FROM categories_closure
+           WHERE descendant_id IN (SELECT descendant_id FROM categories_closure WHERE ancetre_id = NEW.id)
+             AND ancetre_id NOT IN (SELECT descendant_id FROM categories_closure WHERE ancetre_id = NEW.id);
+           INSERT INTO categories_closure(ancetre_id, descendant_id, profondeur)
+           SELECT sup.ancetre_id, sub.descendant_id, sup.profondeur + sub.profondeur + 1
+           FROM categories_closure sup, categories_closure sub
+           WHERE sup.descendant_id = NEW.parent_id AND sub.ancetre_id = NEW.id;
+       END;""",
+]
+
+
+# Colonnes recopiées par la migration vers la version 2 (sans les colonnes générées)
+_COLONNES_V2 = {
+    "revenus": "id, user_id, mois, origine, montant_centimes",
+    "depenses": "id, user_id, jour, categorie_id, description, montant_centimes",
+}
+
+
+def _colonnes(conn, table: str) -> set:
+    """Retourne les noms de colonnes d'une table (vide si elle n'existe pas)"""
+    return {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table});")}
+
+
+def migrate_database(conn):
+    """Migre l'ancien schéma (REAL/TEXT) vers les centimes entiers et les numéros de jour, puis
+    les numéros des dépenses et revenus vers AUTOINCREMENT (idempotent)."""
+    if conn.execute("PRAGMA user_version;").fetchone()[0] >= SCHEMA_VERSION:
+        return
+
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        for table, ddl in _TABLES.items():
+            colonnes = _colonnes(conn, table)
+            if not colonnes or "montant_centimes" in colonnes or "budget_centimes" in colonnes:
+                continue
+            # Reconstruction de la table (ALTER TABLE ne sait pas changer le type d'une colonne)
+            conn.executescript(
+                "BEGIN;"
+                + ddl.format(nom=f"{table}_migration")
+                + _MIGRATIONS[table]
+                + f"DROP TABLE {table};"
+                + f"ALTER TABLE {table}_migration RENAME TO {table};"
+                + "COMMIT;"
+            )
+
+        # Version 2 : mêmes lignes, mêmes numéros, table AUTOINCREMENT
+        reconstruites = []
+        for table, colonnes in _COLONNES_V2.items():
+            ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,)).fetchone()
+            if ddl is None or "AUTOINCREMENT" in ddl[0].upper():
+                continue
+            conn.executescript(
+                "BEGIN;"
+                + _TABLES[table].format(nom=f"{table}_migration")
+                + f"INSERT INTO {table}_migration({colonnes}) SELECT {colonnes} FROM {table};"
+                + f"DROP TABLE {table};"
+                + f"ALTER TABLE {table}_migration RENAME TO {table};"
+                + "COMMIT;"
+            )
+            reconstruites.append(table)
+        if reconstruites:
+            # Numéros déjà donnés à des lignes archivées (Parquet) : réservés
+            from .archive import reserve_archived_ids
+            reserve_archived_ids(conn, reconstruites)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON;")
+
+
+def create_schema(conn):
+    """Créer (ou migrer) les tables et index de la base (idempotent)."""
+    migrate_database(conn)
     cur = conn.cursor()
 
     # Activation des clés étrangères
@@ -52,62 +442,229 @@ def init_database():
     )
 
     # Plusieurs revenus par mois et utilisateur
+    cur.execute(_TABLES["revenus"].format(nom="revenus"))
+
+    # Catégories définies par l'utilisateur (suppression douce avec 'actif'),
+    # éventuellement rangées sous une catégorie parente
     cur.execute(
-        '''CREATE TABLE IF NOT EXISTS revenus (
+        '''CREATE TABLE IF NOT EXISTS categories (
                id INTEGER PRIMARY KEY,
+               user_id INTEGER NOT NULL,
+               nom TEXT NOT NULL,
+               actif INTEGER NOT NULL DEFAULT 1,
+               parent_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+               UNIQUE(user_id, nom),
+               FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+           );'''
+    )
+    if "parent_id" not in _colonnes(conn, "categories"):
+        cur.execute("ALTER TABLE categories ADD COLUMN parent_id INTEGER REFERENCES categories(id) ON DELETE SET NULL;")
+
+    # Table de fermeture de la hiérarchie : une ligne par couple (ancêtre, descendant),
+    # la catégorie elle-même comprise (profondeur 0), tenue à jour par les déclencheurs
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS categories_closure (
+               ancetre_id INTEGER NOT NULL,
+               descendant_id INTEGER NOT NULL,
+               profondeur INTEGER NOT NULL,
+               PRIMARY KEY(ancetre_id, descendant_id),
+               FOREIGN KEY(ancetre_id) REFERENCES categories(id) ON DELETE CASCADE,
+               FOREIGN KEY(descendant_id) REFERENCES categories(id) ON DELETE CASCADE
+           );'''
+    )
+    for ddl in _TRIGGERS:
+        cur.execute(ddl)
+    # Bases antérieures à la hiérarchie : fermeture calculée depuis parent_id
+    if cur.execute(
+        "SELECT (SELECT COUNT(*) FROM categories) > (SELECT COUNT(*) FROM categories_closure WHERE profondeur = 0);"
+    ).fetchone()[0]:
+        cur.execute(
+            '''INSERT OR IGNORE INTO categories_closure(ancetre_id, descendant_id, profondeur)
+               WITH RECURSIVE chemin(ancetre_id, descendant_id, profondeur) AS (
+                   SELECT id, id, 0 FROM categories
+                   UNION ALL
+                   SELECT c.parent_id, chemin.descendant_id, chemin.profondeur + 1
+                   FROM chemin JOIN categories c ON c.id = chemin.ancetre_id
+                   WHERE c.parent_id IS NOT NULL
+               )
+               SELECT ancetre_id, descendant_id, profondeur FROM chemin;'''
+        )
+
+    # Budgets par catégorie et mois
+    cur.execute(_TABLES["budgets"].format(nom="budgets"))
+
+    # Dépenses réelles
+    cur.execute(_TABLES["depenses"].format(nom="depenses"))
+
+    # Mois archivés en Parquet (src.archive) et agrégats conservés dans SQLite
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS archives_mois (
                user_id INTEGER NOT NULL,
                mois TEXT NOT NULL,
-               origine TEXT NOT NULL,
-               montant REAL NOT NULL,
+               archive_le TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               PRIMARY KEY(user_id, mois),
+               FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+           );'''
+    )
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS rollup_depenses (
+               user_id INTEGER NOT NULL,
+               mois TEXT NOT NULL,
+               categorie_id INTEGER NOT NULL,
+               total_centimes INTEGER NOT NULL,
+               nb INTEGER NOT NULL,
+               PRIMARY KEY(user_id, mois, categorie_id),
+               FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+           );'''
+    )
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS rollup_revenus (
+               user_id INTEGER NOT NULL,
+               mois TEXT NOT NULL,
+               total_centimes INTEGER NOT NULL,
+               nb INTEGER NOT NULL,
+               PRIMARY KEY(user_id, mois),
                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
            );'''
     )
 
-    # Catégories définies par l'utilisateur (suppression douce avec 'actif')
+    # Règles de récurrence (src.recurrences) et occurrences déjà générées, une par (règle, jour)
     cur.execute(
-        '''CREATE TABLE IF NOT EXISTS categories (
+        '''CREATE TABLE IF NOT EXISTS recurrences (
                id INTEGER PRIMARY KEY,
                user_id INTEGER NOT NULL,
-               nom TEXT NOT NULL,
+               type TEXT NOT NULL CHECK(type IN ('revenu', 'depense')),
+               libelle TEXT NOT NULL,
+               montant_centimes INTEGER NOT NULL,
+               categorie_id INTEGER REFERENCES categories(id) ON DELETE SET NULL,
+               frequence TEXT NOT NULL CHECK(frequence IN ('mois', 'semaine', 'jour')),
+               intervalle INTEGER NOT NULL DEFAULT 1 CHECK(intervalle >= 1),
+               debut INTEGER NOT NULL,
+               fin INTEGER,
                actif INTEGER NOT NULL DEFAULT 1,
-               UNIQUE(user_id, nom),
+               CHECK(type = 'revenu' OR categorie_id IS NOT NULL),
                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
            );'''
     )
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS recurrences_faites (
+               recurrence_id INTEGER NOT NULL,
+               periode INTEGER NOT NULL,
+               PRIMARY KEY(recurrence_id, periode),
+               FOREIGN KEY(recurrence_id) REFERENCES recurrences(id) ON DELETE CASCADE
+           ) WITHOUT ROWID;'''
+    )
 
-    # Budgets par catégorie et mois
+    # Règles de catégorisation automatique des dépenses (src.categorization)
     cur.execute(
-        '''CREATE TABLE IF NOT EXISTS budgets (
+        '''CREATE TABLE IF NOT EXISTS regles_categorie (
                id INTEGER PRIMARY KEY,
                user_id INTEGER NOT NULL,
-               mois TEXT NOT NULL,
+               type TEXT NOT NULL CHECK(type IN ('mot', 'alias', 'regex')),
+               motif TEXT NOT NULL,
                categorie_id INTEGER NOT NULL,
-               budget REAL NOT NULL,
-               UNIQUE(user_id, mois, categorie_id),
+               montant_min_centimes INTEGER,
+               montant_max_centimes INTEGER,
+               priorite INTEGER NOT NULL DEFAULT 0,
+               actif INTEGER NOT NULL DEFAULT 1,
                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
                FOREIGN KEY(categorie_id) REFERENCES categories(id) ON DELETE CASCADE
            );'''
     )
 
-    # Dépenses réelles
+    # Alertes de budget déclenchées (src.alerts), une seule fois par mois, catégorie et règle
     cur.execute(
-        '''CREATE TABLE IF NOT EXISTS depenses (
+        '''CREATE TABLE IF NOT EXISTS alertes (
                id INTEGER PRIMARY KEY,
                user_id INTEGER NOT NULL,
-               date_depense TEXT NOT NULL,
-               categorie_id INTEGER NOT NULL,
-               description TEXT,
-               montant REAL NOT NULL,
                mois TEXT NOT NULL,
+               categorie_id INTEGER NOT NULL,
+               regle TEXT NOT NULL,
+               depense_centimes INTEGER NOT NULL,
+               budget_centimes INTEGER NOT NULL,
+               declenchee_le TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               vue INTEGER NOT NULL DEFAULT 0,
+               UNIQUE(user_id, mois, categorie_id, regle),
                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
-               FOREIGN KEY(categorie_id) REFERENCES categories(id) ON DELETE SET NULL
+               FOREIGN KEY(categorie_id) REFERENCES categories(id) ON DELETE CASCADE
            );'''
     )
 
+    # Versions durables des données par utilisateur et table (clés du cache disque, src.disk_cache) ;
+    # seq, numéro global de la dernière avance, permet aux autres processus de relever les versions
+    # modifiées depuis leur dernier passage (src.coherence)
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS versions_donnees (
+               user_id INTEGER NOT NULL,
+               nom_table TEXT NOT NULL,
+               version INTEGER NOT NULL,
+               seq INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY(user_id, nom_table)
+           ) WITHOUT ROWID;'''
+    )
+    if "seq" not in _colonnes(conn, "versions_donnees"):
+        cur.execute("ALTER TABLE versions_donnees ADD COLUMN seq INTEGER NOT NULL DEFAULT 0;")
+
+    # Paramètres de la base ; 'instance' distingue cette base d'une base remplacée ou restaurée
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS parametres (
+               cle TEXT PRIMARY KEY,
+               valeur TEXT NOT NULL
+           );'''
+    )
+    cur.execute("INSERT OR IGNORE INTO parametres(cle, valeur) VALUES ('instance', lower(hex(randomblob(16))));")
+
+    # Journal des modifications (src.journal) ; AUTOINCREMENT : un numéro purgé n'est jamais réutilisé
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS journal (
+               seq INTEGER PRIMARY KEY AUTOINCREMENT,
+               user_id INTEGER NOT NULL,
+               nom_table TEXT NOT NULL,
+               op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete')),
+               ligne_id INTEGER NOT NULL,
+               avant TEXT,
+               apres TEXT,
+               le TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+           );'''
+    )
+    # Dernière position lue par chaque consommateur du journal
+    cur.execute(
+        '''CREATE TABLE IF NOT EXISTS journal_consommateurs (
+               nom TEXT PRIMARY KEY,
+               seq INTEGER NOT NULL,
+               le TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+           );'''
+    )
+    cur.execute("CREATE TABLE IF NOT EXISTS journal_pause (pause INTEGER);")
+    for ddl in _JOURNAL_TRIGGERS:
+        cur.execute(ddl)
+
+    # Index couvrant les filtres et tris des lecteurs
+    for ddl in _INDEX:
+        cur.execute(ddl)
+
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
     conn.commit()
+
+    # WAL : les lecteurs (connexions en lecture seule) ne bloquent pas les écrivains
+    cur.execute("PRAGMA journal_mode = WAL;")
+
+
+@st.cache_resource
+def init_database():
+    """Initialiser les tables de la base de données si elles n'existent pas (idempotent)."""
+    conn = get_connection()
+    create_schema(conn)
     return conn
 
 
+# Catégories créées pour chaque nouvel utilisateur
+DEFAULT_CATEGORIES = [
+    "Épargne", "Logement", "Alimentation", "Transport",
+    "Électricité", "Internet + Mobile", "Loisirs", "Autres"
+]
+
+
 def get_user_id(username: str) -> int:
     """Récupère ou crée un utilisateur et retourne son ID"""
     conn = get_connection()
@@ -134,13 +691,9 @@ def init_default_categories(user_id: int):
     # Vérifier si l'utilisateur a déjà des catégories
     cur.execute("SELECT COUNT(*) FROM categories WHERE user_id = ?", (user_id,))
     if cur.fetchone()[0] == 0:
-        defaults = [
-            ("Épargne",), ("Logement",), ("Alimentation",), ("Transport",),
-            ("Électricité",), ("Internet + Mobile",), ("Loisirs",), ("Autres",)
-        ]
         cur.executemany(
             "INSERT INTO categories(user_id, nom) VALUES (?, ?);",
-            [(user_id, cat[0]) for cat in defaults]
+            [(user_id, nom) for nom in DEFAULT_CATEGORIES]
         )
         conn.commit()
 
@@ -0,0 +1,214 @@
+"""
+Cache de second niveau sur disque (optionnel : BUDGET_DISK_CACHE=1)
+
+Les résultats des lecteurs (cached_reader) sont aussi sérialisés dans un fichier SQLite
+clé-valeur à côté de la base, sous la clé (fonction, utilisateur, arguments), avec la
+version des tables lues. Les versions deviennent durables et partagées (src.coherence) :
+une entrée n'est servie que si ses versions sont celles de la base, au premier miss comme
+au rechargement du démarrage. Un fichier écrit pour une autre base (jeton
+parametres.instance) est vidé à l'ouverture. La taille est bornée par BUDGET_DISK_CACHE_MB ;
+les entrées les moins récemment lues sont évincées.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from .cache import CACHE, VERSIONS
+from .coherence import enable_cache_coherence
+from .database import get_db_path
+
+
+ENABLED = os.getenv("BUDGET_DISK_CACHE", "0") == "1"
+
+# Taille maximale du fichier de cache (octets sérialisés), en Mo
+MAX_MB = float(os.getenv("BUDGET_DISK_CACHE_MB", "512"))
+
+# Entrées évincées par passe quand le fichier dépasse sa taille
+_LOT_EVICTION = 32
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entrees (
+        cle TEXT PRIMARY KEY,
+        fonction TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        arguments BLOB NOT NULL,
+        versions TEXT NOT NULL,
+        valeur BLOB NOT NULL,
+        octets INTEGER NOT NULL,
+        expire REAL,
+        lu REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_entrees_lu ON entrees(lu);
+    CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur TEXT NOT NULL);
+"""
+
+
+def disk_cache_path() -> Path:
+    """Fichier du cache : BUDGET_DISK_CACHE_PATH, sinon <base>_cache.db à côté de la base"""
+    db_path = get_db_path()
+    return Path(os.getenv("BUDGET_DISK_CACHE_PATH") or db_path.with_name(f"{db_path.stem}_cache.db"))
+
+
+def _cle(name: str, key: tuple) -> str:
+    # Version exclue : la nouvelle version d'un résultat remplace l'ancienne
+    return hashlib.sha1(repr((name,) + key[:3]).encode()).hexdigest()
+
+
+class DiskCache:
+    """Résultats sérialisés (pickle) dans un fichier SQLite, bornés en octets, éviction LRU"""
+
+    def __init__(self, path, max_bytes: int, instance: str):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'ecritures': 0, 'evictions': 0, 'recharges': 0}
+        # Écritures en arrière-plan : la sérialisation ne ralentit pas le rerun qui a calculé
+        self._ecrivain = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-disque")
+        # Le cache se reconstruit : pas de synchronisation disque à chaque écriture
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL;")
+        self._conn.execute("PRAGMA synchronous = OFF;")
+        self._conn.executescript(_SCHEMA)
+        with self._lock:
+            ancienne = self._conn.execute("SELECT valeur FROM meta WHERE cle = 'instance';").fetchone()
+            if ancienne is None or ancienne[0] != instance:
+                self._conn.execute("DELETE FROM entrees;")
+                self._conn.execute("INSERT OR REPLACE INTO meta(cle, valeur) VALUES ('instance', ?);", (instance,))
+            self._octets = self._conn.execute("SELECT COALESCE(SUM(octets), 0) FROM entrees;").fetchone()[0]
+            # Taille réduite depuis le démarrage précédent
+            self._evincer()
+
+    def _evincer(self):
+        """Évince les entrées les moins récemment lues jusqu'à repasser sous la taille maximale"""
+        while self._octets > self.max_bytes:
+            evincees = self._conn.execute(
+                "DELETE FROM entrees WHERE cle IN (SELECT cle FROM entrees ORDER BY lu LIMIT ?) RETURNING octets;",
+                (_LOT_EVICTION,)
+            ).fetchall()
+            self._octets -= sum(o for o, in evincees)
+            self._stats['evictions'] += len(evincees)
+
+    def get(self, name: str, key: tuple) -> tuple:
+        """(trouvé, valeur, durée de vie restante en s) d'une entrée à la version de `key`"""
+        cle, maintenant = _cle(name, key), time.time()
+        with self._lock:
+            ligne = self._conn.execute("SELECT versions, expire FROM entrees WHERE cle = ?;", (cle,)).fetchone()
+            if ligne is None or tuple(json.loads(ligne[0])) != key[3] or (ligne[1] is not None and ligne[1] < maintenant):
+                self._stats['misses'] += 1
+                return False, None, None
+            valeur = self._conn.execute("SELECT valeur FROM entrees WHERE cle = ?;", (cle,)).fetchone()[0]
+            self._conn.execute("UPDATE entrees SET lu = ? WHERE cle = ?;", (maintenant, cle))
+            self._stats['hits'] += 1
+        return True, pickle.loads(valeur), None if ligne[1] is None else ligne[1] - maintenant
+
+    def put(self, name: str, key: tuple, value, ttl: float = None):
+        """Écrit un résultat en arrière-plan"""
+        self._ecrivain.submit(self._ecrire, name, key, value, ttl)
+
+    def _ecrire(self, name: str, key: tuple, value, ttl: float):
+        try:
+            valeur = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            arguments = pickle.dumps(key[1:3], protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if len(valeur) > self.max_bytes:
+            return
+        cle, maintenant = _cle(name, key), time.time()
+        with self._lock:
+            ancienne = self._conn.execute("SELECT octets FROM entrees WHERE cle = ?;", (cle,)).fetchone()
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO entrees(cle, fonction, user_id, arguments, versions, valeur, octets, expire, lu)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+                """,
+                (cle, name, key[0], arguments, json.dumps(list(key[3])), valeur, len(valeur),
+                 maintenant + ttl if ttl else None, maintenant)
+            )
+            self._octets += len(valeur) - (ancienne[0] if ancienne else 0)
+            self._stats['ecritures'] += 1
+            self._evincer()
+
+    def flush(self):
+        """Attend la fin des écritures en cours"""
+        self._ecrivain.submit(lambda: None).result()
+
+    def warm(self, max_bytes: int) -> int:
+        """Recharge en mémoire les entrées à jour les plus récemment lues, dans la limite de
+        `max_bytes` sérialisés ; retourne le nombre d'entrées rechargées"""
+        with self._lock:
+            lignes = self._conn.execute(
+                "SELECT cle, fonction, user_id, arguments, versions, expire, octets FROM entrees ORDER BY lu DESC;"
+            ).fetchall()
+        maintenant, rechargees, octets = time.time(), 0, 0
+        for cle, fonction, user_id, arguments, versions, expire, taille in lignes:
+            policy = CACHE.policy(fonction)
+            if policy is None or (expire is not None and expire < maintenant) or octets + taille > max_bytes:
+                continue
+            versions = tuple(json.loads(versions))
+            if versions != VERSIONS.get(user_id, policy.tables):
+                continue
+            with self._lock:
+                ligne = self._conn.execute("SELECT valeur FROM entrees WHERE cle = ?;", (cle,)).fetchone()
+            if ligne is None:
+                continue
+            args, kwargs = pickle.loads(arguments)
+            CACHE.put(fonction, (user_id, args, kwargs, versions), pickle.loads(ligne[0]),
+                      ttl=None if expire is None else expire - maintenant)
+            rechargees += 1
+            octets += taille
+        with self._lock:
+            self._stats['recharges'] += rechargees
+        return rechargees
+
+    def clear(self, name: str = None):
+        with self._lock:
+            if name is None:
+                self._conn.execute("DELETE FROM entrees;")
+            else:
+                self._conn.execute("DELETE FROM entrees WHERE fonction = ?;", (name,))
+            self._octets = self._conn.execute("SELECT COALESCE(SUM(octets), 0) FROM entrees;").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entrees = self._conn.execute("SELECT COUNT(*) FROM entrees;").fetchone()[0]
+            return {**self._stats, 'entrees': entrees, 'octets': self._octets}
+
+
+_DISQUE = None
+_DISQUE_LOCK = threading.Lock()
+
+
+def enable_disk_cache(warm: bool = True):
+    """Branche le cache disque si BUDGET_DISK_CACHE=1 (une fois par processus) et, avec `warm`,
+    recharge en mémoire l'état chaud du démarrage précédent ; retourne le DiskCache ou None.
+
+    Les scripts qui écrivent en base (cron) l'appellent avec warm=False pour que leurs
+    écritures avancent les versions durables.
+    """
+    global _DISQUE
+    if not ENABLED:
+        return None
+    with _DISQUE_LOCK:
+        if _DISQUE is None:
+            versions = enable_cache_coherence(force=True)
+            disque = DiskCache(disk_cache_path(), int(MAX_MB * 1024 * 1024), versions.instance())
+            CACHE.l2 = disque
+            _DISQUE = disque
+            if warm:
+                disque.warm(CACHE.max_bytes // 2)
+    return _DISQUE
+
+
+def disk_cache_stats() -> pd.DataFrame:
+    """Statistiques du cache disque (une ligne), vide s'il n'est pas branché"""
+    if _DISQUE is None:
+        return pd.DataFrame()
+    return pd.DataFrame([_DISQUE.stats()])
@@ -0,0 +1,196 @@
+"""
+Moteur d'analyse DuckDB embarqué (optionnel)
+
+La base SQLite est attachée en lecture seule à un DuckDB en mémoire, dans le processus,
+et ses tables de faits sont recopiées dans le stockage colonnaire de DuckDB : les
+agrégations sur plusieurs mois (totaux de période, statistiques par catégorie,
+tendances) y sont exécutées en SQL vectorisé et rendues en frames Arrow.
+
+L'extension sqlite de DuckDB ne transmet pas les filtres à SQLite (chaque requête
+sur 'ledger' relit toute la table) : la copie colonnaire est chargée une fois, puis
+seules les lignes de l'utilisateur dont une table a changé (versions de src.cache)
+sont rechargées, via sqlite_query qui laisse SQLite filtrer par son index.
+
+Activé par BUDGET_ANALYTICS_BACKEND=duckdb. Sans le paquet duckdb ou sans l'extension
+sqlite, les lecteurs de src.data_operations restent sur SQLite.
+"""
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from .cache import VERSIONS
+from .database import get_db_path, QueryTimeout, QUERY_STATS, QUERY_TIMEOUT
+
+try:
+    import duckdb
+except ImportError:  # dépendance optionnelle
+    duckdb = None
+
+
+# 'sqlite' (défaut) ou 'duckdb'
+BACKEND = os.getenv("BUDGET_ANALYTICS_BACKEND", "sqlite").lower()
+
+# Nom de l'extension (téléchargée au premier usage) ou chemin d'un fichier
+# .duckdb_extension pour les environnements hors ligne
+SQLITE_EXTENSION = os.getenv("BUDGET_DUCKDB_SQLITE_EXTENSION", "sqlite")
+
+# Colonnes recopiées depuis SQLite, par table
+MIRRORED = {
+    'revenus': "id, user_id, mois, montant_centimes",
+    'depenses': "id, user_id, jour, categorie_id, montant_centimes",
+}
+
+# Numéro de jour (date.toordinal()) vers DATE : le jour 1 est le 0001-01-01
+JOUR_VERS_DATE = "(DATE '0001-01-01' + CAST(jour - 1 AS INTEGER))"
+
+logger = logging.getLogger(__name__)
+
+
+def _litteral(valeur: str) -> str:
+    """Chaîne SQL entre apostrophes (ATTACH et LOAD n'acceptent pas de paramètres)"""
+    return "'" + str(valeur).replace("'", "''") + "'"
+
+
+class DuckDBEngine:
+    """DuckDB en mémoire : base SQLite attachée ('ledger') et copie colonnaire des tables"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = duckdb.connect(":memory:")
+        self._lock = threading.Lock()
+        if os.path.sep in SQLITE_EXTENSION:
+            self._conn.execute(f"LOAD {_litteral(SQLITE_EXTENSION)};")
+        else:
+            self._conn.execute(f"INSTALL {SQLITE_EXTENSION}; LOAD {SQLITE_EXTENSION};")
+        self._conn.execute(f"ATTACH {_litteral(db_path)} AS ledger (TYPE sqlite, READ_ONLY);")
+
+        # Versions relevées avant la copie : une écriture concurrente sera rechargée ensuite
+        self._synced = VERSIONS.snapshot()
+        for table, colonnes in MIRRORED.items():
+            self._conn.execute(f"CREATE TABLE {table} AS SELECT {colonnes} FROM ledger.{table};")
+
+    def _sync(self, user_id: int, tables: tuple):
+        """Recharge les lignes de l'utilisateur pour les tables modifiées depuis la copie"""
+        with self._lock:
+            for table in tables:
+                version = VERSIONS.get(user_id, (table,))[0]
+                if self._synced.get((user_id, table), 0) == version:
+                    continue
+                # sqlite_query exécute la requête dans SQLite, qui filtre par son index
+                source = f"SELECT {MIRRORED[table]} FROM {table} WHERE user_id = {int(user_id)}"
+                cur = self._conn.cursor()
+                try:
+                    cur.execute("BEGIN;")
+                    cur.execute(f"DELETE FROM {table} WHERE user_id = ?;", [user_id])
+                    cur.execute(f"INSERT INTO {table} SELECT * FROM sqlite_query('ledger', {_litteral(source)});")
+                    cur.execute("COMMIT;")
+                except duckdb.Error:
+                    cur.execute("ROLLBACK;")
+                    raise
+                finally:
+                    cur.close()
+                self._synced[(user_id, table)] = version
+
+    def query(self, sql: str, params=(), budget: float = None) -> pd.DataFrame:
+        """Exécute une requête dans un budget de temps et retourne une frame Arrow"""
+        budget = QUERY_TIMEOUT if budget is None else budget
+        # Un curseur par appel : les threads de script ne partagent pas d'état de requête
+        cur = self._conn.cursor()
+        minuteur = threading.Timer(budget, cur.interrupt) if budget else None
+        t0 = time.monotonic()
+        try:
+            if minuteur:
+                minuteur.start()
+            table = cur.execute(sql, list(params)).fetch_arrow_table()
+        except duckdb.InterruptException as e:
+            QUERY_STATS.record(time.monotonic() - t0, query=True)
+            QUERY_STATS.record_read(time.monotonic() - t0, cancelled=True)
+            raise QueryTimeout(
+                f"La lecture a été interrompue après {budget:g} s. "
+                "Réduisez la période analysée ou réessayez dans un instant."
+            ) from e
+        finally:
+            if minuteur:
+                minuteur.cancel()
+            cur.close()
+        QUERY_STATS.record(time.monotonic() - t0, query=True)
+        QUERY_STATS.record_read(time.monotonic() - t0)
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    # -----------------------
+    # Agrégations (mêmes signatures et colonnes que les lecteurs SQLite)
+    # -----------------------
+    def monthly_totals(self, user_id: int, months: list) -> pd.DataFrame:
+        """Totaux des revenus et dépenses pour une liste de mois 'YYYY-MM'"""
+        from .data_operations import bornes_mois
+        self._sync(user_id, ('revenus', 'depenses'))
+        months = sorted(months)
+        debut, _ = bornes_mois(months[0])
+        _, fin = bornes_mois(months[-1])
+        return self.query(
+            f"""
+            WITH m AS (SELECT UNNEST(?::VARCHAR[]) AS mois),
+                 r AS (SELECT mois, SUM(montant_centimes) AS c FROM revenus
+                       WHERE user_id = ? AND mois BETWEEN ? AND ? GROUP BY mois),
+                 d AS (SELECT strftime({JOUR_VERS_DATE}, '%Y-%m') AS mois, SUM(montant_centimes) AS c
+                       FROM depenses
+                       WHERE user_id = ? AND jour BETWEEN ? AND ? GROUP BY 1)
+            SELECT m.mois,
+                   COALESCE(r.c, 0) / 100.0 AS revenus,
+                   COALESCE(d.c, 0) / 100.0 AS depenses
+            FROM m LEFT JOIN r USING (mois) LEFT JOIN d USING (mois)
+            ORDER BY m.mois
+            """,
+            (months, user_id, months[0], months[-1], user_id, debut, fin)
+        )
+
+    def period_totals(self, user_id: int, debut, fin) -> dict:
+        """Total des revenus (mois commençant dans la période) et des dépenses datées dans la période"""
+        self._sync(user_id, ('revenus', 'depenses'))
+        totaux = self.query(
+            """
+            SELECT
+                (SELECT COALESCE(SUM(montant_centimes), 0) FROM revenus
+                 WHERE user_id = ? AND mois || '-01' BETWEEN ? AND ?) / 100.0 AS revenus,
+                (SELECT COALESCE(SUM(montant_centimes), 0) FROM depenses
+                 WHERE user_id = ? AND jour BETWEEN ? AND ?) / 100.0 AS depenses
+            """,
+            (user_id, debut.isoformat(), fin.isoformat(), user_id, debut.toordinal(), fin.toordinal())
+        )
+        return {k: float(v) for k, v in totaux.iloc[0].items()}
+
+    def category_stats(self, user_id: int, debut, fin) -> pd.DataFrame:
+        """Somme, nombre et moyenne des dépenses par categorie_id sur la période"""
+        self._sync(user_id, ('depenses',))
+        return self.query(
+            """
+            SELECT categorie_id,
+                   SUM(montant_centimes) / 100.0 AS total,
+                   COUNT(*) AS nombre,
+                   AVG(montant_centimes) / 100.0 AS moyenne
+            FROM depenses
+            WHERE user_id = ? AND jour BETWEEN ? AND ?
+            GROUP BY categorie_id
+            ORDER BY total DESC
+            """,
+            (user_id, debut.toordinal(), fin.toordinal())
+        )
+
+
+@st.cache_resource
+def get_analytics_engine():
+    """Moteur DuckDB partagé, ou None si le moteur SQLite est choisi ou indisponible"""
+    if BACKEND != "duckdb":
+        return None
+    if duckdb is None:
+        logger.warning("BUDGET_ANALYTICS_BACKEND=duckdb mais duckdb n'est pas installé : repli sur SQLite")
+        return None
+    try:
+        return DuckDBEngine(get_db_path())
+    except duckdb.Error as e:
+        logger.warning("Moteur DuckDB indisponible (%s) : repli sur SQLite", e)
+        return None
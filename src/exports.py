@@ -0,0 +1,185 @@
+"""
+Module d'export Excel en flux, exécuté hors du thread de l'interface
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from openpyxl import Workbook
+
+from .database import connect_readonly
+from .data_operations import ALL_DATA_QUERIES, iter_archived_history, list_categories
+
+
+# Nombre de lignes lues par fetchmany() : borne la mémoire quel que soit l'historique
+CHUNK_SIZE = 5000
+
+# Dossier des classeurs exportés ; un fichier est supprimé à son téléchargement, ou après
+# BUDGET_EXPORT_TTL secondes (session fermée avant) au lancement de l'export suivant
+EXPORT_DIR = Path(os.getenv("BUDGET_EXPORT_DIR") or Path(tempfile.gettempdir()) / "budget_exports")
+EXPORT_TTL = float(os.getenv("BUDGET_EXPORT_TTL", "3600"))
+
+SHEETS = {
+    'revenus': 'Revenus',
+    'depenses': 'Dépenses',
+    'budgets': 'Budgets',
+}
+
+# Résumé mensuel calculé par SQLite (sommes exactes en centimes), mois archivés compris
+MONTHLY_SUMMARY_QUERY = """
+    WITH r AS (SELECT mois, SUM(c) AS rc FROM (
+                   SELECT mois, montant_centimes AS c FROM revenus WHERE user_id=?
+                   UNION ALL SELECT mois, total_centimes FROM rollup_revenus WHERE user_id=?
+               ) GROUP BY mois),
+         d AS (SELECT mois, SUM(c) AS dc, SUM(n) AS nb FROM (
+                   SELECT mois, montant_centimes AS c, 1 AS n FROM depenses WHERE user_id=?
+                   UNION ALL SELECT mois, total_centimes, nb FROM rollup_depenses WHERE user_id=?
+               ) GROUP BY mois),
+         m AS (SELECT mois FROM r UNION SELECT mois FROM d)
+    SELECT m.mois,
+           COALESCE(r.rc, 0) / 100.0 AS revenus,
+           COALESCE(d.dc, 0) / 100.0 AS depenses,
+           (COALESCE(r.rc, 0) - COALESCE(d.dc, 0)) / 100.0 AS solde,
+           COALESCE(d.nb, 0) AS nb_depenses
+    FROM m LEFT JOIN r ON r.mois = m.mois LEFT JOIN d ON d.mois = m.mois
+    ORDER BY m.mois
+"""
+
+
+def write_excel(user_id: int, path: str, progress=None, chunk_size: int = CHUNK_SIZE):
+    """Écrit le classeur Excel d'un utilisateur en mode write-only, par blocs lus depuis SQLite.
+
+    `progress(fraction, message)` est appelé après chaque bloc écrit.
+    """
+    # Connexion en lecture seule dédiée, sans budget de temps (export long assumé)
+    conn = connect_readonly()
+    try:
+        # Nom de catégorie ajouté en fin de ligne depuis la dimension (les requêtes n'en joignent pas)
+        dimension = list_categories(user_id, actives_seulement=False)
+        noms = dict(zip(dimension['id'], dimension['nom']))
+        # Lignes archivées comptées par leurs agrégats (rollup_*), sans lire les fichiers
+        totaux = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id=?", (user_id,)).fetchone()[0]
+            + (conn.execute(f"SELECT COALESCE(SUM(nb), 0) FROM rollup_{table} WHERE user_id=?",
+                            (user_id,)).fetchone()[0] if table != 'budgets' else 0)
+            for table in SHEETS
+        }
+        total = max(sum(totaux.values()), 1)
+        ecrites = 0
+
+        wb = Workbook(write_only=True)
+        for table, titre in SHEETS.items():
+            ws = wb.create_sheet(titre)
+            cur = conn.execute(ALL_DATA_QUERIES[table], (user_id,))
+            entetes = [col[0] for col in cur.description]
+            position = entetes.index('categorie_id') if 'categorie_id' in entetes else None
+            ws.append(entetes if position is None else [*entetes, 'categorie'])
+            # Lignes archivées (Parquet) en tête de leur feuille, lot par lot
+            lots = iter_archived_history(user_id, table, chunk_size) if table != 'budgets' else ()
+            for lot in lots:
+                for ligne in lot.itertuples(index=False, name=None):
+                    ligne = [None if pd.isna(v) else v for v in ligne]
+                    ws.append(ligne if position is None else (*ligne, noms.get(ligne[position])))
+                ecrites += len(lot)
+                if progress:
+                    progress(ecrites / total, f"{titre} : {ecrites} / {total} lignes")
+            while True:
+                lignes = cur.fetchmany(chunk_size)
+                if not lignes:
+                    break
+                for ligne in lignes:
+                    ws.append(ligne if position is None else (*ligne, noms.get(ligne[position])))
+                ecrites += len(lignes)
+                if progress:
+                    progress(ecrites / total, f"{titre} : {ecrites} / {total} lignes")
+
+        ws = wb.create_sheet('Résumé mensuel')
+        cur = conn.execute(MONTHLY_SUMMARY_QUERY, (user_id,) * 4)
+        ws.append([col[0] for col in cur.description])
+        for ligne in cur:
+            ws.append(ligne)
+
+        wb.save(path)
+        if progress:
+            progress(1.0, "Export terminé")
+    finally:
+        conn.close()
+
+
+class ExportJob:
+    """Export Excel en arrière-plan avec suivi de progression"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.progress = 0.0
+        self.message = "En attente..."
+        self.error = None
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix=f"budget_{user_id}_", suffix=".xlsx", dir=EXPORT_DIR)
+        os.close(fd)
+        self._data = None
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            write_excel(self.user_id, self.path, progress=self._update)
+        except Exception as e:
+            self.error = e
+            self.message = f"Erreur : {e}"
+            self.cleanup()
+        finally:
+            self._done.set()
+
+    def _update(self, fraction: float, message: str):
+        self.progress = fraction
+        self.message = message
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def read(self) -> bytes:
+        """Contenu du classeur une fois l'export terminé ; le fichier est supprimé à la première lecture"""
+        if self._data is None:
+            with open(self.path, 'rb') as f:
+                self._data = f.read()
+            self.cleanup()
+        return self._data
+
+    def cleanup(self):
+        """Supprime le fichier temporaire"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@st.cache_resource
+def _executor():
+    """Pool de threads partagé par les sessions pour les exports"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+
+
+def _purger_exports():
+    """Supprime les classeurs de plus de EXPORT_TTL secondes (sessions fermées avant le téléchargement)"""
+    limite = time.time() - EXPORT_TTL
+    for chemin in EXPORT_DIR.glob("budget_*.xlsx"):
+        try:
+            if chemin.stat().st_mtime < limite:
+                chemin.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def start_excel_export(user_id: int) -> ExportJob:
+    """Lance un export Excel en arrière-plan et retourne la tâche à suivre"""
+    _purger_exports()
+    job = ExportJob(user_id)
+    _executor().submit(job.run)
+    return job
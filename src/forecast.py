@@ -0,0 +1,182 @@
+"""
+Prévision des dépenses par catégorie et au total
+
+L'historique mensuel (mois clos, archives comprises) est mis en matrice lignes × mois,
+une ligne par catégorie plus une pour le total. Deux méthodes sont ajustées sur toutes
+les lignes à la fois, sans boucle par catégorie :
+- saisonnière naïve : le même mois un an plus tôt ;
+- lissage exponentiel simple, α choisi par ligne sur une grille (erreur de prévision à un pas).
+Chaque ligne garde la méthode, ou la moyenne des deux, à la plus faible erreur absolue
+moyenne. Les bandes viennent de l'écart-type des erreurs à un pas, élargi avec l'horizon.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .cache import cached_reader
+from .database import read_query
+from .data_operations import avec_noms, bornes_mois
+
+
+# Mois clos utilisés pour l'ajustement (5 ans)
+HISTORIQUE_MOIS = 60
+
+SAISON = 12
+
+# Grille des constantes de lissage essayées pour chaque ligne
+ALPHAS = np.linspace(0.05, 0.95, 19)
+
+# Bande à 80 % (quantile 0,9 de la loi normale)
+Z_BANDE = 1.2816
+
+METHODES = np.array(['lissage', 'saisonnière', 'moyenne'])
+
+
+def _decaler(mois: str, n: int) -> str:
+    index = int(mois[:4]) * 12 + int(mois[5:7]) - 1 + n
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+# -----------------------
+# Ajustement vectorisé
+# -----------------------
+def _poids_lissage(alphas: np.ndarray, t: int) -> np.ndarray:
+    """Poids (A × T × T) du niveau lissé : niveau[a, i] = somme_k W[a, i, k] * y[k], niveau initial y[0]"""
+    i = np.arange(t)[:, None]
+    k = np.arange(t)[None, :]
+    a = alphas[:, None, None]
+    poids = a * (1 - a) ** np.maximum(i - k, 0)
+    poids[:, :, 0] = (1 - a[:, :, 0]) ** np.arange(t)
+    return np.where(k <= i, poids, 0.0)
+
+
+def fit_forecast(historique: np.ndarray, horizon: int) -> dict:
+    """Prévisions des `horizon` mois suivant un historique (lignes × mois, mois clos).
+
+    Retourne les matrices lignes × horizon 'prevision', 'basse', 'haute' et, par ligne,
+    'methode' et 'alpha'.
+    """
+    y = np.asarray(historique, dtype=float)
+    n, t = y.shape
+    h = np.arange(1, horizon + 1)
+    if t == 0:
+        vide = np.zeros((n, horizon))
+        return {'prevision': vide, 'basse': vide, 'haute': vide,
+                'methode': np.full(n, METHODES[0]), 'alpha': np.full(n, np.nan)}
+
+    # Niveaux lissés de toutes les lignes pour toutes les valeurs de α : A × N × T
+    niveaux = np.einsum('aik,nk->ani', _poids_lissage(ALPHAS, t), y)
+    erreurs = y[None, :, 1:] - niveaux[:, :, :-1]
+    meilleur = np.argmin(np.square(erreurs).sum(axis=2), axis=0)
+    lignes = np.arange(n)
+    alpha = ALPHAS[meilleur]
+    niveau = niveaux[meilleur, lignes, -1]
+    erreurs_lissage = erreurs[meilleur, lignes]
+
+    prevision_lissage = np.repeat(niveau[:, None], horizon, axis=1)
+    ecart_lissage = np.sqrt(1 + (h - 1) * alpha[:, None] ** 2)
+
+    if t <= SAISON:
+        sigma = np.sqrt(np.square(erreurs_lissage).mean(axis=1)) if t > 1 else np.zeros(n)
+        prevision, ecart = prevision_lissage, sigma[:, None] * ecart_lissage
+        methode = np.zeros(n, dtype=int)
+    else:
+        # Erreurs à un pas des trois candidats sur la fenêtre commune (mois SAISON..t-1)
+        naif = y[:, SAISON:] - y[:, :-SAISON]
+        lisse = erreurs_lissage[:, SAISON - 1:]
+        moyen = (naif + lisse) / 2
+        candidats = np.stack([lisse, naif, moyen])
+        methode = np.argmin(np.abs(candidats).mean(axis=2), axis=0)
+        sigma = np.sqrt(np.square(candidats[methode, lignes]).mean(axis=1))
+
+        prevision_naive = y[:, t - SAISON + (h - 1) % SAISON]
+        ecart_naif = np.sqrt((h - 1) // SAISON + 1) * np.ones((n, 1))
+        prevision = np.choose(methode[:, None], [
+            prevision_lissage, prevision_naive, (prevision_lissage + prevision_naive) / 2
+        ])
+        ecart = sigma[:, None] * np.choose(methode[:, None], [ecart_lissage, ecart_naif, ecart_lissage])
+
+    prevision = np.maximum(prevision, 0)
+    return {
+        'prevision': prevision,
+        'basse': np.maximum(prevision - Z_BANDE * ecart, 0),
+        'haute': prevision + Z_BANDE * ecart,
+        'methode': METHODES[methode],
+        'alpha': alpha,
+    }
+
+
+# -----------------------
+# Lecture et mise en forme
+# -----------------------
+@cached_reader(tables=('depenses',), max_entries=2000, ttl=3600, max_mb=16)
+def _depenses_mensuelles(user_id: int, premier: str, dernier: str) -> pd.DataFrame:
+    """Dépenses par mois et catégorie (centimes), mois archivés compris"""
+    debut, _ = bornes_mois(premier)
+    _, fin = bornes_mois(dernier)
+    return read_query(
+        """
+        SELECT mois, categorie_id, SUM(c) AS centimes FROM (
+            SELECT mois, categorie_id, montant_centimes AS c FROM depenses
+            WHERE user_id = ? AND jour BETWEEN ? AND ?
+            UNION ALL
+            SELECT mois, categorie_id, total_centimes FROM rollup_depenses
+            WHERE user_id = ? AND mois BETWEEN ? AND ?
+        ) GROUP BY 1, 2
+        """,
+        (user_id, debut, fin, user_id, premier, dernier)
+    )
+
+
+@cached_reader(tables=('depenses',), max_entries=2000, ttl=3600, max_mb=16)
+def _prevision(user_id: int, mois_courant: str, horizon: int) -> dict:
+    """Prévisions par catégorie et au total du mois courant et des horizon - 1 suivants"""
+    mois_clos = [_decaler(mois_courant, i) for i in range(-HISTORIQUE_MOIS, 0)]
+    futurs = [_decaler(mois_courant, i) for i in range(horizon)]
+    lignes = _depenses_mensuelles(user_id, mois_clos[0], mois_courant)
+    matrice = lignes.pivot_table(index='categorie_id', columns='mois', values='centimes', aggfunc='sum')
+    en_cours = matrice.get(mois_courant, pd.Series(0.0, index=matrice.index)).fillna(0) / 100
+    matrice = matrice.reindex(columns=mois_clos).fillna(0) / 100
+
+    # Les mois antérieurs au premier mois de dépense ne sont pas des zéros observés
+    observes = matrice.sum(axis=0).to_numpy().nonzero()[0]
+    matrice = matrice.iloc[:, observes[0]:] if len(observes) else matrice.iloc[:, :0]
+
+    y = np.vstack([matrice.to_numpy(), matrice.to_numpy().sum(axis=0, keepdims=True)])
+    fit = fit_forecast(y, horizon)
+    # Le mois courant ne peut pas finir sous ce qui est déjà dépensé
+    deja = np.append(en_cours.to_numpy(), en_cours.sum())
+    for cle in ('prevision', 'basse', 'haute'):
+        fit[cle][:, 0] = np.maximum(fit[cle][:, 0], deja)
+
+    def longue(sl) -> pd.DataFrame:
+        nb = len(y[sl])
+        return pd.DataFrame({
+            'mois': np.tile(futurs, nb),
+            'prevision': fit['prevision'][sl].ravel(),
+            'basse': fit['basse'][sl].ravel(),
+            'haute': fit['haute'][sl].ravel(),
+        })
+
+    categories = longue(slice(0, -1))
+    categories.insert(0, 'categorie_id', np.repeat(matrice.index.to_numpy(), horizon))
+    categories['methode'] = np.repeat(fit['methode'][:-1], horizon)
+    categories['depense_a_date'] = np.where(categories['mois'] == mois_courant,
+                                            np.repeat(deja[:-1], horizon), np.nan)
+    total = longue(slice(-1, None))
+    total['depense_a_date'] = np.where(total['mois'] == mois_courant, deja[-1], np.nan)
+    return {'categories': categories, 'total': total, 'mois_historique': matrice.shape[1]}
+
+
+def forecast_spending(user_id: int, horizon: int = 3, today: date = None) -> dict:
+    """Prévisions du mois en cours (fin de mois) et des horizon - 1 mois suivants.
+
+    'categories' : une ligne par catégorie et par mois (prevision, basse, haute, methode,
+    depense_a_date pour le mois en cours) ; 'total' : idem pour l'ensemble des dépenses ;
+    'mois_historique' : nombre de mois clos utilisés.
+    """
+    mois_courant = (today or date.today()).strftime('%Y-%m')
+    resultat = _prevision(user_id, mois_courant, int(horizon))
+    resultat['categories'] = avec_noms(user_id, resultat['categories'], position=1)
+    return resultat
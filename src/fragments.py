@@ -0,0 +1,17 @@
+"""
+Réexécution des fragments de page (st.fragment)
+"""
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+
+def rerun_fragment():
+    """Réexécute le fragment courant seul, ou toute la page hors rerun de fragment.
+
+    scope="fragment" n'est accepté que pendant un rerun du fragment ; une exécution
+    complète du script (premier affichage, AppTest) retombe sur un rerun de page.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
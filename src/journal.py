@@ -0,0 +1,139 @@
+"""
+Journal des modifications de revenus, depenses, budgets et categories
+
+Des déclencheurs SQLite ajoutent une ligne par ligne écrite (numéro de séquence, utilisateur,
+table, opération, id, état avant et après en JSON) dans la transaction même de l'écriture,
+quel que soit l'écrivain : pages, générateur de récurrences, provisionnement, scripts.
+Un consommateur (cumuls, index de recherche, export, synchronisation externe) part d'une
+copie des tables et de last_sequence(), lit ensuite les changements postérieurs à sa
+position avec changes_since et l'enregistre avec acknowledge.
+
+compact_journal supprime ce que tous les consommateurs enregistrés ont lu et ce qui dépasse
+la durée de rétention. Une position antérieure à la partie purgée lève JournalTruncated :
+le consommateur doit repartir d'une copie. Les changements non purgés ne sont jamais
+fusionnés : un consommateur peut les avoir lus sans avoir encore enregistré sa position,
+ou être parti d'une copie sans être encore enregistré.
+"""
+import json
+import os
+
+import pandas as pd
+
+from .database import JOURNAL_COLONNES, get_connection, read_query
+
+
+# Durée de conservation du journal, même non lu (consommateur abandonné), en jours
+RETENTION_DAYS = int(os.getenv("BUDGET_JOURNAL_RETENTION_DAYS", "90"))
+
+# Changements rendus au plus par appel de changes_since
+CHANGES_LIMIT = 10_000
+
+TABLES = tuple(JOURNAL_COLONNES)
+
+
+class JournalTruncated(Exception):
+    """Position antérieure à la partie purgée du journal : repartir d'une copie des tables"""
+
+
+def _purge(conn) -> int:
+    """Plus grand numéro de séquence supprimé par une purge (0 si aucune)"""
+    ligne = conn.execute("SELECT valeur FROM parametres WHERE cle = 'journal_purge';").fetchone()
+    return int(ligne[0]) if ligne else 0
+
+
+def last_sequence(conn=None) -> int:
+    """Dernier numéro de séquence attribué (0 si le journal n'a jamais rien reçu)"""
+    conn = conn or get_connection()
+    ligne = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'journal';").fetchone()
+    return ligne[0] if ligne else 0
+
+
+def changes_since(seq: int, user_id: int = None, tables: tuple = None, limit: int = CHANGES_LIMIT) -> pd.DataFrame:
+    """Changements de numéro > `seq`, dans l'ordre, au plus `limit` ; filtrables par utilisateur
+    et par table. Colonnes : seq, user_id, nom_table, op, ligne_id, avant, apres (dict ou None), le.
+
+    Lire par lots : rappeler avec le dernier seq rendu tant que le lot est plein.
+    """
+    # Positions lues dans un DataFrame (numpy.int64) : sqlite3 les lierait en BLOB
+    seq, purge = int(seq), _purge(get_connection())
+    if seq < purge:
+        raise JournalTruncated(f"Changements purgés jusqu'au numéro {purge} (position {seq})")
+    filtres, params = ["seq > ?"], [seq]
+    if user_id is not None:
+        filtres.append("user_id = ?")
+        params.append(int(user_id))
+    if tables is not None:
+        filtres.append(f"nom_table IN ({','.join('?' * len(tables))})")
+        params.extend(tables)
+    changements = read_query(
+        f"""
+        SELECT seq, user_id, nom_table, op, ligne_id, avant, apres, le FROM journal
+        WHERE {' AND '.join(filtres)}
+        ORDER BY seq LIMIT ?
+        """,
+        (*params, limit)
+    )
+    for colonne in ('avant', 'apres'):
+        changements[colonne] = [json.loads(v) if isinstance(v, str) else None for v in changements[colonne]]
+    return changements
+
+
+def acknowledge(consommateur: str, seq: int):
+    """Enregistre la position d'un consommateur : tout ce qui la précède peut être purgé"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO journal_consommateurs(nom, seq) VALUES (?, ?)
+            ON CONFLICT(nom) DO UPDATE SET seq = MAX(seq, excluded.seq), le = CURRENT_TIMESTAMP;
+            """,
+            (consommateur, int(seq))
+        )
+
+
+def forget_consumer(consommateur: str):
+    """Retire un consommateur : il ne retient plus la purge"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM journal_consommateurs WHERE nom = ?;", (consommateur,))
+
+
+def list_consumers() -> pd.DataFrame:
+    """Consommateurs enregistrés, leur position et leur retard"""
+    return read_query(
+        """
+        SELECT c.nom, c.seq, c.le,
+               (SELECT COUNT(*) FROM journal j WHERE j.seq > c.seq) AS en_attente
+        FROM journal_consommateurs c ORDER BY c.nom
+        """
+    )
+
+
+def compact_journal(retention_days: int = RETENTION_DAYS, conn=None) -> dict:
+    """Purge le journal en une transaction ; retourne le nombre de lignes supprimées par
+    étape ('lues', 'expirees')"""
+    conn = conn or get_connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        nb_consommateurs, lu_par_tous = conn.execute(
+            "SELECT COUNT(*), MIN(seq) FROM journal_consommateurs;"
+        ).fetchone()
+        purge = _purge(conn)
+
+        # 1. Changements lus par tous les consommateurs enregistrés
+        lues = 0
+        if nb_consommateurs:
+            lues = conn.execute("DELETE FROM journal WHERE seq <= ?;", (lu_par_tous,)).rowcount
+            purge = max(purge, lu_par_tous)
+
+        # 2. Rétention : au-delà, un consommateur en retard devra repartir d'une copie
+        expirees = conn.execute(
+            "DELETE FROM journal WHERE le < datetime('now', ?) RETURNING seq;", (f"-{int(retention_days)} days",)
+        ).fetchall()
+        if expirees:
+            purge = max(purge, max(s for s, in expirees))
+
+        conn.execute(
+            "INSERT OR REPLACE INTO parametres(cle, valeur) VALUES ('journal_purge', ?);", (str(purge),)
+        )
+    return {'lues': lues, 'expirees': len(expirees)}
@@ -0,0 +1,176 @@
+"""
+Profilage à la demande des reruns (administrateurs)
+
+Activé par le paramètre d'URL ?profile=1 (?profile=0 pour l'arrêter) ou pour toutes les
+sessions administrateur par BUDGET_PROFILING=1. Chaque rerun d'une page est exécuté sous
+cProfile ; les pstats sont conservés sur disque avec la page, l'utilisateur et la durée
+(BUDGET_PROFILES_MAX derniers), puis consultés sur la page Administration : fonctions
+les plus coûteuses et pile repliée (flamegraph.pl, speedscope).
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from .auth import is_admin
+from .database import get_db_path
+
+
+PROFILING_ENV = os.getenv("BUDGET_PROFILING", "").lower() in ("1", "true", "oui")
+
+# Nombre de profils conservés (les plus anciens sont supprimés)
+PROFILES_MAX = int(os.getenv("BUDGET_PROFILES_MAX", "50"))
+
+# Branches de moins d'une microseconde omises de la pile repliée
+SEUIL_PILE_US = 1
+
+_local = threading.local()
+
+
+def profiles_dir() -> Path:
+    """Dossier des profils : BUDGET_PROFILES_DIR, sinon 'profiles' à côté de la base"""
+    dossier = Path(os.getenv("BUDGET_PROFILES_DIR") or get_db_path().parent / "profiles")
+    dossier.mkdir(parents=True, exist_ok=True)
+    return dossier
+
+
+def profiling_enabled() -> bool:
+    """Profilage demandé pour la session courante (administrateurs uniquement)"""
+    username = st.session_state.get('username')
+    if not username or not is_admin(username):
+        return False
+    parametre = st.query_params.get('profile')
+    if parametre is not None:
+        # Mémorisé pour la session : le paramètre d'URL ne suit pas la navigation entre pages
+        st.session_state['profilage'] = parametre.lower() not in ("0", "false", "non")
+    return st.session_state.get('profilage', PROFILING_ENV)
+
+
+def profile_page(script: str):
+    """À appeler en tête de page avec __file__ : si le profilage est actif, exécute la page
+    sous cProfile, enregistre le profil, puis arrête l'exécution non profilée."""
+    if getattr(_local, 'actif', False) or not profiling_enabled():
+        return
+    chemin = Path(script)
+    code = compile(chemin.read_bytes(), str(chemin), 'exec')
+    profiler = cProfile.Profile()
+    _local.actif = True
+    t0 = time.perf_counter()
+    try:
+        profiler.enable()
+        exec(code, {'__name__': '__main__', '__file__': str(chemin)})
+    finally:
+        # st.stop() et st.rerun() lèvent des exceptions : le rerun est tout de même enregistré
+        profiler.disable()
+        _local.actif = False
+        save_profile(profiler, chemin, st.session_state.get('username'), time.perf_counter() - t0)
+    st.stop()
+
+
+def save_profile(profiler: cProfile.Profile, script: Path, username: str, duree: float) -> str:
+    """Enregistre les pstats d'un rerun et ne garde que les PROFILES_MAX plus récents"""
+    dossier = profiles_dir()
+    maintenant = time.time()
+    profil_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(maintenant)) + f"-{int(maintenant * 1e6) % 1_000_000:06d}"
+    profiler.dump_stats(dossier / f"{profil_id}.pstats")
+    with open(dossier / f"{profil_id}.json", "w", encoding="utf-8") as f:
+        json.dump({'page': script.stem, 'script': str(script), 'utilisateur': username,
+                   'duree': duree, 'horodatage': maintenant}, f)
+
+    for ancien in sorted(dossier.glob("*.json"))[:-PROFILES_MAX]:
+        ancien.with_suffix(".pstats").unlink(missing_ok=True)
+        ancien.unlink(missing_ok=True)
+    return profil_id
+
+
+def list_profiles() -> pd.DataFrame:
+    """Profils enregistrés, du plus récent au plus ancien"""
+    lignes = []
+    for meta in sorted(profiles_dir().glob("*.json"), reverse=True):
+        try:
+            with open(meta, encoding="utf-8") as f:
+                infos = json.load(f)
+        except (OSError, ValueError):
+            continue
+        lignes.append({
+            'id': meta.stem,
+            'Date': pd.Timestamp(infos['horodatage'], unit='s', tz='UTC').tz_convert(None),
+            'Page': infos['page'],
+            'Utilisateur': infos['utilisateur'],
+            'Durée (ms)': infos['duree'] * 1000,
+        })
+    return pd.DataFrame(lignes, columns=['id', 'Date', 'Page', 'Utilisateur', 'Durée (ms)'])
+
+
+def profile_path(profil_id: str) -> Path:
+    """Fichier pstats d'un profil (chargeable par pstats, snakeviz...)"""
+    return profiles_dir() / f"{Path(profil_id).name}.pstats"
+
+
+def _nom(fonction: tuple) -> str:
+    """'fonction (fichier:ligne)' ; les fonctions natives n'ont ni fichier ni ligne"""
+    fichier, ligne, nom = fonction
+    if fichier == '~':
+        return nom
+    return f"{nom} ({Path(fichier).name}:{ligne})"
+
+
+def top_functions(profil_id: str, tri: str = 'cumulative', n: int = 30) -> pd.DataFrame:
+    """Fonctions les plus coûteuses d'un profil, triées par temps cumulé ou propre"""
+    stats = pstats.Stats(str(profile_path(profil_id))).stats
+    lignes = [
+        {
+            'Fonction': _nom(fonction),
+            'Appels': nc,
+            'Temps propre (ms)': tt * 1000,
+            'Temps cumulé (ms)': ct * 1000,
+            'Par appel (ms)': ct * 1000 / nc if nc else 0.0,
+        }
+        for fonction, (cc, nc, tt, ct, callers) in stats.items()
+    ]
+    colonne = 'Temps propre (ms)' if tri == 'tottime' else 'Temps cumulé (ms)'
+    return pd.DataFrame(lignes).sort_values(colonne, ascending=False).head(n).reset_index(drop=True)
+
+
+def collapsed_stacks(profil_id: str) -> str:
+    """Pile repliée ('a;b;c microsecondes' par ligne) pour flamegraph.pl ou speedscope.
+
+    cProfile ne garde que les arcs appelant -> appelé : le temps d'une fonction appelée
+    par plusieurs chemins est réparti au prorata du temps cumulé de chaque arc.
+    """
+    stats = pstats.Stats(str(profile_path(profil_id))).stats
+    enfants = defaultdict(list)
+    for fonction, (cc, nc, tt, ct, callers) in stats.items():
+        for appelant, arc in callers.items():
+            enfants[appelant].append((fonction, arc))
+    # Racine : le module de la page exécuté par profile_page (exec est aussi appelé par les
+    # imports, il n'y a donc pas de fonction sans appelant)
+    with open(profiles_dir() / f"{Path(profil_id).name}.json", encoding="utf-8") as f:
+        script = json.load(f)['script']
+    racines = [f for f in stats if f[0] == script and f[2] == '<module>']
+
+    piles = defaultdict(float)
+    # Parcours en profondeur explicite : les piles Streamlit dépassent la limite de récursion
+    a_visiter = [(racine, (racine,), stats[racine][3], stats[racine][2]) for racine in racines]
+    while a_visiter:
+        fonction, chemin, ct_alloue, tt_alloue = a_visiter.pop()
+        piles[chemin] += tt_alloue
+        ct_total = stats[fonction][3]
+        echelle = ct_alloue / ct_total if ct_total else 0.0
+        for enfant, (cc, nc, tt, ct) in enfants[fonction]:
+            if enfant in chemin or ct * echelle * 1e6 < SEUIL_PILE_US:
+                continue
+            a_visiter.append((enfant, chemin + (enfant,), ct * echelle, tt * echelle))
+
+    return "\n".join(
+        ";".join(_nom(f).replace(";", ",") for f in chemin) + f" {round(secondes * 1e6)}"
+        for chemin, secondes in sorted(piles.items())
+        if round(secondes * 1e6) > 0
+    ) + "\n"
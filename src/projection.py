@@ -0,0 +1,177 @@
+"""
+Projection Monte-Carlo de l'épargne cumulée (revenus moins dépenses)
+
+Les mois à venir sont tirés par bootstrap circulaire par blocs dans l'historique mensuel
+(mois clos, archives comprises) : chaque mois simulé reprend un mois passé entier, revenus
+et dépenses de toutes les catégories ensemble, ce qui conserve leurs corrélations (prime,
+vacances), et les blocs de BLOC mois consécutifs gardent les mois chargés qui se suivent.
+Toutes les trajectoires forment un seul tableau NumPy trajectoires × mois, sans boucle
+Python par trajectoire. Les dépenses par catégorie sur l'horizon viennent du nombre de
+tirages de chaque mois passé par trajectoire (produit matriciel), sans tableau
+catégories × trajectoires × mois.
+
+Le résultat (quantiles) est en cache sous la version des données ; le solde de départ
+n'est ajouté qu'ensuite et ne change pas la clé.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .cache import cached_reader
+from .database import read_query
+from .data_operations import avec_noms, bornes_mois
+
+
+# Mois clos tirés pour la simulation (3 ans)
+HISTORIQUE_MOIS = 36
+
+# En dessous, l'historique ne représente pas assez de situations
+MIN_MOIS = 3
+
+# Longueur des blocs de mois consécutifs tirés ensemble
+BLOC = 3
+
+NB_TRAJECTOIRES = 20_000
+
+# Quantiles conservés (en %) : bandes et probabilités calculées à partir d'eux
+QUANTILES = np.arange(101)
+
+# Bandes affichées : 50 % et 90 %
+BANDES = {'p5': 5, 'p25': 25, 'p50': 50, 'p75': 75, 'p95': 95}
+
+
+# -----------------------
+# Simulation vectorisée
+# -----------------------
+def _quantiles(valeurs: np.ndarray, q) -> np.ndarray:
+    """Quantiles `q` (en %) de chaque colonne, interpolés comme np.percentile, en un seul tri
+    (np.percentile repartitionne les colonnes pour chaque quantile)"""
+    tri = np.sort(valeurs, axis=0)
+    position = np.asarray(q, dtype=float) / 100 * (len(tri) - 1)
+    bas = np.floor(position).astype(int)
+    haut = np.minimum(bas + 1, len(tri) - 1)
+    poids = (position - bas).reshape(-1, *[1] * (tri.ndim - 1))
+    return tri[bas] * (1 - poids) + tri[haut] * poids
+
+
+def simulate_savings(revenus: np.ndarray, depenses: np.ndarray, horizon: int,
+                     nb_trajectoires: int = NB_TRAJECTOIRES, bloc: int = BLOC, seed: int = 0) -> dict:
+    """Simule `nb_trajectoires` trajectoires de `horizon` mois à partir des revenus (T,) et des
+    dépenses par catégorie (catégories × T) de T mois passés, en euros.
+
+    Retourne les quantiles QUANTILES (101 × horizon) de l'épargne cumulée ('cumul') et du
+    solde de chaque mois ('solde'), et ceux (10, 50, 90) des dépenses de chaque catégorie
+    ('categories', catégories × 3) et des revenus ('revenus', 3) sur tout l'horizon.
+    """
+    revenus = np.asarray(revenus, dtype=float)
+    depenses = np.asarray(depenses, dtype=float).reshape(-1, len(revenus))
+    t, n = len(revenus), nb_trajectoires
+    bloc = max(1, min(bloc, t))
+    rng = np.random.default_rng(seed)
+
+    # Mois passé repris par chaque mois simulé : N × horizon, blocs consécutifs (circulaires)
+    debuts = rng.integers(0, t, size=(n, -(-horizon // bloc)))
+    tires = ((debuts[:, :, None] + np.arange(bloc)) % t).reshape(n, -1)[:, :horizon]
+
+    solde = (revenus - depenses.sum(axis=0))[tires]
+    cumul = np.cumsum(solde, axis=1)
+
+    # Tirages de chaque mois passé par trajectoire (N × T), puis totaux sur l'horizon
+    tirages = np.bincount((np.arange(n)[:, None] * t + tires).ravel(), minlength=n * t).reshape(n, t).astype(float)
+    return {
+        'cumul': _quantiles(cumul, QUANTILES),
+        'solde': _quantiles(solde, QUANTILES),
+        'categories': _quantiles(tirages @ depenses.T, [10, 50, 90]).T,
+        'revenus': _quantiles(tirages @ revenus, [10, 50, 90]),
+    }
+
+
+# -----------------------
+# Lecture et mise en forme
+# -----------------------
+@cached_reader(tables=('depenses', 'revenus'), max_entries=500, ttl=3600, max_mb=8)
+def _flux_mensuels(user_id: int, premier: str, dernier: str) -> pd.DataFrame:
+    """Revenus et dépenses par catégorie, par mois (centimes), mois archivés compris ;
+    'flux' vaut 'revenus' ou 'depenses'"""
+    debut, _ = bornes_mois(premier)
+    _, fin = bornes_mois(dernier)
+    return read_query(
+        """
+        SELECT 'revenus' AS flux, mois, NULL AS categorie_id, SUM(montant_centimes) AS centimes FROM revenus
+        WHERE user_id = ? AND mois BETWEEN ? AND ? GROUP BY mois
+        UNION ALL
+        SELECT 'revenus', mois, NULL, total_centimes FROM rollup_revenus
+        WHERE user_id = ? AND mois BETWEEN ? AND ?
+        UNION ALL
+        SELECT 'depenses', mois, categorie_id, SUM(montant_centimes) FROM depenses
+        WHERE user_id = ? AND jour BETWEEN ? AND ? GROUP BY mois, categorie_id
+        UNION ALL
+        SELECT 'depenses', mois, categorie_id, total_centimes FROM rollup_depenses
+        WHERE user_id = ? AND mois BETWEEN ? AND ?
+        """,
+        (user_id, premier, dernier, user_id, premier, dernier, user_id, debut, fin, user_id, premier, dernier)
+    )
+
+
+@cached_reader(tables=('depenses', 'revenus'), max_entries=200, ttl=3600, max_mb=16)
+def _projection(user_id: int, mois_courant: str, horizon: int) -> dict:
+    """Quantiles de l'épargne cumulée des `horizon` mois suivant le mois courant"""
+    courant = pd.Period(mois_courant, freq='M')
+    mois_clos = list(pd.period_range(end=courant - 1, periods=HISTORIQUE_MOIS, freq='M').strftime('%Y-%m'))
+    futurs = list(pd.period_range(start=courant + 1, periods=horizon, freq='M').strftime('%Y-%m'))
+    lignes = _flux_mensuels(user_id, mois_clos[0], mois_clos[-1])
+
+    est_revenu = lignes['flux'] == 'revenus'
+    revenus = lignes[est_revenu].groupby('mois')['centimes'].sum().reindex(mois_clos, fill_value=0) / 100
+    # Dépenses d'une catégorie supprimée (categorie_id NULL) : ligne 0, sans nom
+    depenses = lignes[~est_revenu].fillna({'categorie_id': 0}).pivot_table(
+        index='categorie_id', columns='mois', values='centimes', aggfunc='sum'
+    ).reindex(columns=mois_clos).fillna(0) / 100
+
+    # Les mois antérieurs au premier mois saisi ne sont pas des zéros observés
+    observes = (revenus.to_numpy() + depenses.to_numpy().sum(axis=0)).nonzero()[0]
+    premier = observes[0] if len(observes) else len(mois_clos)
+    resultat = {'mois': futurs, 'mois_historique': len(mois_clos) - premier, 'nb_trajectoires': NB_TRAJECTOIRES}
+    if resultat['mois_historique'] < MIN_MOIS:
+        return resultat
+
+    simulation = simulate_savings(revenus.to_numpy()[premier:], depenses.to_numpy()[:, premier:], horizon)
+    resultat['cumul'] = simulation['cumul']
+    resultat['solde'] = simulation['solde']
+    resultat['categories'] = pd.DataFrame({
+        'categorie_id': depenses.index.astype(int),
+        'moyenne_mensuelle': depenses.to_numpy()[:, premier:].mean(axis=1),
+        'p10': simulation['categories'][:, 0],
+        'p50': simulation['categories'][:, 1],
+        'p90': simulation['categories'][:, 2],
+    })
+    resultat['revenus'] = simulation['revenus']
+    return resultat
+
+
+def project_savings(user_id: int, horizon: int = 12, solde_depart: float = 0.0, today: date = None) -> dict:
+    """Projection du solde sur les `horizon` mois suivant le mois en cours, à partir de
+    `solde_depart` (solde à la fin du mois en cours).
+
+    'bandes' : une ligne par mois (p5, p25, p50, p75, p95 du solde, prob_negatif : probabilité
+    d'un solde négatif) ; 'categories' : dépenses de chaque catégorie sur l'horizon (p10,
+    p50, p90) et moyenne mensuelle passée ; 'revenus' : p10, p50, p90 des revenus sur l'horizon ;
+    'mois_historique', 'nb_trajectoires'. Moins de MIN_MOIS d'historique : 'bandes' vide.
+    """
+    mois_courant = (today or date.today()).strftime('%Y-%m')
+    resultat = _projection(user_id, mois_courant, int(horizon))
+    if 'cumul' not in resultat:
+        resultat['bandes'] = pd.DataFrame(columns=['mois', *BANDES, 'prob_negatif'])
+        resultat['categories'] = pd.DataFrame(columns=['categorie_id', 'categorie', 'moyenne_mensuelle',
+                                                       'p10', 'p50', 'p90'])
+        return resultat
+
+    cumul = resultat.pop('cumul') + solde_depart
+    bandes = pd.DataFrame({'mois': resultat['mois'], **{nom: cumul[q] for nom, q in BANDES.items()}})
+    # P(solde < 0) interpolée entre les quantiles de chaque mois
+    bandes['prob_negatif'] = [np.interp(0.0, cumul[:, h], QUANTILES / 100, left=0.0, right=1.0)
+                              for h in range(cumul.shape[1])]
+    resultat['bandes'] = bandes
+    resultat['categories'] = avec_noms(user_id, resultat['categories'], position=1)
+    return resultat
@@ -0,0 +1,200 @@
+"""
+Transactions récurrentes (loyer, salaire, abonnements, APL...)
+
+Une règle décrit un revenu ou une dépense répété tous les `intervalle` mois, semaines ou
+jours entre `debut` et `fin` (numéros de jour). Le générateur crée en quelques requêtes
+ensemblistes toutes les occurrences échues de tous les utilisateurs ; chaque occurrence
+est enregistrée dans recurrences_faites (clé unique règle, jour), ce qui rend la
+génération idempotente : une occurrence supprimée à la main n'est pas recréée.
+Une règle mensuelle tombe le jour du mois de son début, ramené au dernier jour des
+mois plus courts.
+"""
+from datetime import date
+
+import pandas as pd
+import streamlit as st
+
+from .cache import cached_reader, invalidate
+from .database import JOUR_JULIEN_OFFSET, get_connection, read_query
+
+
+FREQUENCES = {'mois': "mois", 'semaine': "semaine(s)", 'jour': "jour(s)"}
+
+# Mois (année * 12 + mois - 1) d'un numéro de jour, en SQL
+_MOIS = "(CAST(strftime('%Y', {j} + {o}) AS INTEGER) * 12 + CAST(strftime('%m', {j} + {o}) AS INTEGER) - 1)"
+
+
+def _mois(expr: str) -> str:
+    return _MOIS.format(j=expr, o=JOUR_JULIEN_OFFSET)
+
+
+# Occurrences dues jusqu'au jour :h, à partir de la dernière occurrence générée de chaque
+# règle : chaque règle ne parcourt que ses rangs utiles dans la table temporaire rang
+# (CROSS JOIN : règles d'abord, puis recherche par intervalle de clé primaire)
+_OCCURRENCES = f"""
+    WITH r0 AS (
+        SELECT rec.id, rec.user_id, rec.type, rec.libelle, rec.montant_centimes, rec.categorie_id,
+               rec.frequence, rec.debut,
+               CASE rec.frequence WHEN 'semaine' THEN 7 * rec.intervalle ELSE rec.intervalle END AS pas,
+               COALESCE((SELECT MAX(periode) FROM recurrences_faites f WHERE f.recurrence_id = rec.id) + 1,
+                        rec.debut) AS depuis,
+               MIN(COALESCE(rec.fin, :h), :h) AS jusqu
+        FROM recurrences rec
+        WHERE rec.actif = 1 AND rec.debut <= :h {{filtre}}
+    ),
+    r AS (
+        SELECT r0.*,
+               CASE WHEN frequence = 'mois' THEN ({_mois('depuis')} - {_mois('debut')}) / pas
+                    ELSE (depuis - debut + pas - 1) / pas END AS rang_min,
+               CASE WHEN frequence = 'mois' THEN ({_mois('jusqu')} - {_mois('debut')}) / pas
+                    ELSE (jusqu - debut) / pas END AS rang_max
+        FROM r0 WHERE depuis <= jusqu
+    ),
+    occ AS (
+        SELECT r.*,
+               CASE WHEN frequence != 'mois' THEN debut + rang.i * pas
+               ELSE CAST(julianday(date(debut + {JOUR_JULIEN_OFFSET}, 'start of month', '+' || (rang.i * pas) || ' months'))
+                         - {JOUR_JULIEN_OFFSET} AS INTEGER)
+                    + MIN(CAST(strftime('%d', debut + {JOUR_JULIEN_OFFSET}) AS INTEGER),
+                          CAST(strftime('%d', debut + {JOUR_JULIEN_OFFSET}, 'start of month',
+                                        '+' || (rang.i * pas + 1) || ' months', '-1 day') AS INTEGER)) - 1
+               END AS jour
+        FROM r CROSS JOIN rang
+        WHERE rang.i BETWEEN r.rang_min AND r.rang_max
+    )
+    SELECT id, user_id, type, jour, libelle, montant_centimes, categorie_id
+    FROM occ
+    WHERE jour BETWEEN depuis AND jusqu
+      AND NOT EXISTS (SELECT 1 FROM recurrences_faites f WHERE f.recurrence_id = occ.id AND f.periode = occ.jour)
+"""
+
+
+# -----------------------
+# Règles
+# -----------------------
+@cached_reader(tables=('recurrences', 'categories'), max_entries=2000, ttl=3600, max_mb=8)
+def list_recurrences(user_id: int) -> pd.DataFrame:
+    """Liste les règles de récurrence d'un utilisateur, avec leur dernière occurrence générée"""
+    q = f"""
+        SELECT r.id, r.type, r.libelle, r.montant_centimes / 100.0 AS montant, r.categorie_id,
+               c.nom AS categorie, r.frequence, r.intervalle,
+               date(r.debut + {JOUR_JULIEN_OFFSET}) AS debut, date(r.fin + {JOUR_JULIEN_OFFSET}) AS fin, r.actif,
+               (SELECT date(MAX(periode) + {JOUR_JULIEN_OFFSET}) FROM recurrences_faites f
+                WHERE f.recurrence_id = r.id) AS derniere
+        FROM recurrences r LEFT JOIN categories c ON c.id = r.categorie_id
+        WHERE r.user_id = ?
+        ORDER BY r.type, r.libelle
+    """
+    return read_query(q, (user_id,))
+
+
+def add_recurrence(user_id: int, type_: str, libelle: str, montant: float, frequence: str, debut: date,
+                   fin: date = None, categorie_id: int = None, intervalle: int = 1):
+    """Ajoute une règle de récurrence (type 'revenu' ou 'depense', catégorie obligatoire pour une dépense)"""
+    from .data_operations import to_centimes
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO recurrences(user_id, type, libelle, montant_centimes, categorie_id, frequence, intervalle, debut, fin)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """,
+            (user_id, type_, libelle, to_centimes(montant), categorie_id, frequence, int(intervalle),
+             debut.toordinal(), fin.toordinal() if fin else None)
+        )
+    invalidate(user_id, 'recurrences')
+
+
+def toggle_recurrence(user_id: int, rec_id: int, actif: int):
+    """Suspend ou reprend une règle (les occurrences manquées sont rattrapées à la reprise)"""
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE recurrences SET actif=? WHERE id=? AND user_id=?;", (actif, rec_id, user_id))
+    invalidate(user_id, 'recurrences')
+
+
+def delete_recurrence(user_id: int, rec_id: int):
+    """Supprime une règle ; les revenus et dépenses déjà générés sont conservés"""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM recurrences WHERE id=? AND user_id=?;", (rec_id, user_id))
+    invalidate(user_id, 'recurrences')
+
+
+# -----------------------
+# Génération des occurrences
+# -----------------------
+def materialize_recurrences(jusqu_au: date = None, user_ids: list = None, conn=None) -> pd.DataFrame:
+    """Génère les occurrences échues (jusqu'à `jusqu_au`, aujourd'hui par défaut) de toutes les
+    règles actives, ou de celles des `user_ids` ; rapport par utilisateur et type.
+
+    Une seule transaction : calcul des occurrences, insertions en lot dans revenus et
+    depenses, enregistrement dans recurrences_faites. Deux générations concurrentes ne
+    peuvent pas créer de doublon (BEGIN IMMEDIATE, clé unique règle, jour).
+    """
+    h = (jusqu_au or date.today()).toordinal()
+    conn = conn or get_connection()
+    filtre, params = "", {'h': h}
+    if user_ids is not None:
+        filtre = f"AND rec.user_id IN ({','.join(str(int(u)) for u in user_ids) or 'NULL'})"
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        premier = conn.execute("SELECT MIN(debut) FROM recurrences WHERE actif = 1;").fetchone()[0]
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS rang(i INTEGER PRIMARY KEY);")
+        if premier is not None:
+            # Rangs 0..(h - premier) : borne de toutes les fréquences (pas d'au moins un jour ou un mois)
+            conn.execute(
+                """
+                INSERT INTO rang(i)
+                WITH RECURSIVE n(i) AS (
+                    SELECT COALESCE(MAX(i) + 1, 0) FROM rang
+                    UNION ALL
+                    SELECT i + 1 FROM n WHERE i < ?
+                )
+                SELECT i FROM n WHERE i <= ?;
+                """,
+                (h - premier, h - premier)
+            )
+        conn.execute("DROP TABLE IF EXISTS temp.dues;")
+        conn.execute(
+            "CREATE TEMP TABLE dues AS " + _OCCURRENCES.format(filtre=filtre) + ";",
+            params
+        )
+        conn.execute(
+            """
+            INSERT INTO depenses(user_id, jour, categorie_id, description, montant_centimes)
+            SELECT user_id, jour, categorie_id, libelle, montant_centimes FROM dues
+            WHERE type = 'depense' ORDER BY user_id, jour, id;
+            """
+        )
+        conn.execute(
+            f"""
+            INSERT INTO revenus(user_id, mois, origine, montant_centimes)
+            SELECT user_id, strftime('%Y-%m', jour + {JOUR_JULIEN_OFFSET}), libelle, montant_centimes FROM dues
+            WHERE type = 'revenu' ORDER BY user_id, jour, id;
+            """
+        )
+        conn.execute("INSERT INTO recurrences_faites(recurrence_id, periode) SELECT id, jour FROM dues;")
+        rapport = pd.read_sql_query(
+            """
+            SELECT user_id, type, COUNT(*) AS lignes, SUM(montant_centimes) / 100.0 AS montant
+            FROM dues GROUP BY user_id, type ORDER BY user_id, type
+            """,
+            conn
+        )
+        conn.execute("DROP TABLE temp.dues;")
+
+    for user_id, tables in rapport.groupby('user_id')['type']:
+        invalidate(int(user_id), 'recurrences', *({'revenu': 'revenus', 'depense': 'depenses'}[t] for t in tables))
+    return rapport
+
+
+def materialize_due(user_id: int, jour: date):
+    """Occurrences échues de l'utilisateur connecté, une fois par session et par jour ; la
+    passe de tous les utilisateurs est celle du cron (utils/materialize_recurrences)"""
+    if st.session_state.get('recurrences_du') == (user_id, jour):
+        return None
+    rapport = materialize_recurrences(jour, user_ids=[user_id])
+    st.session_state.recurrences_du = (user_id, jour)
+    return rapport
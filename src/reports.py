@@ -0,0 +1,251 @@
+"""
+Rapports de fin de mois pour tous les utilisateurs, hors Streamlit
+
+Pour un mois donné : résumé (revenus, dépenses, solde, budgets par catégorie),
+dépassements de budget et variations par rapport au mois précédent et à la moyenne
+des trois mois précédents. Les utilisateurs sont répartis par lots sur un pool de
+processus ; chaque processus ouvre sa propre connexion en lecture seule, lit un lot
+en trois requêtes groupées (mois archivés compris, via les agrégats) et écrit les
+fichiers de ses utilisateurs. L'index global est écrit à la fin.
+
+Sortie : <dossier>/<mois>/<id>_<utilisateur>.{csv,json,html} et index.{csv,json,html}
+"""
+import html
+import json
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from .analytics import summarize_month
+from .database import connect_readonly, get_db_path
+
+
+FORMATS = ('csv', 'json', 'html')
+
+# Utilisateurs par tâche envoyée au pool
+CHUNK_USERS = 100
+
+# Mois précédents lus pour les variations
+NB_MOIS_TENDANCE = 3
+
+# Connexion en lecture seule du processus de travail (ouverte par _init_worker)
+_conn = None
+
+
+def _init_worker(db_path: str):
+    global _conn
+    _conn = connect_readonly(db_path)
+
+
+def months_before(mois: str, n: int) -> list:
+    """Les n mois précédant `mois` puis `mois` lui-même ('YYYY-MM', ordre chronologique)"""
+    index = int(mois[:4]) * 12 + int(mois[5:7]) - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(index - n, index + 1)]
+
+
+def _lire_lot(conn, user_ids: list, mois: str) -> tuple:
+    """Dépenses par catégorie et revenus par mois (centimes), budgets du mois, pour un lot"""
+    mois_liste = months_before(mois, NB_MOIS_TENDANCE)
+    debut = pd.Timestamp(mois_liste[0] + "-01").date().toordinal()
+    fin = (pd.Timestamp(mois + "-01") + pd.offsets.MonthEnd(0)).date().toordinal()
+    ids = ",".join("?" * len(user_ids))
+
+    depenses = pd.read_sql_query(
+        f"""
+        SELECT d.user_id, d.mois, c.nom AS categorie, SUM(d.c) AS centimes
+        FROM (
+            SELECT user_id, mois, categorie_id, montant_centimes AS c FROM depenses
+            WHERE user_id IN ({ids}) AND jour BETWEEN ? AND ?
+            UNION ALL
+            SELECT user_id, mois, categorie_id, total_centimes FROM rollup_depenses
+            WHERE user_id IN ({ids}) AND mois BETWEEN ? AND ?
+        ) d JOIN categories c ON c.id = d.categorie_id
+        GROUP BY 1, 2, 3
+        """,
+        conn, params=(*user_ids, debut, fin, *user_ids, mois_liste[0], mois)
+    )
+    revenus = pd.read_sql_query(
+        f"""
+        SELECT user_id, mois, SUM(c) AS centimes FROM (
+            SELECT user_id, mois, montant_centimes AS c FROM revenus
+            WHERE user_id IN ({ids}) AND mois BETWEEN ? AND ?
+            UNION ALL
+            SELECT user_id, mois, total_centimes FROM rollup_revenus
+            WHERE user_id IN ({ids}) AND mois BETWEEN ? AND ?
+        ) GROUP BY 1, 2
+        """,
+        conn, params=(*user_ids, mois_liste[0], mois, *user_ids, mois_liste[0], mois)
+    )
+    budgets = pd.read_sql_query(
+        f"""
+        SELECT b.user_id, c.nom AS categorie, b.budget_centimes AS centimes
+        FROM budgets b JOIN categories c ON c.id = b.categorie_id
+        WHERE b.user_id IN ({ids}) AND b.mois = ? AND c.actif = 1
+        """,
+        conn, params=(*user_ids, mois)
+    )
+    return depenses, revenus, budgets
+
+
+def build_report(username: str, mois: str, par_mois: pd.DataFrame, revenus_mois: pd.Series,
+                 budget_map: dict) -> dict:
+    """Rapport d'un utilisateur : dépenses par catégorie et par mois, revenus par mois (euros,
+    colonnes et index = months_before(mois, NB_MOIS_TENDANCE)) et budgets du mois par catégorie"""
+    mois_liste = months_before(mois, NB_MOIS_TENDANCE)
+    precedent, anterieurs = mois_liste[-2], mois_liste[:-1]
+    depenses_mois = par_mois.sum()
+
+    resume = summarize_month(round(float(revenus_mois[mois]), 2), par_mois[mois][par_mois[mois] != 0], budget_map)
+    categories = resume['per_category'].set_index('Catégorie')
+    categories['Mois précédent'] = par_mois[precedent].reindex(categories.index).fillna(0)
+    categories['Variation'] = categories['Dépensé'] - categories['Mois précédent']
+    categories['Moyenne 3 mois'] = par_mois[anterieurs].mean(axis=1).reindex(categories.index).fillna(0)
+    categories = categories.round(2).reset_index()
+
+    depassements = categories[(categories['Budget'] > 0) & (categories['Dépensé'] > categories['Budget'])]
+
+    def variation(serie: pd.Series) -> dict:
+        actuel, avant = float(serie[mois]), float(serie[precedent])
+        return {
+            'mois_precedent': round(avant, 2),
+            'variation': round(actuel - avant, 2),
+            'variation_pct': round((actuel - avant) / avant * 100, 1) if avant else None,
+            'moyenne_3_mois': round(float(serie[anterieurs].mean()), 2),
+        }
+
+    return {
+        'utilisateur': username,
+        'mois': mois,
+        'revenus': resume['total_income'],
+        'depenses': resume['total_spent'],
+        'solde': round(resume['overall_left'], 2),
+        'taux_utilisation': round(resume['total_spent'] / resume['total_income'] * 100, 1) if resume['total_income'] else None,
+        'tendance_revenus': variation(revenus_mois),
+        'tendance_depenses': variation(depenses_mois),
+        'depassements': [
+            {'categorie': d['Catégorie'], 'budget': d['Budget'], 'depense': d['Dépensé'],
+             'excedent': round(d['Dépensé'] - d['Budget'], 2)}
+            for d in depassements.to_dict('records')
+        ],
+        'categories': categories,
+    }
+
+
+def _html(rapport: dict) -> str:
+    """Page HTML autonome d'un rapport"""
+    titre = html.escape(f"Rapport {rapport['mois']} - {rapport['utilisateur']}")
+    td = rapport['tendance_depenses']
+    lignes = [
+        f"<li>Revenus : {rapport['revenus']:,.2f} €</li>",
+        f"<li>Dépenses : {rapport['depenses']:,.2f} € ({td['variation']:+,.2f} € sur le mois précédent)</li>",
+        f"<li>Solde : {rapport['solde']:,.2f} €</li>",
+        f"<li>Dépassements de budget : {len(rapport['depassements'])}</li>",
+    ]
+    tableau = rapport['categories'].to_html(index=False, float_format=lambda v: f"{v:,.2f}", border=0)
+    return (
+        f"<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\"><title>{titre}</title></head>\n"
+        f"<body><h1>{titre}</h1>\n<ul>{''.join(lignes)}</ul>\n{tableau}\n</body></html>\n"
+    )
+
+
+def _nom_fichier(user_id: int, username: str) -> str:
+    return f"{user_id}_{re.sub(r'[^A-Za-z0-9_.-]', '_', username)}"
+
+
+def write_report(rapport: dict, dossier: Path, nom: str, formats=FORMATS):
+    """Écrit les fichiers d'un rapport dans les formats demandés"""
+    if 'csv' in formats:
+        rapport['categories'].to_csv(dossier / f"{nom}.csv", index=False)
+    if 'json' in formats:
+        contenu = {**rapport, 'categories': rapport['categories'].to_dict('records')}
+        with open(dossier / f"{nom}.json", 'w', encoding='utf-8') as f:
+            json.dump(contenu, f, ensure_ascii=False, indent=2)
+    if 'html' in formats:
+        (dossier / f"{nom}.html").write_text(_html(rapport), encoding='utf-8')
+
+
+def _rapports_lot(users: list, mois: str, dossier: str, formats) -> list:
+    """Tâche d'un processus : lit un lot d'utilisateurs, écrit leurs rapports, rend leurs lignes d'index"""
+    ids = [u for u, _ in users]
+    mois_liste = months_before(mois, NB_MOIS_TENDANCE)
+    depenses, revenus, budgets = _lire_lot(_conn, ids, mois)
+
+    # Un pivot par lot plutôt que par utilisateur ; chaque rapport en lit une tranche
+    par_mois = (
+        depenses.pivot_table(index=['user_id', 'categorie'], columns='mois', values='centimes', aggfunc='sum')
+        .reindex(columns=mois_liste).fillna(0) / 100
+    )
+    revenus_mois = (
+        revenus.pivot_table(index='user_id', columns='mois', values='centimes', aggfunc='sum')
+        .reindex(index=ids, columns=mois_liste).fillna(0) / 100
+    )
+    budget_maps = {
+        user_id: dict(zip(groupe['categorie'], groupe['centimes'] / 100))
+        for user_id, groupe in budgets.groupby('user_id')
+    }
+    sans_depense = pd.DataFrame(columns=mois_liste, dtype=float)
+
+    index = []
+    for user_id, username in users:
+        rapport = build_report(
+            username, mois,
+            par_mois.loc[user_id] if user_id in par_mois.index else sans_depense,
+            revenus_mois.loc[user_id],
+            budget_maps.get(user_id, {}),
+        )
+        nom = _nom_fichier(user_id, username)
+        write_report(rapport, Path(dossier), nom, formats)
+        index.append({
+            'user_id': user_id,
+            'utilisateur': username,
+            'revenus': rapport['revenus'],
+            'depenses': rapport['depenses'],
+            'solde': rapport['solde'],
+            'variation_depenses': rapport['tendance_depenses']['variation'],
+            'depassements': len(rapport['depassements']),
+            'fichier': nom,
+        })
+    return index
+
+
+def _ecrire_index(index: pd.DataFrame, dossier: Path, mois: str, formats):
+    index.drop(columns=['fichier']).to_csv(dossier / "index.csv", index=False)
+    index.to_json(dossier / "index.json", orient='records', force_ascii=False, indent=2)
+    lien = 'html' if 'html' in formats else formats[0]
+    table = index.assign(
+        utilisateur=[f'<a href="{html.escape(f)}.{lien}">{html.escape(u)}</a>'
+                     for f, u in zip(index['fichier'], index['utilisateur'])]
+    ).drop(columns=['fichier'])
+    (dossier / "index.html").write_text(
+        f"<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\"><title>Rapports {mois}</title></head>\n"
+        f"<body><h1>Rapports {mois}</h1>\n"
+        f"{table.to_html(index=False, escape=False, float_format=lambda v: f'{v:,.2f}', border=0)}\n</body></html>\n",
+        encoding='utf-8'
+    )
+
+
+def generate_reports(mois: str, dossier, formats=FORMATS, workers: int = None,
+                     chunk_users: int = CHUNK_USERS, db_path=None) -> tuple:
+    """Génère les rapports de tous les utilisateurs ; retourne (index, durée en secondes)"""
+    db_path = str(db_path or get_db_path())
+    dossier = Path(dossier) / mois
+    dossier.mkdir(parents=True, exist_ok=True)
+
+    conn = connect_readonly(db_path)
+    try:
+        users = conn.execute("SELECT id, username FROM users ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    lots = [users[i:i + chunk_users] for i in range(0, len(users), chunk_users)]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        taches = [pool.submit(_rapports_lot, lot, mois, str(dossier), tuple(formats)) for lot in lots]
+        lignes = [ligne for tache in taches for ligne in tache.result()]
+    index = pd.DataFrame(lignes, columns=['user_id', 'utilisateur', 'revenus', 'depenses', 'solde',
+                                          'variation_depenses', 'depassements', 'fichier'])
+    _ecrire_index(index, dossier, mois, tuple(formats))
+    return index, time.perf_counter() - t0
@@ -0,0 +1,33 @@
+"""
+Archivage des mois anciens : déplace les dépenses et revenus antérieurs aux `horizon`
+derniers mois vers des fichiers Parquet par utilisateur et par année (src.archive).
+À lancer périodiquement (cron) ; une nouvelle exécution n'archive que les nouveaux mois.
+
+Usage : python -m utils.archive_months [horizon_en_mois]
+"""
+import sys
+import time
+
+from src.archive import ARCHIVE_MONTHS, archive_dir, archive_old_months
+from src.coherence import enable_cache_coherence
+from src.database import create_schema, get_connection
+from src.disk_cache import enable_disk_cache
+
+
+def main(horizon: int = ARCHIVE_MONTHS):
+    create_schema(get_connection())
+    enable_cache_coherence()
+    enable_disk_cache(warm=False)
+    t0 = time.perf_counter()
+    rapport = archive_old_months(horizon)
+    duree = time.perf_counter() - t0
+    if rapport.empty:
+        print(f"Aucun mois antérieur aux {horizon} derniers à archiver.")
+        return
+    print(rapport.to_string(index=False))
+    print(f"\n{int(rapport['lignes'].sum())} lignes archivées dans {archive_dir()} "
+          f"({rapport['octets'].sum() / 1024:.0f} Ko de Parquet) en {duree:.1f} s")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
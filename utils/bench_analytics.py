@@ -0,0 +1,91 @@
+"""
+Banc d'essai du moteur d'analyse : agrégations de la page Analyses (totaux de période,
+statistiques par catégorie, tendances mensuelles) sur SQLite puis sur DuckDB embarqué,
+avec vérification que les deux moteurs rendent les mêmes montants.
+
+Usage : python -m utils.bench_analytics [utilisateurs] [depenses_par_utilisateur] [repetitions]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+
+def chronometrer(fonction, repetitions: int) -> tuple:
+    """Durée médiane (ms) et dernier résultat"""
+    durees = []
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        resultat = fonction()
+        durees.append(time.perf_counter() - t0)
+    durees.sort()
+    return durees[len(durees) // 2] * 1000, resultat
+
+
+def main(nb_users: int = 20, nb_depenses: int = 60_000, repetitions: int = 5):
+    tmp = Path(tempfile.mkdtemp(prefix="bench_analytics_"))
+    os.environ["DB_PATH"] = str(tmp / "budget_app.db")
+
+    from utils.synthetic_data import populate, last_months
+    from src import data_operations
+    from src.duckdb_engine import duckdb, DuckDBEngine
+
+    if duckdb is None:
+        print("duckdb n'est pas installé (pip install duckdb)")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    populate(conn, nb_users, nb_depenses)
+    conn.close()
+    print(f"Base : {nb_users} utilisateurs x {nb_depenses} dépenses = {nb_users * nb_depenses:,} lignes "
+          f"({time.perf_counter() - t0:.1f} s)\n")
+
+    t0 = time.perf_counter()
+    moteur = DuckDBEngine(os.environ["DB_PATH"])
+    print(f"Ouverture DuckDB, ATTACH et copie colonnaire : {(time.perf_counter() - t0) * 1000:.0f} ms\n")
+
+    mois = last_months(12)
+    debut, fin = date.fromisoformat(mois[0] + "-01"), date.today()
+    user_id = 1
+    # Lecteurs SQLite sans le cache (__wrapped__) ; le moteur DuckDB est appelé directement
+    cas = {
+        "totaux de période": (
+            lambda: data_operations.period_totals.__wrapped__(user_id, debut, fin),
+            lambda: moteur.period_totals(user_id, debut, fin),
+        ),
+        "stats par catégorie": (
+            lambda: data_operations._stats_par_categorie.__wrapped__(user_id, debut, fin),
+            lambda: moteur.category_stats(user_id, debut, fin),
+        ),
+        "tendances (12 mois)": (
+            lambda: data_operations.monthly_totals.__wrapped__(user_id, mois),
+            lambda: moteur.monthly_totals(user_id, mois),
+        ),
+    }
+
+    print(f"{'agrégation':<24}{'SQLite ms':>12}{'DuckDB ms':>12}{'rapport':>10}  identiques")
+    for nom, (sqlite_fn, duckdb_fn) in cas.items():
+        ms_sqlite, r_sqlite = chronometrer(sqlite_fn, repetitions)
+        ms_duckdb, r_duckdb = chronometrer(duckdb_fn, repetitions)
+        if isinstance(r_sqlite, dict):
+            identiques = r_sqlite == r_duckdb
+        else:
+            identiques = r_sqlite.astype(object).round(2).equals(r_duckdb.astype(object).round(2))
+        print(f"{nom:<24}{ms_sqlite:>12.1f}{ms_duckdb:>12.1f}{ms_sqlite / ms_duckdb:>9.1f}x  {identiques}")
+
+    # Après une écriture, la première lecture DuckDB recharge les lignes de l'utilisateur
+    data_operations.add_depense(user_id, fin, 1, "Banc d'essai", 12.34)
+    t0 = time.perf_counter()
+    r_duckdb = moteur.period_totals(user_id, debut, fin)
+    ms_resync = (time.perf_counter() - t0) * 1000
+    r_sqlite = data_operations.period_totals.__wrapped__(user_id, debut, fin)
+    print(f"\nPremière lecture DuckDB après une écriture (resynchronisation de l'utilisateur) : "
+          f"{ms_resync:.1f} ms, identiques : {r_sqlite == r_duckdb}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
@@ -0,0 +1,65 @@
+"""
+Banc d'essai des hits de cache sur get_all_data : désérialisation pickle à chaque hit
+(comportement de st.cache_data) contre frames partagées en Copy-on-Write (src.cache).
+
+Usage : python -m utils.bench_cache [depenses] [hits]
+"""
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+
+def mesurer(fonction, hits: int) -> tuple:
+    """Latence médiane (ms) et mémoire allouée par hit (Mo)"""
+    durees = []
+    for _ in range(hits):
+        t0 = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    resultat = fonction()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultat
+    durees.sort()
+    return durees[len(durees) // 2] * 1000, pic / 1e6
+
+
+def main(nb_depenses: int = 200_000, hits: int = 50):
+    tmp = Path(tempfile.mkdtemp(prefix="bench_cache_"))
+    os.environ["DB_PATH"] = str(tmp / "budget_app.db")
+
+    from utils.synthetic_data import populate
+    from src.cache import estimate_size
+    from src.data_operations import get_all_data
+
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    populate(conn, 1, nb_depenses)
+    conn.close()
+
+    # Premier appel : lecture SQL et mise en cache
+    t0 = time.perf_counter()
+    valeur = get_all_data(1)
+    print(f"Lecture SQL (miss) : {(time.perf_counter() - t0) * 1000:.1f} ms, "
+          f"{len(valeur['depenses'])} dépenses, {estimate_size(valeur) / 1e6:.1f} Mo en mémoire")
+
+    stocke = pickle.dumps(valeur, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Taille sérialisée (st.cache_data) : {len(stocke) / 1e6:.1f} Mo\n")
+
+    print(f"{'hit':<30}{'médiane (ms)':>14}{'alloué (Mo)':>14}")
+    for nom, fonction in [
+        ("pickle.loads (st.cache_data)", lambda: pickle.loads(stocke)),
+        ("copie profonde", lambda: {k: v.copy() for k, v in valeur.items()}),
+        ("partagé Copy-on-Write", lambda: get_all_data(1)),
+    ]:
+        latence, memoire = mesurer(fonction, hits)
+        print(f"{nom:<30}{latence:>14.3f}{memoire:>14.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,136 @@
+"""
+Banc d'essai de la catégorisation automatique (src.categorization) sur des libellés de relevé
+synthétiques : compilation des règles, classification (mots et alias, regex à part), suggestions
+apprises et recatégorisation de tout l'historique (un UPDATE par lot, base temporaire).
+
+Usage : python -m utils.bench_categorization [nb_depenses] [nb_marchands] [nb_regex]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["Logement", "Alimentation", "Transport", "Électricité", "Internet + Mobile", "Loisirs", "Santé", "Autres"]
+PREFIXES = ["CB ", "PAIEMENT CB ", "PRLV SEPA ", "CARTE X4521 ", ""]
+VILLES = ["PARIS", "LYON", "NANTES", "LILLE", "BORDEAUX", ""]
+SYLLABES = ["car", "re", "four", "to", "tal", "mo", "no", "pri", "ma", "lu", "dis", "fra", "net", "flix", "or", "ange",
+            "bou", "ly", "gues", "sa", "phar", "cie", "ci", "ne", "dec", "ath", "ik", "ea", "ver", "tin"]
+
+
+def marchands(nb: int, rng: random.Random) -> list:
+    """Noms de marchand distincts de 2 à 4 syllabes, parfois en deux mots"""
+    noms = set()
+    while len(noms) < nb:
+        nom = "".join(rng.choice(SYLLABES) for _ in range(rng.randint(2, 4)))
+        noms.add(nom + (" " + rng.choice(["market", "store", "express", "services"]) if rng.random() < 0.2 else ""))
+    return sorted(noms)
+
+
+def libelles(noms: list, nb: int, rng: random.Random) -> list:
+    """Libellés façon relevé : préfixe, marchand (parfois tronqué), date, référence, ville"""
+    lignes = []
+    for _ in range(nb):
+        nom = rng.choice(noms).upper()
+        if rng.random() < 0.1:
+            nom = nom.replace(" ", "")
+        lignes.append(f"{rng.choice(PREFIXES)}{nom} {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d} "
+                      f"{rng.randint(1000, 99999)} {rng.choice(VILLES)}".strip())
+    return lignes
+
+
+def regles(noms: list, rng: random.Random, nb_regex: int = 30) -> pd.DataFrame:
+    """Une règle par marchand (mot ou alias), quelques bornes de montant, et `nb_regex` regex :
+    trois sur les préfixes et références des relevés, les autres sur un marchand et une ville"""
+    lignes = []
+    for i, nom in enumerate(noms):
+        type_ = 'alias' if i % 3 == 0 else 'mot'
+        motif = nom.split(" ")[0] if type_ == 'alias' else nom
+        borne = i % 10 == 0
+        lignes.append(dict(id=i + 1, type=type_, motif=motif, categorie_id=rng.randrange(len(CATEGORIES)) + 1,
+                           montant_min_centimes=5_000 if borne else None, montant_max_centimes=None, priorite=0))
+    expressions = [r"prlv sepa .*(edf|engie)", r"\bx\d{4}\b.*paris", r"^cb .*express\b"]
+    expressions += [rf"^(?:cb |paiement cb )?{nom.split(' ')[0]}\b.*\b(?:paris|lyon)$"
+                    for nom in rng.sample(noms, max(0, min(nb_regex - 3, len(noms))))]
+    for j, expression in enumerate(expressions[:nb_regex]):
+        lignes.append(dict(id=len(lignes) + 1, type='regex', motif=expression, categorie_id=j % len(CATEGORIES) + 1,
+                           montant_min_centimes=None, montant_max_centimes=None, priorite=1))
+    return pd.DataFrame(lignes)
+
+
+def chrono(fonction, *args, **kwargs):
+    t0 = time.perf_counter()
+    resultat = fonction(*args, **kwargs)
+    return resultat, time.perf_counter() - t0
+
+
+def main(nb_depenses: int = 1_000_000, nb_marchands: int = 300, nb_regex: int = 30):
+    dossier = Path(tempfile.mkdtemp(prefix="bench_categorisation_"))
+    os.environ["DB_PATH"] = str(dossier / "budget.db")
+    from src.categorization import RuleMatcher, recategorize_history, suggest_rules, add_rule
+    from src.database import create_schema, get_connection
+
+    rng = random.Random(0)
+    noms = marchands(nb_marchands, rng)
+    table = regles(noms, rng, nb_regex)
+    descriptions = libelles(noms, nb_depenses, rng)
+    montants = np.array([rng.randrange(100, 20_000) for _ in range(nb_depenses)], dtype=float)
+    print(f"{nb_depenses} libellés, {len(set(descriptions))} distincts, {len(table)} règles dont {nb_regex} regex\n")
+
+    matcher, duree = chrono(RuleMatcher, table)
+    print(f"{'compilation':<28}{duree * 1000:>10.1f} ms")
+    categories, duree = chrono(matcher.classify, descriptions, montants)
+    print(f"{'classification':<28}{duree * 1000:>10.1f} ms  ({(categories >= 0).mean():.0%} classées, "
+          f"{duree / nb_depenses * 1e9:.0f} ns par libellé)")
+    est_regex = (table['type'] == 'regex').to_numpy()
+    _, duree = chrono(RuleMatcher(table[~est_regex]).classify, descriptions, montants)
+    print(f"{'  mots et alias seuls':<28}{duree * 1000:>10.1f} ms")
+    seules_regex = RuleMatcher(table[est_regex])
+    regex, duree = chrono(seules_regex.classify, descriptions, montants)
+    print(f"{'  regex seules':<28}{duree * 1000:>10.1f} ms  ({len(seules_regex._filtres[0])} filtres)")
+    # Référence : chaque regex sur toutes les descriptions
+    seules_regex._filtres = ([], {expression for _, expression in seules_regex._regex})
+    reference, duree = chrono(seules_regex.classify, descriptions, montants)
+    assert (reference == regex).all()
+    print(f"{'  regex, une passe par règle':<28}{duree * 1000:>10.1f} ms")
+
+    # Apprentissage : historique catégorisé par les règles, appris sans elles
+    historique = pd.DataFrame({'description': descriptions, 'categorie_id': np.where(categories >= 0, categories, 8),
+                               'montant_centimes': montants})
+    libelles_groupes = historique.groupby(['description', 'categorie_id'], as_index=False).agg(
+        nb=('montant_centimes', 'size'), montant_centimes=('montant_centimes', 'mean'))
+    suggestions, duree = chrono(suggest_rules, libelles_groupes, RuleMatcher(table.iloc[:0]))
+    print(f"{'suggestions apprises':<28}{duree * 1000:>10.1f} ms  ({len(suggestions)} mots-clés)")
+
+    # Recatégorisation de tout l'historique d'un utilisateur, tout en « Autres » au départ
+    conn = get_connection()
+    create_schema(conn)
+    with conn:
+        user_id = conn.execute("INSERT INTO users(username) VALUES ('bench') RETURNING id;").fetchone()[0]
+        ids = [conn.execute("INSERT INTO categories(user_id, nom) VALUES (?, ?) RETURNING id;", (user_id, nom)).fetchone()[0]
+               for nom in CATEGORIES]
+        conn.execute("INSERT INTO journal_pause(pause) VALUES (1);")
+        conn.executemany(
+            "INSERT INTO depenses(user_id, jour, categorie_id, description, montant_centimes) VALUES (?, ?, ?, ?, ?);",
+            ((user_id, 739000 + i % 700, ids[-1], d, int(m)) for i, (d, m) in enumerate(zip(descriptions, montants)))
+        )
+        conn.execute("DELETE FROM journal_pause;")
+    for regle in table.itertuples(index=False):
+        add_rule(user_id, regle.type, regle.motif, ids[regle.categorie_id - 1],
+                 None if pd.isna(regle.montant_min_centimes) else regle.montant_min_centimes / 100, None, regle.priorite)
+    apercu, duree = chrono(recategorize_history, user_id, dry_run=True)
+    print(f"{'recatégorisation (aperçu)':<28}{duree * 1000:>10.1f} ms  ({int(apercu['nb'].sum())} dépenses)")
+    _, duree = chrono(recategorize_history, user_id)
+    print(f"{'recatégorisation (UPDATE)':<28}{duree * 1000:>10.1f} ms  (journal des modifications compris)")
+    conn.close()
+    for fichier in dossier.iterdir():
+        fichier.unlink()
+    dossier.rmdir()
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
@@ -0,0 +1,33 @@
+"""
+Banc d'essai de l'ajustement des prévisions (src.forecast.fit_forecast) : toutes les
+lignes d'une matrice catégories × mois ajustées à la fois.
+
+Usage : python -m utils.bench_forecast [mois] [horizon]
+"""
+import sys
+import time
+
+import numpy as np
+
+
+def main(mois: int = 60, horizon: int = 12, repetitions: int = 50):
+    from src.forecast import fit_forecast
+
+    rng = np.random.default_rng(0)
+    saison = 1 + 0.3 * np.sin(np.arange(mois) * 2 * np.pi / 12)
+
+    print(f"{mois} mois d'historique, {horizon} mois prévus\n")
+    print(f"{'lignes':>8}{'médiane (ms)':>16}")
+    for lignes in (10, 30, 100, 1000):
+        historique = rng.gamma(2.0, 150.0, (lignes, mois)) * saison
+        durees = []
+        for _ in range(repetitions):
+            t0 = time.perf_counter()
+            fit_forecast(historique, horizon)
+            durees.append(time.perf_counter() - t0)
+        durees.sort()
+        print(f"{lignes:>8}{durees[len(durees) // 2] * 1000:>16.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,57 @@
+"""
+Banc d'essai de la projection Monte-Carlo (src.projection.simulate_savings) : toutes les
+trajectoires tirées en un seul calcul NumPy, comparées à une boucle Python par trajectoire.
+
+Usage : python -m utils.bench_projection [mois_historique] [horizon]
+"""
+import sys
+import time
+
+import numpy as np
+
+
+def boucle(revenus: np.ndarray, depenses: np.ndarray, horizon: int, nb_trajectoires: int, bloc: int) -> np.ndarray:
+    """Référence : une trajectoire à la fois ; quantiles de l'épargne cumulée"""
+    rng = np.random.default_rng(0)
+    t = len(revenus)
+    solde = revenus - depenses.sum(axis=0)
+    cumuls = []
+    for _ in range(nb_trajectoires):
+        mois, cumul, trajectoire = [], 0.0, []
+        while len(mois) < horizon:
+            debut = int(rng.integers(0, t))
+            mois.extend((debut + k) % t for k in range(bloc))
+        for m in mois[:horizon]:
+            cumul += solde[m]
+            trajectoire.append(cumul)
+        cumuls.append(trajectoire)
+    return np.percentile(np.array(cumuls), np.arange(101), axis=0)
+
+
+def main(mois: int = 36, horizon: int = 12, repetitions: int = 10):
+    from src.projection import BLOC, simulate_savings
+
+    rng = np.random.default_rng(0)
+    saison = 1 + 0.3 * np.sin(np.arange(mois) * 2 * np.pi / 12)
+    depenses = rng.gamma(2.0, 150.0, (30, mois)) * saison
+    revenus = np.full(mois, depenses.sum(axis=0).mean() * 1.05) + rng.normal(0, 300, mois)
+
+    print(f"{mois} mois d'historique, 30 catégories, {horizon} mois projetés\n")
+    print(f"{'trajectoires':>14}{'vectorisé (ms)':>18}{'boucle (ms)':>14}")
+    for nb in (1_000, 10_000, 20_000, 100_000):
+        durees = []
+        for _ in range(repetitions):
+            t0 = time.perf_counter()
+            simulate_savings(revenus, depenses, horizon, nb_trajectoires=nb)
+            durees.append(time.perf_counter() - t0)
+        durees.sort()
+        reference = ""
+        if nb <= 20_000:
+            t0 = time.perf_counter()
+            boucle(revenus, depenses, horizon, nb, BLOC)
+            reference = f"{(time.perf_counter() - t0) * 1000:>14.1f}"
+        print(f"{nb:>14}{durees[len(durees) // 2] * 1000:>18.1f}{reference}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
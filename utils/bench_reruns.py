@@ -0,0 +1,96 @@
+"""
+Banc d'essai des reruns : durée d'exécution complète de chaque page (ce que coûtait toute
+interaction avant les fragments) et durée de chacun de ses fragments (ce que coûte
+désormais une interaction dans ce fragment), sur une base synthétique.
+
+AppTest réexécute toujours le script entier : la durée d'un fragment est mesurée en
+chronométrant son corps pendant ces exécutions complètes.
+
+Usage : python -m utils.bench_reruns [depenses_par_utilisateur] [repetitions]
+"""
+import functools
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PAGES = [
+    "app.py",
+    "pages/1_📊_Tableau_de_bord.py",
+    "pages/2_💰_Revenus.py",
+    "pages/3_📁_Catégories_et_Budgets.py",
+    "pages/4_💸_Dépenses.py",
+    "pages/5_📈_Analyses.py",
+    "pages/7_🔁_Récurrences.py",
+]
+
+
+def chronometrer_fragments(durees: dict):
+    """Enveloppe st.fragment pour chronométrer le corps de chaque fragment"""
+    import streamlit as st
+    fragment = st.fragment
+
+    def fragment_chronometre(func=None, **kwargs):
+        if func is None:
+            return lambda f: fragment_chronometre(f, **kwargs)
+
+        @functools.wraps(func)
+        def corps(*args, **kw):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kw)
+            finally:
+                durees[func.__name__].append(time.perf_counter() - t0)
+        return fragment(corps, **kwargs)
+
+    st.fragment = fragment_chronometre
+
+
+def main(nb_depenses: int = 5000, repetitions: int = 10):
+    tmp = Path(tempfile.mkdtemp(prefix="bench_reruns_"))
+    os.environ["DB_PATH"] = str(tmp / "budget_app.db")
+    logging.disable(logging.WARNING)
+
+    from streamlit.testing.v1 import AppTest
+    from utils.synthetic_data import populate
+
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    populate(conn, 1, nb_depenses)
+    conn.close()
+
+    durees = defaultdict(list)
+    chronometrer_fragments(durees)
+
+    print(f"{'page / fragment':<44}{'rerun ms':>10}")
+    for page in PAGES:
+        at = AppTest.from_file(str(ROOT / page), default_timeout=60)
+        at.session_state['authentication_status'] = True
+        at.session_state['username'] = "user1"
+        at.session_state['name'] = "user1"
+        at.run()  # chauffe : imports, caches de lecture
+        if at.exception:
+            print(f"{page} : {at.exception[0].message}")
+            continue
+        durees.clear()
+        complets = []
+        for _ in range(repetitions):
+            t0 = time.perf_counter()
+            at.run()
+            complets.append(time.perf_counter() - t0)
+
+        print(f"{Path(page).stem:<44}{np.median(complets) * 1000:>10.1f}")
+        for nom, valeurs in durees.items():
+            print(f"  {'fragment ' + nom:<42}{np.median(valeurs) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
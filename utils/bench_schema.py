@@ -0,0 +1,133 @@
+"""
+Banc d'essai du schéma de stockage : ancien schéma (montants REAL, dates TEXT)
+contre le schéma actuel (centimes entiers, numéros de jour indexés).
+
+Usage : python -m utils.bench_schema [nb_utilisateurs] [depenses_par_utilisateur]
+"""
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from src.database import create_schema, JOUR_JULIEN_OFFSET
+from src.data_operations import bornes_mois
+
+
+# Schéma d'origine, reproduit tel quel pour la comparaison
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT NOT NULL UNIQUE, email TEXT,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE revenus (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, mois TEXT NOT NULL,
+                      origine TEXT NOT NULL, montant REAL NOT NULL);
+CREATE TABLE categories (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, nom TEXT NOT NULL,
+                         actif INTEGER NOT NULL DEFAULT 1, UNIQUE(user_id, nom));
+CREATE TABLE budgets (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, mois TEXT NOT NULL,
+                      categorie_id INTEGER NOT NULL, budget REAL NOT NULL, UNIQUE(user_id, mois, categorie_id));
+CREATE TABLE depenses (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, date_depense TEXT NOT NULL,
+                       categorie_id INTEGER NOT NULL, description TEXT, montant REAL NOT NULL, mois TEXT NOT NULL);
+"""
+
+LEGACY_LIST_DEPENSES = """
+    SELECT d.id, d.date_depense, c.nom AS categorie, d.description, d.montant, d.categorie_id
+    FROM depenses d
+    JOIN categories c ON c.id=d.categorie_id
+    WHERE d.user_id=? AND d.mois=?
+    ORDER BY datetime(d.date_depense) DESC, d.id DESC
+"""
+
+LIST_DEPENSES = f"""
+    SELECT d.id, date(d.jour + {JOUR_JULIEN_OFFSET}) AS date_depense, c.nom AS categorie,
+           d.description, d.montant_centimes / 100.0 AS montant, d.categorie_id
+    FROM depenses d
+    JOIN categories c ON c.id=d.categorie_id
+    WHERE d.user_id=? AND d.jour BETWEEN ? AND ?
+    ORDER BY d.jour DESC, d.id DESC
+"""
+
+LEGACY_TOTAL = "SELECT SUM(montant) FROM depenses WHERE user_id=? AND mois=?"
+TOTAL = "SELECT SUM(montant_centimes) FROM depenses WHERE user_id=? AND jour BETWEEN ? AND ?"
+
+CATEGORIES = ["Épargne", "Logement", "Alimentation", "Transport", "Loisirs", "Autres"]
+
+
+def build_legacy_db(path: Path, nb_users: int, nb_depenses: int, seed: int = 0):
+    """Crée une base à l'ancien schéma remplie de données synthétiques"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(str(path))
+    conn.executescript(LEGACY_SCHEMA)
+    debut = date.today() - timedelta(days=3 * 365)
+    with conn:
+        for u in range(1, nb_users + 1):
+            conn.execute("INSERT INTO users(id, username) VALUES (?, ?)", (u, f"user{u}"))
+            cat_ids = []
+            for nom in CATEGORIES:
+                cat_ids.append(conn.execute(
+                    "INSERT INTO categories(user_id, nom) VALUES (?, ?)", (u, nom)
+                ).lastrowid)
+            lignes = []
+            for _ in range(nb_depenses):
+                d = debut + timedelta(days=rng.randrange(3 * 365))
+                lignes.append((u, d.isoformat(), rng.choice(cat_ids), "achat",
+                               round(rng.uniform(1, 200), 2), d.strftime('%Y-%m')))
+            conn.executemany(
+                "INSERT INTO depenses(user_id, date_depense, categorie_id, description, montant, mois) "
+                "VALUES (?,?,?,?,?,?)", lignes
+            )
+    conn.close()
+
+
+def timed(conn, sql: str, params_list: list) -> float:
+    """Durée moyenne (ms) d'une requête sur une liste de paramètres"""
+    t0 = time.perf_counter()
+    for params in params_list:
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - t0) * 1000 / len(params_list)
+
+
+def main(nb_users: int = 200, nb_depenses: int = 5000):
+    tmp = Path(tempfile.mkdtemp(prefix="bench_schema_"))
+    legacy, actuel = tmp / "legacy.db", tmp / "actuel.db"
+    try:
+        print(f"Génération : {nb_users} utilisateurs x {nb_depenses} dépenses")
+        build_legacy_db(legacy, nb_users, nb_depenses)
+        shutil.copy(legacy, actuel)
+
+        conn_new = sqlite3.connect(str(actuel))
+        t0 = time.perf_counter()
+        create_schema(conn_new)
+        print(f"Migration : {time.perf_counter() - t0:.2f} s")
+        conn_old = sqlite3.connect(str(legacy))
+
+        rng = random.Random(1)
+        mois = [(date.today() - timedelta(days=30 * k)).strftime('%Y-%m') for k in range(24)]
+        echantillon = [(rng.randint(1, nb_users), rng.choice(mois)) for _ in range(200)]
+        old_params = echantillon
+        new_params = [(u, *bornes_mois(m)) for u, m in echantillon]
+
+        print(f"{'requête':<16}{'ancien (ms)':>14}{'actuel (ms)':>14}")
+        for nom, old_sql, new_sql in [
+            ("list_depenses", LEGACY_LIST_DEPENSES, LIST_DEPENSES),
+            ("total du mois", LEGACY_TOTAL, TOTAL),
+        ]:
+            print(f"{nom:<16}{timed(conn_old, old_sql, old_params):>14.3f}{timed(conn_new, new_sql, new_params):>14.3f}")
+
+        # Exactitude : somme flottante contre somme en centimes
+        u, m = echantillon[0]
+        flottant = conn_old.execute(LEGACY_TOTAL, (u, m)).fetchone()[0]
+        centimes = conn_new.execute(TOTAL, (u, *bornes_mois(m))).fetchone()[0]
+        print(f"Total {m} utilisateur {u} : REAL={flottant!r} centimes={centimes / 100:.2f}")
+
+        plan = conn_new.execute("EXPLAIN QUERY PLAN " + LIST_DEPENSES, new_params[0]).fetchall()
+        print("Plan list_depenses :", " | ".join(row[-1] for row in plan))
+        conn_old.close()
+        conn_new.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,82 @@
+"""
+Vérification de l'écriture traversante : ajouts et suppressions aléatoires de dépenses
+et de revenus sur une base synthétique, lecteurs en cache relus entre chaque écriture,
+puis comparaison de chaque entrée du cache avec une lecture fraîche.
+
+Usage : python -m utils.check_cache [ecritures] [graine]
+
+Code de sortie 1 si une entrée corrigée diffère de la base.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+
+def main(nb_ecritures: int = 200, seed: int = 0):
+    tmp = Path(tempfile.mkdtemp(prefix="check_cache_"))
+    os.environ["DB_PATH"] = str(tmp / "budget_app.db")
+
+    from utils.synthetic_data import populate, last_months
+    from src import data_operations as ops
+
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    populate(conn, 2, 500, nb_mois=6, seed=seed)
+    conn.close()
+
+    # Avec BUDGET_DISK_CACHE=1, les lectures passent aussi par le cache disque
+    from src.disk_cache import enable_disk_cache
+    enable_disk_cache(warm=False)
+
+    rng = random.Random(seed)
+    # Un mois futur vide : premier ajout dans une frame vide, puis suppression de la dernière ligne
+    mois = last_months(6) + ["2099-01"]
+    debut, fin = date.fromisoformat(mois[0] + "-01"), date(2099, 1, 31)
+
+    def lire(user_id: int):
+        for m in mois:
+            ops.list_depenses(user_id, m)
+            ops.list_revenus(user_id, m)
+        ops.monthly_totals(user_id, mois)
+        ops.period_totals(user_id, debut, fin)
+        ops.category_stats(user_id, debut, fin)
+
+    for _ in range(nb_ecritures):
+        user_id = rng.choice([1, 2])
+        lire(user_id)
+        m = rng.choice(mois)
+        action = rng.random()
+        if action < 0.35:
+            annee, numero = (int(x) for x in m.split("-"))
+            categorie = int(rng.choice(ops.list_categories(user_id)['id']))
+            ops.add_depense(user_id, date(annee, numero, rng.randint(1, 28)), categorie,
+                            "Vérification", rng.randrange(1, 50_000) / 100)
+        elif action < 0.7:
+            depenses = ops.list_depenses(user_id, m)
+            if not depenses.empty:
+                ops.delete_depense(user_id, int(rng.choice(depenses['id'])))
+        elif action < 0.85:
+            ops.add_revenu(user_id, m, "Vérification", rng.randrange(1, 500_000) / 100)
+        else:
+            revenus = ops.list_revenus(user_id, m)
+            if not revenus.empty:
+                ops.delete_revenu(user_id, int(rng.choice(revenus['id'])))
+
+    for user_id in (1, 2):
+        lire(user_id)
+    rapport = ops.check_cache_consistency()
+    stats = ops.cache_stats().set_index('Fonction')[['Entrées', 'Hits', 'Misses', 'Patchs', 'Invalidations']]
+    print(stats.to_string())
+
+    ecarts = rapport[~rapport['Cohérent']]
+    print(f"\n{len(rapport)} entrées vérifiées, {len(ecarts)} incohérentes")
+    for _, ligne in ecarts.head(10).iterrows():
+        print(f"  - {ligne['Fonction']}{ligne['Arguments']} : {ligne['Écart']}")
+    return 1 if len(ecarts) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
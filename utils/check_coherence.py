@@ -0,0 +1,123 @@
+"""
+Vérification de la cohérence du cache entre processus (src.coherence) : deux processus
+lisent les mêmes mois en cache ; à chaque tour, l'un ajoute ou supprime une dépense et
+l'autre doit la voir à sa lecture suivante (lecture de ses propres écritures d'un processus
+à l'autre), totaux du mois compris. Mesure aussi le coût du contrôle fait au début de
+chaque lecture en cache quand rien n'a changé.
+
+Usage : python -m utils.check_coherence [tours] [coherence 1|0]
+
+Avec coherence=0, montre les lectures périmées du cache par processus.
+Code de sortie 1 si une lecture a servi un état périmé.
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+
+def processus(canal):
+    """Exécute les commandes reçues sur `canal` avec son propre cache de lecture"""
+    from src import data_operations as ops
+    from src.cache import synchronize
+    from src.coherence import enable_cache_coherence
+    enable_cache_coherence()
+
+    while True:
+        commande, *args = canal.recv()
+        if commande == 'fin':
+            break
+        if commande == 'lire':
+            user_id, mois = args
+            depenses = ops.list_depenses(user_id, mois)
+            total = ops.monthly_totals(user_id, [mois])['depenses'].sum()
+            canal.send((sorted(int(i) for i in depenses['id']), round(float(total), 2)))
+        elif commande == 'ajouter':
+            user_id, mois, montant = args
+            annee, numero = (int(x) for x in mois.split("-"))
+            categorie = int(ops.list_categories(user_id)['id'].iloc[0])
+            ops.add_depense(user_id, date(annee, numero, 15), categorie, "Cohérence", montant)
+            canal.send(None)
+        elif commande == 'supprimer':
+            user_id, id_dep = args
+            ops.delete_depense(user_id, id_dep)
+            canal.send(None)
+        elif commande == 'chrono':
+            nb, = args
+            t0 = time.perf_counter()
+            for _ in range(nb):
+                synchronize()
+            canal.send((time.perf_counter() - t0) / nb)
+
+
+def etat_en_base(db_path: str, user_id: int, mois: str) -> tuple:
+    """Ids et total d'un mois lus directement dans la base"""
+    conn = sqlite3.connect(db_path)
+    lignes = conn.execute("SELECT id, montant_centimes FROM depenses WHERE user_id = ? AND mois = ?;",
+                          (user_id, mois)).fetchall()
+    conn.close()
+    return sorted(i for i, _ in lignes), round(sum(c for _, c in lignes) / 100, 2)
+
+
+def main(nb_tours: int = 200, coherence: int = 1, seed: int = 0):
+    tmp = Path(tempfile.mkdtemp(prefix="check_coherence_"))
+    os.environ["DB_PATH"] = str(tmp / "budget_app.db")
+    os.environ["BUDGET_CACHE_COHERENCE"] = str(coherence)
+
+    from utils.synthetic_data import populate, last_months
+
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    populate(conn, 2, 300, nb_mois=3, seed=seed)
+    conn.close()
+
+    # Processus lancés à neuf (spawn) : rien n'est hérité du cache de celui-ci
+    contexte = multiprocessing.get_context("spawn")
+    canaux = []
+    for _ in range(2):
+        parent, enfant = contexte.Pipe()
+        contexte.Process(target=processus, args=(enfant,), daemon=True).start()
+        canaux.append(parent)
+
+    def appel(canal, *commande):
+        canal.send(commande)
+        return canal.recv()
+
+    rng = random.Random(seed)
+    mois = last_months(3)
+    perimees = 0
+    for tour in range(nb_tours):
+        user_id, m = rng.choice([1, 2]), rng.choice(mois)
+        ecrivain, lecteur = rng.sample(canaux, 2)
+        # Les deux processus ont le mois en cache avant l'écriture
+        appel(lecteur, 'lire', user_id, m)
+        ids, _ = appel(ecrivain, 'lire', user_id, m)
+        if ids and rng.random() < 0.4:
+            appel(ecrivain, 'supprimer', user_id, rng.choice(ids))
+        else:
+            appel(ecrivain, 'ajouter', user_id, m, rng.randrange(1, 50_000) / 100)
+        attendu = etat_en_base(os.environ["DB_PATH"], user_id, m)
+        for nom, canal in (("l'écrivain", ecrivain), ("le lecteur", lecteur)):
+            lu = appel(canal, 'lire', user_id, m)
+            if lu != attendu:
+                perimees += 1
+                if perimees <= 5:
+                    print(f"  tour {tour} : {nom} lit {len(lu[0])} dépenses ({lu[1]} €) "
+                          f"au lieu de {len(attendu[0])} ({attendu[1]} €)")
+
+    controle = appel(canaux[0], 'chrono', 10_000)
+    for canal in canaux:
+        canal.send(('fin',))
+
+    print(f"\n{nb_tours} écritures, {2 * nb_tours} lectures après écriture, {perimees} périmées "
+          f"(cohérence {'activée' if coherence else 'désactivée'})")
+    print(f"Contrôle des versions au début d'une lecture en cache : {controle * 1e6:.1f} µs")
+    return 1 if perimees else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(a) for a in sys.argv[1:3])))
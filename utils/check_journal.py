@@ -0,0 +1,94 @@
+"""
+Vérification du journal des modifications (src.journal) face au compactage : chaque scénario
+enchaîne écritures, lectures d'un consommateur (changes_since), compact_journal et
+acknowledge, puis vérifie que le consommateur reçoit tous les changements postérieurs à sa
+position, ou JournalTruncated s'ils ont été purgés.
+
+Usage : python -m utils.check_journal
+
+Code de sortie 1 si un scénario perd un changement.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+def main():
+    tmp = Path(tempfile.mkdtemp(prefix="check_journal_"))
+    os.environ["DB_PATH"] = str(tmp / "budget_app.db")
+
+    from src import data_operations as ops
+    from src.database import create_schema, get_connection
+    from src.journal import (
+        JournalTruncated, acknowledge, changes_since, compact_journal, forget_consumer, last_sequence
+    )
+
+    conn = get_connection()
+    create_schema(conn)
+    with conn:
+        user_id = conn.execute("INSERT INTO users(username) VALUES ('journal') RETURNING id;").fetchone()[0]
+
+    def revenu(montant: float) -> int:
+        ops.add_revenu(user_id, "2024-01", "Vérification", montant)
+        return int(conn.execute("SELECT MAX(id) FROM revenus;").fetchone()[0])
+
+    def modifier(id_rev: int, centimes: int):
+        with conn:
+            conn.execute("UPDATE revenus SET montant_centimes = ? WHERE id = ?;", (centimes, id_rev))
+
+    def operations(seq: int) -> list:
+        return [(op, int(ligne)) for op, ligne in changes_since(seq, tables=('revenus',))[['op', 'ligne_id']].itertuples(index=False)]
+
+    def scenario_lu_non_enregistre():
+        """Lu sans position enregistrée, puis supprimé : la suppression reste à lire"""
+        acknowledge('sync', last_sequence())
+        id_rev = revenu(10)
+        lu = changes_since(last_sequence() - 1)['seq'].max()
+        ops.delete_revenu(user_id, id_rev)
+        compact_journal()
+        acknowledge('sync', lu)
+        return operations(lu) == [('delete', id_rev)]
+
+    def scenario_copie_puis_enregistrement():
+        """Copie des tables à last_sequence(), enregistrement après un compactage"""
+        id_rev = revenu(20)
+        copie = last_sequence()
+        modifier(id_rev, 2_500)
+        compact_journal()
+        acknowledge('copie', copie)
+        return operations(copie) == [('update', id_rev)]
+
+    def scenario_insertion_relue():
+        """Insertion lue non enregistrée, puis modifiée : la modification n'est pas repliée"""
+        depart = last_sequence()
+        acknowledge('sync', depart)
+        id_rev = revenu(30)
+        modifier(id_rev, 3_500)
+        compact_journal()
+        lu = changes_since(depart)
+        return [op for op in lu['op']] == ['insert', 'update'] and lu['apres'].iloc[-1]['montant_centimes'] == 3_500
+
+    def scenario_purge():
+        """Ce que tous ont lu est purgé ; une position antérieure lève JournalTruncated"""
+        forget_consumer('copie')
+        revenu(40)
+        acknowledge('sync', last_sequence())
+        compact_journal()
+        try:
+            changes_since(0)
+        except JournalTruncated:
+            return operations(last_sequence()) == []
+        return False
+
+    echecs = 0
+    for scenario in (scenario_lu_non_enregistre, scenario_copie_puis_enregistrement,
+                     scenario_insertion_relue, scenario_purge):
+        ok = scenario()
+        echecs += not ok
+        print(f"{'ok   ' if ok else 'ÉCHEC'} {scenario.__doc__}")
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
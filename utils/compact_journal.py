@@ -0,0 +1,30 @@
+"""
+Compactage du journal des modifications (src.journal) : purge ce que tous les consommateurs
+ont lu et ce qui dépasse la rétention. À lancer périodiquement (cron).
+
+Usage : python -m utils.compact_journal [retention_en_jours]
+"""
+import sys
+import time
+
+from src.database import create_schema, get_connection
+from src.journal import RETENTION_DAYS, compact_journal, last_sequence, list_consumers
+
+
+def main(retention_days: int = RETENTION_DAYS):
+    conn = get_connection()
+    create_schema(conn)
+    avant = conn.execute("SELECT COUNT(*) FROM journal;").fetchone()[0]
+    t0 = time.perf_counter()
+    supprimees = compact_journal(retention_days)
+    duree = time.perf_counter() - t0
+    apres = conn.execute("SELECT COUNT(*) FROM journal;").fetchone()[0]
+    print(f"Journal : {avant} → {apres} lignes en {duree:.2f} s (dernier numéro {last_sequence()})")
+    print(f"  lues par tous : {supprimees['lues']}, expirées (> {retention_days} j) : {supprimees['expirees']}")
+    consommateurs = list_consumers()
+    if not consommateurs.empty:
+        print(f"\n{consommateurs.to_string(index=False)}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
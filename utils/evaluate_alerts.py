@@ -0,0 +1,35 @@
+"""
+Alertes de budget de tous les utilisateurs (src.alerts) pour le mois en cours, ou un mois donné.
+L'application n'évalue que l'utilisateur connecté : ce script, à planifier chaque jour (cron)
+après utils.materialize_recurrences, fait avancer la projection de tous les utilisateurs.
+Une alerte déjà déclenchée ne l'est pas une seconde fois.
+
+Usage : python -m utils.evaluate_alerts [mois YYYY-MM]
+"""
+import sys
+import time
+
+from src.alerts import evaluate_alerts
+from src.coherence import enable_cache_coherence
+from src.database import create_schema, get_connection
+from src.disk_cache import enable_disk_cache
+
+
+def main(mois: str = None):
+    create_schema(get_connection())
+    # Versions durables avancées : les caches de l'application ne resserviront pas l'avant
+    enable_cache_coherence()
+    enable_disk_cache(warm=False)
+    t0 = time.perf_counter()
+    alertes = evaluate_alerts(mois)
+    duree = time.perf_counter() - t0
+    if alertes.empty:
+        print(f"Aucune nouvelle alerte ({duree * 1000:.0f} ms).")
+        return
+    print(alertes.groupby(['mois', 'regle']).size().rename('alertes').to_string())
+    print(f"\n{len(alertes)} alertes déclenchées pour {alertes['user_id'].nunique()} "
+          f"utilisateur(s) en {duree * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
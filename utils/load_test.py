@@ -0,0 +1,233 @@
+"""
+Test de charge : N sessions authentifiées simultanées parcourent l'application
+(app.py puis les cinq pages) via streamlit.testing.AppTest, sur une base synthétique.
+
+AppTest n'est pas réentrant (singleton Runtime global) : chaque session tourne
+dans son propre processus, tous démarrés ensemble sur le même fichier SQLite.
+Pour reproduire un conteneur, limiter les cœurs (ex. taskset -c 0-1).
+
+Usage : python -m utils.load_test [--sessions 8] [--iterations 3] [--users 50] [--depenses 2000] [--db chemin.db]
+
+Rapporte les percentiles de latence par étape, la part du temps passé dans SQLite,
+les erreurs (dont « database is locked ») et la mémoire par session.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Chemins relatifs au script principal (AppTest.switch_page)
+PAGES = {
+    'tableau_de_bord': "pages/1_📊_Tableau_de_bord.py",
+    'revenus': "pages/2_💰_Revenus.py",
+    'budgets': "pages/3_📁_Catégories_et_Budgets.py",
+    'depenses': "pages/4_💸_Dépenses.py",
+    'analyses': "pages/5_📈_Analyses.py",
+}
+
+
+def rss_bytes() -> int:
+    """Mémoire résidente du processus (Linux : /proc, sinon pic ru_maxrss)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Session:
+    """Une session utilisateur simulée, avec ses mesures"""
+
+    def __init__(self, numero: int, username: str, iterations: int, timeout: float, seed: int):
+        self.numero = numero
+        self.username = username
+        self.iterations = iterations
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.latences = defaultdict(list)
+        self.erreurs = []
+
+    def _run(self, etape: str, at, action=None):
+        t0 = time.perf_counter()
+        try:
+            if action is None:
+                at.run(timeout=self.timeout)
+            else:
+                action()
+        except Exception as e:  # délai dépassé, widget introuvable...
+            self.erreurs.append(f"{etape}: {e}")
+            return at
+        self.latences[etape].append(time.perf_counter() - t0)
+        for exc in at.exception:
+            self.erreurs.append(f"{etape}: {exc.message}")
+        return at
+
+    def scenario(self):
+        from streamlit.testing.v1 import AppTest
+        from utils.synthetic_data import last_months
+
+        at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=self.timeout)
+        at.session_state['authentication_status'] = True
+        at.session_state['username'] = self.username
+        at.session_state['name'] = self.username
+        mois_possibles = last_months(12)
+
+        for _ in range(self.iterations):
+            at.switch_page("app.py")
+            self._run('app', at)
+
+            # Changement de mois dans la barre latérale
+            if at.sidebar.selectbox:
+                mois_choisi = self.rng.choice(mois_possibles)
+                self._run('changer_mois', at, lambda: at.sidebar.selectbox[0].set_value(mois_choisi).run())
+            mois = at.session_state['mois'] if 'mois' in at.session_state else mois_possibles[-1]
+
+            at.switch_page(PAGES['tableau_de_bord'])
+            self._run('tableau_de_bord', at)
+
+            # Saisie d'une dépense datée dans le mois sélectionné
+            at.switch_page(PAGES['depenses'])
+            self._run('depenses', at)
+            if at.text_input and at.date_input:
+                annee, m = (int(x) for x in mois.split('-'))
+                at.date_input[0].set_value(date(annee, m, self.rng.randint(1, 28)))
+                at.text_input[0].input("Test de charge")
+                at.number_input[0].set_value(round(self.rng.uniform(1, 150), 2))
+                self._run('ajout_depense', at, lambda: at.button[0].click().run())
+
+            # Enregistrement d'un budget
+            at.switch_page(PAGES['budgets'])
+            self._run('budgets', at)
+            boutons = [b for b in at.button if b.label.startswith("💾")]
+            if boutons and at.number_input:
+                at.number_input[0].set_value(float(self.rng.randrange(50, 800)))
+                self._run('enregistrer_budgets', at, lambda: boutons[0].click().run())
+
+            at.switch_page(PAGES['revenus'])
+            self._run('revenus', at)
+
+            at.switch_page(PAGES['analyses'])
+            self._run('analyses', at)
+
+
+def run_session(numero: int, username: str, iterations: int, timeout: float, seed: int, barrier) -> dict:
+    """Exécuté dans un processus dédié : chauffe, attend les autres sessions, puis mesure"""
+    from src.database import QUERY_STATS
+    # Les avertissements de dépréciation de Streamlit noieraient le rapport
+    logging.disable(logging.WARNING)
+
+    # Chauffe : imports, ressources en cache, compilation des pages
+    Session(numero, username, 1, timeout, seed).scenario()
+
+    session = Session(numero, username, iterations, timeout, seed)
+    memoire_avant = rss_bytes()
+    sql_avant = QUERY_STATS.snapshot()
+    barrier.wait()
+    session.scenario()
+    sql_apres = QUERY_STATS.snapshot()
+    return {
+        'latences': dict(session.latences),
+        'erreurs': session.erreurs,
+        'sql': {k: sql_apres[k] - sql_avant[k] for k in sql_apres},
+        'memoire': rss_bytes() - memoire_avant,
+        'memoire_base': memoire_avant,
+    }
+
+
+def prepare_db(path: Path, nb_users: int, nb_depenses: int):
+    from utils.synthetic_data import populate
+    conn = sqlite3.connect(str(path))
+    populate(conn, nb_users, nb_depenses)
+    conn.close()
+
+
+def report(resultats: list, duree: float):
+    latences = defaultdict(list)
+    erreurs = []
+    for r in resultats:
+        for etape, valeurs in r['latences'].items():
+            latences[etape].extend(valeurs)
+        erreurs.extend(r['erreurs'])
+
+    total_reruns = sum(len(v) for v in latences.values())
+    total_temps = sum(sum(v) for v in latences.values())
+    sql_secondes = sum(r['sql']['seconds'] for r in resultats)
+    sql_requetes = sum(r['sql']['queries'] for r in resultats)
+
+    print(f"\n{'étape':<22}{'n':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    tout = []
+    for etape, valeurs in latences.items():
+        ms = np.array(valeurs) * 1000
+        tout.extend(ms)
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        print(f"{etape:<22}{len(ms):>6}{p50:>10.1f}{p90:>10.1f}{p99:>10.1f}{ms.max():>10.1f}")
+    if tout:
+        p50, p90, p99 = np.percentile(tout, [50, 90, 99])
+        print(f"{'TOTAL':<22}{len(tout):>6}{p50:>10.1f}{p90:>10.1f}{p99:>10.1f}{max(tout):>10.1f}")
+
+    print(f"\nSessions simultanées : {len(resultats)}")
+    print(f"Débit : {total_reruns / duree:.1f} reruns/s sur {duree:.1f} s")
+    print(f"Requêtes SQL : {sql_requetes} ; temps SQL : {sql_secondes:.2f} s "
+          f"({100 * sql_secondes / total_temps if total_temps else 0:.1f} % du temps de rerun cumulé)")
+    verrous = [e for e in erreurs if "locked" in e.lower()]
+    print(f"Erreurs : {len(erreurs)} (dont verrous SQLite : {len(verrous)})")
+    for e in sorted(set(erreurs))[:10]:
+        print(f"  - {e[:160]}")
+    memoire = np.array([r['memoire'] for r in resultats]) / 1e6
+    base = np.mean([r['memoire_base'] for r in resultats]) / 1e6
+    print(f"Mémoire par session : moyenne {memoire.mean():+.2f} Mo, max {memoire.max():+.2f} Mo "
+          f"(socle d'un processus chaud : {base:.0f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--depenses", type=int, default=2000, help="dépenses par utilisateur")
+    parser.add_argument("--db", help="base existante (sinon base synthétique temporaire)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.db:
+        db_path = Path(args.db)
+    else:
+        db_path = Path(tempfile.mkdtemp(prefix="load_test_")) / "budget_app.db"
+        print(f"Base synthétique : {args.users} utilisateurs x {args.depenses} dépenses -> {db_path}")
+        prepare_db(db_path, args.users, args.depenses)
+
+    # Hérité par les processus de session (chemin lu par get_db_path)
+    os.environ["DB_PATH"] = str(db_path)
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager, ProcessPoolExecutor(args.sessions, mp_context=ctx) as pool:
+        barrier = manager.Barrier(args.sessions + 1)
+        futures = [
+            pool.submit(run_session, i, f"user{i % args.users + 1}", args.iterations, args.timeout, args.seed + i, barrier)
+            for i in range(args.sessions)
+        ]
+        barrier.wait()
+        t0 = time.perf_counter()
+        resultats = [f.result() for f in futures]
+        duree = time.perf_counter() - t0
+
+    report(resultats, duree)
+
+
+if __name__ == "__main__":
+    main()
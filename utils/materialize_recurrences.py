@@ -0,0 +1,38 @@
+"""
+Génération des transactions récurrentes échues de tous les utilisateurs (src.recurrences).
+L'application ne génère que celles de l'utilisateur connecté : ce script, à planifier chaque
+jour (cron), fait la passe de tous les utilisateurs et sert au rattrapage.
+Une nouvelle exécution ne crée aucun doublon.
+
+Usage : python -m utils.materialize_recurrences [jusqu_au YYYY-MM-DD]
+"""
+import sys
+import time
+from datetime import date
+
+from src.coherence import enable_cache_coherence
+from src.database import create_schema, get_connection
+from src.disk_cache import enable_disk_cache
+from src.recurrences import materialize_recurrences
+
+
+def main(jusqu_au: str = None):
+    jusqu_au = date.fromisoformat(jusqu_au) if jusqu_au else date.today()
+    create_schema(get_connection())
+    # Versions durables avancées : les caches de l'application ne resserviront pas l'avant
+    enable_cache_coherence()
+    enable_disk_cache(warm=False)
+    t0 = time.perf_counter()
+    rapport = materialize_recurrences(jusqu_au)
+    duree = time.perf_counter() - t0
+    if rapport.empty:
+        print(f"Aucune occurrence échue au {jusqu_au}.")
+        return
+    par_type = rapport.groupby('type')[['lignes', 'montant']].sum()
+    print(par_type.to_string())
+    print(f"\n{int(rapport['lignes'].sum())} transactions générées pour {rapport['user_id'].nunique()} "
+          f"utilisateur(s) en {duree * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,42 @@
+"""
+Rapports de fin de mois pour tous les utilisateurs de la base (src.reports) : un
+fichier par utilisateur et par format, plus un index global.
+
+Usage : python -m utils.monthly_reports [--mois YYYY-MM] [--out rapports] [--formats csv,json,html]
+        [--workers N] [--chunk 100]
+
+Sans --mois, le mois précédent (clos) est traité.
+"""
+import argparse
+import logging
+import os
+
+import pandas as pd
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mois", default=(pd.Timestamp.today() - pd.DateOffset(months=1)).strftime('%Y-%m'))
+    parser.add_argument("--out", default="rapports")
+    parser.add_argument("--formats", default="csv,json,html")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    from src.reports import FORMATS, generate_reports
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    inconnus = set(formats) - set(FORMATS)
+    if inconnus or not formats:
+        parser.error(f"formats possibles : {', '.join(FORMATS)}")
+
+    index, duree = generate_reports(args.mois, args.out, formats, workers=args.workers, chunk_users=args.chunk)
+    print(f"{len(index)} rapports {args.mois} écrits dans {os.path.join(args.out, args.mois)} "
+          f"en {duree:.1f} s ({len(index) / duree if duree else 0:.0f} utilisateurs/s, {args.workers} processus)")
+    print(f"Utilisateurs en dépassement : {int((index['depassements'] > 0).sum())}, "
+          f"dépassements au total : {int(index['depassements'].sum())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Provisionnement d'utilisateurs en lot depuis un CSV (colonnes username, name, email,
+password ; password vide = mot de passe aléatoire).
+
+Les mots de passe sont hachés en bcrypt (coût 12, format de streamlit-authenticator)
+sur un pool de processus, les utilisateurs et leurs catégories par défaut sont créés
+en base en une transaction, puis fusionnés dans le fichier d'identifiants YAML,
+remplacé de façon atomique. Les comptes existants sont ignorés, sauf avec --update.
+
+Usage : python -m utils.provision_users equipe.csv [--config .streamlit/config.yaml]
+        [--workers N] [--rounds 12] [--update] [--passwords-out mots_de_passe.csv]
+"""
+import argparse
+import csv
+import os
+import secrets
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import bcrypt
+import yaml
+from yaml.loader import SafeLoader
+
+
+# Coût bcrypt de streamlit_authenticator.Hasher
+ROUNDS = 12
+
+COLONNES = ['username', 'name', 'email', 'password']
+
+
+def hash_password(password: str, rounds: int = ROUNDS) -> str:
+    """Hash bcrypt d'un mot de passe, accepté par streamlit-authenticator"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _hash_lot(lot: tuple) -> str:
+    return hash_password(*lot)
+
+
+def read_users(path: Path) -> list:
+    """Lit et valide le CSV ; les mots de passe vides sont générés"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        lecteur = csv.DictReader(f)
+        manquantes = set(COLONNES[:3]) - set(lecteur.fieldnames or ())
+        if manquantes:
+            raise ValueError(f"Colonnes manquantes dans {path} : {', '.join(sorted(manquantes))}")
+        users = []
+        vus = set()
+        for numero, ligne in enumerate(lecteur, start=2):
+            user = {c: (ligne.get(c) or '').strip() for c in COLONNES}
+            if not user['username'] or not user['name'] or not user['email']:
+                raise ValueError(f"Ligne {numero} : username, name et email sont obligatoires")
+            if user['username'] in vus:
+                raise ValueError(f"Ligne {numero} : utilisateur '{user['username']}' en double")
+            vus.add(user['username'])
+            user['genere'] = not user['password']
+            if user['genere']:
+                user['password'] = secrets.token_urlsafe(12)
+            users.append(user)
+    return users
+
+
+def load_credentials(path: Path) -> dict:
+    """Fichier d'identifiants existant, ou squelette avec une clé de cookie aléatoire"""
+    if path.exists():
+        with open(path, encoding='utf-8') as f:
+            config = yaml.load(f, Loader=SafeLoader) or {}
+    else:
+        config = {}
+    config.setdefault('credentials', {}).setdefault('usernames', {})
+    if config['credentials']['usernames'] is None:
+        config['credentials']['usernames'] = {}
+    config.setdefault('cookie', {'expiry_days': 30, 'name': 'budget_app_cookie', 'key': secrets.token_hex(16)})
+    config.setdefault('preauthorized', {'emails': []})
+    return config
+
+
+def write_credentials(path: Path, config: dict):
+    """Remplace le fichier d'identifiants de façon atomique (même dossier, os.replace)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporaire = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            os.chmod(temporaire, path.stat().st_mode & 0o777)
+        os.replace(temporaire, path)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+
+
+def create_users(conn, usernames: list) -> int:
+    """Crée les utilisateurs absents et leurs catégories par défaut en une transaction ;
+    retourne le nombre de catégories créées"""
+    from src.database import DEFAULT_CATEGORIES
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS provision(username TEXT PRIMARY KEY);")
+        conn.execute("DELETE FROM provision;")
+        conn.executemany("INSERT OR IGNORE INTO provision(username) VALUES (?);", [(u,) for u in usernames])
+        conn.execute("INSERT OR IGNORE INTO users(username) SELECT username FROM provision;")
+        # Catégories par défaut pour les utilisateurs qui n'en ont aucune (comme init_default_categories)
+        cur = conn.execute(
+            f"""
+            INSERT INTO categories(user_id, nom)
+            SELECT u.id, d.nom
+            FROM provision p
+            JOIN users u ON u.username = p.username
+            CROSS JOIN (SELECT column1 AS nom FROM (VALUES {','.join(['(?)'] * len(DEFAULT_CATEGORIES))})) d
+            WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.user_id = u.id);
+            """,
+            DEFAULT_CATEGORIES
+        )
+        conn.execute("DROP TABLE provision;")
+    return cur.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", type=Path)
+    parser.add_argument("--config", type=Path, default=Path(".streamlit/config.yaml"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--update", action="store_true", help="remplace nom, email et mot de passe des comptes existants")
+    parser.add_argument("--passwords-out", type=Path, help="CSV des mots de passe générés (sinon affichés)")
+    args = parser.parse_args()
+
+    from src.database import create_schema, get_connection
+
+    try:
+        users = read_users(args.csv)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    config = load_credentials(args.config)
+    existants = config['credentials']['usernames']
+    a_ecrire = [u for u in users if args.update or u['username'] not in existants]
+    ignores = len(users) - len(a_ecrire)
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunksize = max(1, len(a_ecrire) // (4 * args.workers))
+        hashes = list(pool.map(_hash_lot, [(u['password'], args.rounds) for u in a_ecrire], chunksize=chunksize))
+    duree_hash = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    conn = get_connection()
+    create_schema(conn)
+    nb_categories = create_users(conn, [u['username'] for u in users])
+    duree_db = time.perf_counter() - t0
+
+    # Identifiants écrits en dernier : un compte n'est utilisable qu'une fois sa ligne créée
+    t0 = time.perf_counter()
+    for user, hache in zip(a_ecrire, hashes):
+        compte = existants.setdefault(user['username'], {'failed_login_attempts': 0, 'logged_in': False})
+        compte.update({'email': user['email'], 'name': user['name'], 'password': hache})
+    write_credentials(args.config, config)
+    duree_config = time.perf_counter() - t0
+
+    generes = [u for u in a_ecrire if u['genere']]
+    if generes and args.passwords_out:
+        with open(os.open(args.passwords_out, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', newline='') as f:
+            ecrivain = csv.writer(f)
+            ecrivain.writerow(['username', 'password'])
+            ecrivain.writerows((u['username'], u['password']) for u in generes)
+    elif generes:
+        print("Mots de passe générés :")
+        for u in generes:
+            print(f"  {u['username']} : {u['password']}")
+
+    print(f"{len(a_ecrire)} compte(s) écrit(s) dans {args.config}, {ignores} existant(s) ignoré(s)")
+    if a_ecrire:
+        print(f"Hachage bcrypt (coût {args.rounds}) : {duree_hash:.2f} s sur {args.workers} processus, "
+              f"{len(a_ecrire) / duree_hash:.1f} mots de passe/s")
+    print(f"Base : {len(users)} utilisateur(s), {nb_categories} catégorie(s) créée(s) en {duree_db * 1000:.0f} ms")
+    print(f"Fichier d'identifiants : {duree_config * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Génération d'une base synthétique au schéma actuel (tests de charge, bancs d'essai)
+
+Usage : python -m utils.synthetic_data chemin.db [nb_utilisateurs] [depenses_par_utilisateur] [nb_mois]
+"""
+import random
+import sqlite3
+import sys
+from datetime import date
+
+from src.database import create_schema, DEFAULT_CATEGORIES
+from src.data_operations import bornes_mois
+
+
+ORIGINES = ["Salaire", "APL", "Prime", "Remboursement"]
+DESCRIPTIONS = ["Courses supermarché", "Essence", "Loyer", "Restaurant", "Cinéma", "Abonnement", "Pharmacie"]
+
+
+def last_months(nb_mois: int, fin: date = None) -> list:
+    """Liste des nb_mois derniers mois 'YYYY-MM' (ordre chronologique)"""
+    fin = fin or date.today()
+    mois = []
+    annee, m = fin.year, fin.month
+    for _ in range(nb_mois):
+        mois.append(f"{annee:04d}-{m:02d}")
+        annee, m = (annee, m - 1) if m > 1 else (annee - 1, 12)
+    return mois[::-1]
+
+
+def populate(conn, nb_users: int, nb_depenses: int, nb_mois: int = 24, seed: int = 0, prefix: str = "user"):
+    """Remplit la base avec nb_users utilisateurs ('user1', ...) et leur historique"""
+    rng = random.Random(seed)
+    create_schema(conn)
+    mois = last_months(nb_mois)
+    with conn:
+        # État initial, copié tel quel par les consommateurs du journal (src.journal) : pas journalisé
+        conn.execute("INSERT INTO journal_pause(pause) VALUES (1);")
+        for u in range(1, nb_users + 1):
+            user_id = conn.execute(
+                "INSERT INTO users(username) VALUES (?)", (f"{prefix}{u}",)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO categories(user_id, nom) VALUES (?, ?)",
+                [(user_id, nom) for nom in DEFAULT_CATEGORIES]
+            )
+            cat_ids = [row[0] for row in conn.execute("SELECT id FROM categories WHERE user_id=?", (user_id,))]
+
+            conn.executemany(
+                "INSERT INTO revenus(user_id, mois, origine, montant_centimes) VALUES (?,?,?,?)",
+                [(user_id, m, rng.choice(ORIGINES), rng.randrange(50_000, 400_000)) for m in mois]
+            )
+            conn.executemany(
+                "INSERT INTO budgets(user_id, mois, categorie_id, budget_centimes) VALUES (?,?,?,?)",
+                [(user_id, m, c, rng.randrange(5_000, 100_000)) for m in mois for c in cat_ids]
+            )
+            debut, _ = bornes_mois(mois[0])
+            _, fin = bornes_mois(mois[-1])
+            conn.executemany(
+                "INSERT INTO depenses(user_id, jour, categorie_id, description, montant_centimes) VALUES (?,?,?,?,?)",
+                [
+                    (user_id, rng.randint(debut, fin), rng.choice(cat_ids),
+                     rng.choice(DESCRIPTIONS), rng.randrange(100, 20_000))
+                    for _ in range(nb_depenses)
+                ]
+            )
+        conn.execute("DELETE FROM journal_pause;")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    conn = sqlite3.connect(sys.argv[1])
+    populate(conn, *(int(a) for a in sys.argv[2:5]))
+    conn.close()